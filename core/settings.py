@@ -115,6 +115,52 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 STATICFILES_DIRS=[os.path.join(BASE_DIR,'static')]
 
+# H3 resolution weather requests are snapped to, so nearby sites share cached
+# weather (7 is roughly a 1.2 km cell edge). None queries the exact coordinates.
+WEATHER_H3_RESOLUTION = 7
+
+# HTTP response caches (see utils.cache): one SQLite file per namespace in
+# HTTP_CACHE_DIR, each with its own ttl (seconds), max_bytes and compression.
+HTTP_CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+HTTP_CACHE_NAMESPACES = {
+    'openmeteo': {'ttl': 3600, 'max_bytes': 256 * 1024 * 1024, 'compress': True},
+    'http': {'ttl': 3600, 'max_bytes': 128 * 1024 * 1024, 'compress': True},
+}
+
+# Stored simulation results (see PVSimulation.get_results and utils.result_store):
+# one HDF5 file per simulation in SIMULATION_RESULT_STORE_DIR, least recently
+# used simulations evicted past SIMULATION_RESULT_STORE_MAX_BYTES.
+SIMULATION_RESULT_STORE_DIR = os.path.join(BASE_DIR, 'data', 'results')
+SIMULATION_RESULT_STORE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Memoized stage outputs of the simulation chain (see utils.simulation_stages),
+# keyed by each stage's own inputs and evicted least recently used.
+SIMULATION_STAGE_CACHE_DIR = os.path.join(BASE_DIR, 'data', 'stage_cache')
+SIMULATION_STAGE_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Chunk length (pandas offset alias) of PVSimulation.stream_simulation, which
+# bounds its memory use on multi-year windows.
+SIMULATION_STREAM_CHUNK = 'QS'
+
+# Background simulation jobs (see pv_app.jobs, run with `manage.py run_simulation_workers`):
+# worker processes, attempts per job, retry backoff and heartbeat timing in seconds.
+SIMULATION_JOB_WORKERS = 2
+SIMULATION_JOB_MAX_ATTEMPTS = 3
+SIMULATION_JOB_RETRY_DELAY = 30
+SIMULATION_JOB_POLL_INTERVAL = 2
+SIMULATION_JOB_HEARTBEAT_INTERVAL = 15
+SIMULATION_JOB_STALE_AFTER = 120
+
+# Model chain implementation of PVSimulation.run_simulation: 'pvlib' chains
+# pvlib's functions, 'fused' runs utils.simulation_engine.fused_sapm_sandia
+# (same equations in one pass, AC within FUSED_RTOL / FUSED_ATOL of ModelChain).
+SIMULATION_ENGINE = 'pvlib'
+
+# Run the simulation chain on daylight samples only and fill the night in with
+# its constant night output (see utils.simulation_engine.daylight_mask); the
+# results are unchanged, the night half of the series is simply not computed.
+SIMULATION_SKIP_NIGHT = True
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PvAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pv_app'
+
+    def ready(self):
+        # Connect the result cache invalidation handlers
+        from . import signals  # noqa: F401
@@ -1,10 +1,42 @@
 
 from django import forms
+from django.urls import reverse_lazy
+from django.utils import timezone
+from django.utils.html import format_html
 import pytz
 
 from .models import PVSimulation
 
 
+class ComponentSearchInput(forms.TextInput):
+    """
+    Text input whose <datalist> is filled by the component search endpoint
+    as the user types, instead of shipping every SAM component as an option.
+    """
+
+    def __init__(self, kind, attrs=None):
+        self.kind = kind
+        super().__init__(attrs)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        widget_attrs = context['widget']['attrs']
+        options_id = f"{widget_attrs.get('id', name)}-options"
+        widget_attrs.update({
+            'list': options_id,
+            'autocomplete': 'off',
+            'hx-get': reverse_lazy('pv_app:search_components', kwargs={'kind': self.kind}),
+            'hx-trigger': 'keyup changed delay:300ms, focus once',
+            'hx-target': f'#{options_id}',
+        })
+        return context
+
+    def render(self, name, value, attrs=None, renderer=None):
+        html = super().render(name, value, attrs, renderer)
+        options_id = f"{(attrs or {}).get('id', name)}-options"
+        return html + format_html('<datalist id="{}"></datalist>', options_id)
+
+
 class PVSimulationForm(forms.ModelForm):
     class Meta:
         model = PVSimulation
@@ -12,6 +44,8 @@ class PVSimulationForm(forms.ModelForm):
         widgets = {
             'start_time': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
             'end_time': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
+            'inverter': ComponentSearchInput('inverter'),
+            'module': ComponentSearchInput('module'),
         }
 
 class AddressForm(forms.Form):
@@ -57,6 +91,43 @@ class PlotTypeForm(forms.Form):
         label="Select the purpose of your plot"
     )
 
+RESOLUTION_CHOICES = [
+    ('', 'Hourly'),
+    ('D', 'Daily average'),
+    ('W', 'Weekly average'),
+    ('MS', 'Monthly average'),
+]
+
+class GraphWindowForm(forms.Form):
+    # Zoom window of the simulation graph, in the location's local time
+    start = forms.DateTimeField(
+        required=False,
+        widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}),
+        label="From"
+    )
+    end = forms.DateTimeField(
+        required=False,
+        widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}),
+        label="To"
+    )
+    resolution = forms.ChoiceField(
+        choices=RESOLUTION_CHOICES,
+        required=False,
+        label="Resolution"
+    )
+
+    def _local(self, name):
+        # Django makes the value aware in the server's timezone; keep the wall
+        # time entered so it is read in the location's timezone instead
+        value = self.cleaned_data.get(name)
+        return timezone.make_naive(value) if value is not None and timezone.is_aware(value) else value
+
+    def clean_start(self):
+        return self._local('start')
+
+    def clean_end(self):
+        return self._local('end')
+
 class PlotForm(forms.Form):
     plot_type = forms.ChoiceField(choices=PLOT_CHOICES, label="Select Plot Type")
     x_column = forms.ChoiceField(label="Select X-axis Column")
@@ -181,3 +252,10 @@ class PVTrackingForm(forms.Form):
 
 class DataUploadForm(forms.Form):
     file = forms.FileField(label='Upload CSV file')
+
+
+class LocationImportForm(forms.Form):
+    file = forms.FileField(
+        label='Locations CSV',
+        help_text='Columns: address and/or latitude, longitude; optional timezone',
+    )
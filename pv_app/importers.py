@@ -0,0 +1,177 @@
+import csv
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.db import transaction
+
+from utils.extractors import MAX_CONCURRENT_REQUESTS
+from utils.gazetteer import normalize
+from utils.pv import get_lat_long
+
+from .models import PVLocation
+
+# Rows resolved and inserted per transaction
+IMPORT_BATCH_SIZE = 500
+
+# Header names accepted for each PVLocation field (compared lowercased)
+COLUMN_ALIASES = {
+    'address': ('address', 'location', 'site', 'name'),
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'lon', 'lng', 'long'),
+    'timezone': ('timezone', 'tz', 'time_zone'),
+}
+
+# Decimal places coordinates are compared at when deduplicating (about 1 m)
+DEDUPLICATION_DECIMALS = 5
+
+
+def _column_map(fieldnames):
+    lowered = {name.strip().lower(): name for name in fieldnames or []}
+    return {
+        field: next((lowered[alias] for alias in aliases if alias in lowered), None)
+        for field, aliases in COLUMN_ALIASES.items()
+    }
+
+
+def _parse_row(row, columns):
+    def value(field):
+        column = columns[field]
+        text = row.get(column) if column else None
+        return text.strip() if text and text.strip() else None
+
+    latitude, longitude = value('latitude'), value('longitude')
+    try:
+        latitude = float(latitude) if latitude is not None else None
+        longitude = float(longitude) if longitude is not None else None
+    except ValueError:
+        return None
+    if latitude is None or longitude is None:
+        latitude = longitude = None
+    elif not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    address = value('address')
+    if address is None and latitude is None:
+        return None
+    return {'address': address, 'latitude': latitude, 'longitude': longitude, 'timezone': value('timezone')}
+
+
+def _dedup_key(latitude, longitude, address):
+    if latitude is not None:
+        return ('point', round(float(latitude), DEDUPLICATION_DECIMALS), round(float(longitude), DEDUPLICATION_DECIMALS))
+    return ('address', normalize(address))
+
+
+def _existing_keys():
+    keys = set()
+    for address, latitude, longitude in PVLocation.objects.values_list('address', 'latitude', 'longitude').iterator():
+        if latitude is not None and longitude is not None:
+            keys.add(_dedup_key(latitude, longitude, address))
+        if address:
+            keys.add(_dedup_key(None, None, address))
+    return keys
+
+
+def _geocode(address):
+    try:
+        return get_lat_long(address)
+    except Exception as error:
+        print(f"Could not geocode {address!r}: {error}")
+        return None
+
+
+def _reverse_geocode(location):
+    try:
+        return location.get_address()
+    except Exception as error:
+        print(f"Could not reverse geocode {location.latitude}, {location.longitude}: {error}")
+        return None
+
+
+def import_locations(lines, batch_size=IMPORT_BATCH_SIZE, max_workers=MAX_CONCURRENT_REQUESTS):
+    """
+    Stream PVLocation rows from CSV text into the database.
+
+    Rows need an address or a latitude/longitude pair (see COLUMN_ALIASES
+    for accepted headers). Duplicates, within the file or of existing
+    locations, are skipped. Each batch geocodes its address-only rows
+    with at most `max_workers` concurrent lookups (the gazetteer answers
+    first, see utils.pv.get_lat_long), fills missing addresses and
+    timezones with one vectorized PVLocation.resolve_places call,
+    reverse geocodes the points it left without an address (as
+    PVLocation.save would, since bulk_create does not call it) and is
+    inserted with a single bulk_create in its own transaction.
+
+    Parameters:
+    - lines: iterable of CSV text lines with a header row (e.g. an open file)
+    - batch_size: int, rows resolved and inserted together
+    - max_workers: int, concurrent geocoding lookups
+
+    Returns:
+    - dict: counts of 'created', 'duplicates', 'invalid' and 'unresolved' rows
+    """
+    reader = csv.DictReader(lines)
+    columns = _column_map(reader.fieldnames)
+    if columns['address'] is None and (columns['latitude'] is None or columns['longitude'] is None):
+        raise ValueError("The CSV needs an address column or latitude and longitude columns")
+
+    seen = _existing_keys()
+    stats = {'created': 0, 'duplicates': 0, 'invalid': 0, 'unresolved': 0}
+    timezone_choices = {choice for choice, _ in PVLocation.TIMEZONE_CHOICES}
+    address_length = PVLocation._meta.get_field('address').max_length
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            chunk = list(islice(reader, batch_size))
+            if not chunk:
+                break
+
+            rows = []
+            for row in chunk:
+                parsed = _parse_row(row, columns)
+                if parsed is None:
+                    stats['invalid'] += 1
+                    continue
+                key = _dedup_key(parsed['latitude'], parsed['longitude'], parsed['address'])
+                if key in seen:
+                    stats['duplicates'] += 1
+                    continue
+                seen.add(key)
+                rows.append(parsed)
+
+            to_geocode = [row for row in rows if row['latitude'] is None]
+            for row, location in zip(to_geocode, executor.map(_geocode, [row['address'] for row in to_geocode])):
+                if location is not None:
+                    row['latitude'], row['longitude'] = location.latitude, location.longitude
+                    row['geocoded'] = True
+
+            locations = []
+            for row in rows:
+                if row['latitude'] is None:
+                    stats['unresolved'] += 1
+                    continue
+                # Addresses geocoded to an already imported point are duplicates too
+                if row.get('geocoded'):
+                    key = _dedup_key(row['latitude'], row['longitude'], None)
+                    if key in seen:
+                        stats['duplicates'] += 1
+                        continue
+                    seen.add(key)
+                location = PVLocation(
+                    address=row['address'][:address_length] if row['address'] else None,
+                    latitude=round(row['latitude'], PVLocation.LATITUDE_DECIMAL_PLACES),
+                    longitude=round(row['longitude'], PVLocation.LONGITUDE_DECIMAL_PLACES),
+                )
+                if row['timezone'] in timezone_choices:
+                    location.timezone = row['timezone']
+                locations.append(location)
+
+            PVLocation.resolve_places(locations)
+            unnamed = [location for location in locations if not location.address]
+            for location, address in zip(unnamed, executor.map(_reverse_geocode, unnamed)):
+                if address:
+                    location.address = address[:address_length]
+            with transaction.atomic():
+                PVLocation.objects.bulk_create(locations)
+            stats['created'] += len(locations)
+            print(f"Imported {stats['created']} locations")
+    return stats
@@ -0,0 +1,240 @@
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+from multiprocessing import Process
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections
+from django.db.models import F
+from django.utils import timezone
+
+from utils.simulation_stages import ENGINE_STAGES
+
+from .models import SimulationJob
+
+# Defaults of the SIMULATION_JOB_* settings
+JOB_WORKERS = 2
+JOB_MAX_ATTEMPTS = 3
+# Seconds before a failed job is retried, doubled after every attempt
+JOB_RETRY_DELAY = 30
+# Seconds between queue polls of an idle worker
+JOB_POLL_INTERVAL = 2
+# Seconds between heartbeats of a running job; jobs silent for
+# JOB_STALE_AFTER seconds belong to a dead worker and are requeued
+JOB_HEARTBEAT_INTERVAL = 15
+JOB_STALE_AFTER = 120
+
+# Share of the progress bar covered by the simulation stages, the rest is storing the result
+STAGES_PROGRESS = 95
+
+
+class JobCancelled(Exception):
+    """
+    Raised between simulation stages when the job was cancelled.
+    """
+
+
+def _setting(name, default):
+    return getattr(settings, f'SIMULATION_JOB_{name}', default)
+
+
+def enqueue_simulation(simulation, max_attempts=None):
+    """
+    Queue a run of `simulation`, or return its job that is already queued or running.
+    """
+    active = simulation.jobs.filter(status__in=SimulationJob.ACTIVE_STATUSES).first()
+    if active is not None:
+        return active
+    return SimulationJob.objects.create(
+        simulation=simulation,
+        max_attempts=max_attempts or _setting('MAX_ATTEMPTS', JOB_MAX_ATTEMPTS),
+    )
+
+
+def retry_job(job):
+    """
+    Queue a failed or cancelled job again with a fresh set of attempts.
+    """
+    SimulationJob.objects.filter(pk=job.pk, status__in=(SimulationJob.FAILED, SimulationJob.CANCELLED)).update(
+        status=SimulationJob.QUEUED, attempts=0, progress=0, error='', message='Queued for retry',
+        cancel_requested=False, run_after=timezone.now(), started_at=None, finished_at=None,
+    )
+    job.refresh_from_db()
+    return job
+
+
+def requeue_stale_jobs():
+    """
+    Return RUNNING jobs whose worker stopped sending heartbeats to the
+    queue, or fail them when they are out of attempts.
+
+    Returns:
+    - int: number of jobs requeued or failed
+    """
+    now = timezone.now()
+    stale = SimulationJob.objects.filter(
+        status=SimulationJob.RUNNING,
+        heartbeat_at__lt=now - timedelta(seconds=_setting('STALE_AFTER', JOB_STALE_AFTER)),
+    )
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status=SimulationJob.QUEUED, run_after=now, worker='', message='Requeued after the worker stopped responding',
+    )
+    failed = stale.update(
+        status=SimulationJob.FAILED, finished_at=now, worker='', message='Worker stopped responding',
+    )
+    return requeued + failed
+
+
+def claim_next_job(worker):
+    """
+    Claim the oldest due QUEUED job for `worker`.
+
+    The claim is a conditional UPDATE on the job's status, so concurrent
+    workers never run the same job, on every database backend.
+
+    Returns:
+    - SimulationJob or None when the queue is empty
+    """
+    now = timezone.now()
+    candidates = (
+        SimulationJob.objects.filter(status=SimulationJob.QUEUED, run_after__lte=now)
+        .order_by('run_after', 'pk').values_list('pk', flat=True)[:10]
+    )
+    for job_id in candidates:
+        claimed = SimulationJob.objects.filter(pk=job_id, status=SimulationJob.QUEUED).update(
+            status=SimulationJob.RUNNING, worker=worker, attempts=F('attempts') + 1, progress=0,
+            message='Starting', started_at=now, heartbeat_at=now, finished_at=None,
+        )
+        if claimed:
+            return SimulationJob.objects.select_related('simulation__location').get(pk=job_id)
+    return None
+
+
+class Heartbeat(threading.Thread):
+    """
+    Refreshes a running job's heartbeat_at until stopped, so long weather
+    fetches are not mistaken for a dead worker.
+    """
+
+    def __init__(self, job_id, interval):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    SimulationJob.objects.filter(pk=self.job_id, status=SimulationJob.RUNNING).update(heartbeat_at=timezone.now())
+                except DatabaseError as error:
+                    # e.g. a locked SQLite database; the next beat will try again
+                    print(f"Heartbeat of job {self.job_id} failed: {error}")
+        finally:
+            # Connections are per thread
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job):
+    """
+    Run a claimed job: simulate, store the result and record the outcome.
+
+    Progress is reported as the simulation's stages complete; a cancel
+    request is honoured at the next stage boundary. Failures are retried
+    with exponential backoff until max_attempts is reached.
+    """
+    # Only count the stages the configured engine reports, so the bar fills up evenly
+    stages = ENGINE_STAGES[getattr(settings, 'SIMULATION_ENGINE', 'pvlib')]
+
+    def progress(stage):
+        fraction = (stages.index(stage) + 1) / len(stages)
+        updated = SimulationJob.objects.filter(pk=job.pk, cancel_requested=False).update(
+            progress=round(STAGES_PROGRESS * fraction, 1), message=f'Finished the {stage} stage', heartbeat_at=timezone.now(),
+        )
+        if not updated:
+            raise JobCancelled()
+
+    running = SimulationJob.objects.filter(pk=job.pk, status=SimulationJob.RUNNING)
+    heartbeat = Heartbeat(job.pk, _setting('HEARTBEAT_INTERVAL', JOB_HEARTBEAT_INTERVAL))
+    heartbeat.start()
+    try:
+        # The result is persisted in the result store for later retrieval
+        job.simulation.get_results(progress=progress)
+    except JobCancelled:
+        running.update(status=SimulationJob.CANCELLED, finished_at=timezone.now(), message='Cancelled')
+        return
+    except Exception as error:
+        details = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            delay = _setting('RETRY_DELAY', JOB_RETRY_DELAY) * 2 ** (job.attempts - 1)
+            running.update(
+                status=SimulationJob.QUEUED, run_after=timezone.now() + timedelta(seconds=delay), error=details,
+                message=f'Attempt {job.attempts} failed ({error}), retrying in {delay} s'[:255],
+            )
+        else:
+            running.update(status=SimulationJob.FAILED, finished_at=timezone.now(), error=details, message=str(error)[:255])
+        print(f"Job {job.pk} failed: {error}")
+        return
+    finally:
+        heartbeat.stop()
+    running.update(status=SimulationJob.SUCCEEDED, progress=100, message='Done', finished_at=timezone.now())
+
+
+def run_worker(name=None, poll_interval=None, burst=False):
+    """
+    Process queued jobs one at a time until interrupted.
+
+    Parameters:
+    - name: str, worker name stored on claimed jobs (host:pid by default)
+    - poll_interval: float, seconds between polls of an empty queue
+    - burst: bool, exit once the queue is empty instead of polling
+    """
+    name = name or f'{socket.gethostname()}:{os.getpid()}'
+    poll_interval = poll_interval if poll_interval is not None else _setting('POLL_INTERVAL', JOB_POLL_INTERVAL)
+    print(f"Simulation worker {name} started")
+    while True:
+        close_old_connections()
+        requeue_stale_jobs()
+        job = claim_next_job(name)
+        if job is None:
+            if burst:
+                print(f"Simulation worker {name} found no queued jobs, exiting")
+                return
+            time.sleep(poll_interval)
+            continue
+        print(f"Simulation worker {name} running {job}")
+        run_job(job)
+
+
+def run_workers(concurrency=None, poll_interval=None, burst=False):
+    """
+    Run `concurrency` worker processes (SIMULATION_JOB_WORKERS by default)
+    and wait for them; a single worker runs in this process.
+    """
+    concurrency = concurrency or _setting('WORKERS', JOB_WORKERS)
+    if concurrency <= 1:
+        run_worker(poll_interval=poll_interval, burst=burst)
+        return
+    # Children must open their own database connections
+    connections.close_all()
+    processes = [
+        Process(target=run_worker, kwargs={'poll_interval': poll_interval, 'burst': burst}, daemon=False)
+        for _ in range(concurrency)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
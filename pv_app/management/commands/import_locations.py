@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pv_app.importers import IMPORT_BATCH_SIZE, import_locations
+from utils.extractors import MAX_CONCURRENT_REQUESTS
+
+
+class Command(BaseCommand):
+    help = "Bulk import PV locations from a CSV of addresses and/or coordinates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with address, latitude, longitude and optional timezone columns")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=MAX_CONCURRENT_REQUESTS,
+                            help="Concurrent geocoding lookups for rows without coordinates")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as handle:
+                stats = import_locations(handle, batch_size=options['batch_size'], max_workers=options['workers'])
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {stats['created']} locations "
+            f"({stats['duplicates']} duplicates, {stats['invalid']} invalid, {stats['unresolved']} not geocoded)"
+        ))
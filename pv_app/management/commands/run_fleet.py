@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pv_app.models import DEFAULT_INVERTER, DEFAULT_MODULE
+from utils.extractors import MAX_SITES_PER_REQUEST
+from utils.fleet import FLEET_COLUMNS, FLEET_MAP, FLEET_RESULTS, FLEET_SITES, load_sites, run_fleet, yield_map
+
+
+class Command(BaseCommand):
+    help = "Simulate a reference PV system at every city of a city CSV and map the national yield"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sites', default=FLEET_SITES, help="City CSV with city, latitude, longitude (and region)")
+        parser.add_argument('--start', required=True, help="Start of the window in local time, e.g. 2023-01-01")
+        parser.add_argument('--end', required=True, help="End of the window in local time, e.g. 2023-12-31 23:00")
+        parser.add_argument('--module', default=DEFAULT_MODULE, help="Sandia module name")
+        parser.add_argument('--inverter', default=DEFAULT_INVERTER, help="CEC inverter name")
+        parser.add_argument('--modules-per-string', type=int, default=1)
+        parser.add_argument('--strings', type=int, default=1)
+        parser.add_argument('--temperature-model', default='open_rack_glass_glass')
+        parser.add_argument('--tilt', type=float, default=None, help="Surface tilt in degrees, each site's latitude by default")
+        parser.add_argument('--azimuth', type=float, default=180)
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes, one per CPU by default")
+        parser.add_argument('--batch-size', type=int, default=MAX_SITES_PER_REQUEST, help="Sites per weather request")
+        parser.add_argument('--limit', type=int, default=None, help="Only simulate the first N cities")
+        parser.add_argument('--output', default=FLEET_RESULTS, help="Per-city result table (CSV)")
+        parser.add_argument('--map', default=FLEET_MAP, help="Yield map (HTML)")
+        parser.add_argument('--map-column', default='specific_yield_kwh_per_kwp', choices=FLEET_COLUMNS)
+        parser.add_argument('--restart', action='store_true', help="Ignore the results of a previous, interrupted run")
+
+    def handle(self, *args, **options):
+        try:
+            sites = load_sites(options['sites'])
+        except (OSError, KeyError) as error:
+            raise CommandError(f"Cannot read sites from {options['sites']}: {error}")
+        if options['limit']:
+            sites = sites.head(options['limit'])
+
+        def progress(done, total):
+            self.stdout.write(f"{done}/{total} sites simulated")
+
+        try:
+            table = run_fleet(
+                sites, options['start'], options['end'], options['module'], options['inverter'],
+                modules_per_string=options['modules_per_string'], strings=options['strings'],
+                temperature_model=options['temperature_model'],
+                surface_tilt=options['tilt'], surface_azimuth=options['azimuth'],
+                output=options['output'], max_workers=options['workers'], batch_size=options['batch_size'],
+                engine=getattr(settings, 'SIMULATION_ENGINE', 'pvlib'),
+                snap_resolution=getattr(settings, 'WEATHER_H3_RESOLUTION', None),
+                skip_night=getattr(settings, 'SIMULATION_SKIP_NIGHT', True),
+                restart=options['restart'], progress=progress,
+            )
+        except (KeyError, ValueError) as error:
+            raise CommandError(str(error))
+        yield_map(table, options['map'], options['map_column'])
+        best = table.sort_values('specific_yield_kwh_per_kwp', ascending=False)
+        self.stdout.write(best[['city', 'region', 'specific_yield_kwh_per_kwp', 'performance_ratio']].head(10).round(3).to_string(index=False))
+        self.stdout.write(self.style.SUCCESS(
+            f"Simulated {len(table)} sites, results in {options['output']}, map in {options['map']}"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from pv_app.jobs import run_workers
+
+
+class Command(BaseCommand):
+    help = "Run worker processes executing queued simulation jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="Worker processes, SIMULATION_JOB_WORKERS by default")
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help="Seconds between polls of an empty queue")
+        parser.add_argument('--burst', action='store_true', help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        run_workers(concurrency=options['concurrency'], poll_interval=options['poll_interval'], burst=options['burst'])
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pv_app.models import PVLocation
+from utils.sweep import SWEEP_COLUMNS
+
+
+def _names(values):
+    return [name.strip() for value in values for name in value.split(',') if name.strip()]
+
+
+def _sizes(value):
+    # '8-14' or '8,10,12'
+    sizes = []
+    for part in value.split(','):
+        low, _, high = part.partition('-')
+        sizes.extend(range(int(low), int(high or low) + 1))
+    return sizes
+
+
+class Command(BaseCommand):
+    help = "Rank module x inverter x modules-per-string combinations at a PV location"
+
+    def add_arguments(self, parser):
+        parser.add_argument('location', type=int, help="PVLocation id")
+        parser.add_argument('--start', required=True, help="Start of the window, e.g. 2024-01-01")
+        parser.add_argument('--end', required=True, help="End of the window, e.g. 2024-12-31 23:00")
+        parser.add_argument('--modules', nargs='+', required=True, help="Sandia module names (comma or space separated)")
+        parser.add_argument('--inverters', nargs='+', required=True, help="CEC inverter names (comma or space separated)")
+        parser.add_argument('--modules-per-string', default='10', help="String sizes, e.g. '8-14' or '8,10,12'")
+        parser.add_argument('--strings', type=int, default=1)
+        parser.add_argument('--temperature-model', default='open_rack_glass_glass')
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes, one per CPU by default")
+        parser.add_argument('--rank-by', default='annual_energy_kwh', choices=SWEEP_COLUMNS)
+        parser.add_argument('--top', type=int, default=20, help="Rows to print")
+        parser.add_argument('--output', help="Write the full ranked table to this CSV file")
+
+    def handle(self, *args, **options):
+        try:
+            location = PVLocation.objects.get(pk=options['location'])
+        except PVLocation.DoesNotExist:
+            raise CommandError(f"PVLocation {options['location']} does not exist")
+        try:
+            table = location.run_sweep(
+                options['start'], options['end'],
+                _names(options['modules']), _names(options['inverters']), _sizes(options['modules_per_string']),
+                strings=options['strings'], temperature_model=options['temperature_model'],
+                max_workers=options['workers'], rank_by=options['rank_by'],
+            )
+        except (KeyError, ValueError) as error:
+            raise CommandError(str(error))
+        if options['output']:
+            table.to_csv(options['output'])
+        self.stdout.write(table.head(options['top']).to_string())
+        self.stdout.write(self.style.SUCCESS(f"Ranked {len(table)} combinations at {location.address}"))
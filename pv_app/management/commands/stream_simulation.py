@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pv_app.models import PVSimulation
+
+
+class Command(BaseCommand):
+    help = "Run a long simulation in time chunks and print its monthly energy, peak power and performance ratio"
+
+    def add_arguments(self, parser):
+        parser.add_argument('simulation', type=int, help="PVSimulation id")
+        parser.add_argument('--chunk', default=None, help="Chunk length as a pandas offset alias, e.g. 'MS' or 'QS'")
+        parser.add_argument('--persist', action='store_true', help="Append the full simulated series to the result store")
+        parser.add_argument('--output', default=None, help="Write the monthly aggregates to this CSV file")
+
+    def handle(self, *args, **options):
+        try:
+            simulation = PVSimulation.objects.select_related('location').get(pk=options['simulation'])
+        except PVSimulation.DoesNotExist:
+            raise CommandError(f"PVSimulation {options['simulation']} does not exist")
+
+        def progress(done, total):
+            self.stdout.write(f"Chunk {done}/{total} done")
+
+        result = simulation.stream_simulation(chunk_freq=options['chunk'], persist=options['persist'], progress=progress)
+        if options['output']:
+            result['monthly'].to_csv(options['output'])
+        self.stdout.write(result['monthly'].round(3).to_string())
+        totals = result['totals']
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['energy_kwh']:.1f} kWh, specific yield {totals['specific_yield_kwh_per_kwp'] or 0:.1f} kWh/kWp, "
+            f"performance ratio {totals['performance_ratio']:.3f}, peak {totals['peak_power_w'] or 0:.1f} W"
+        ))
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.15 on 2026-10-18 15:39
+
+from django.db import migrations, models
+import pv_app.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pv_app', '0009_pvsimulation_modules_per_string'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pvsimulation',
+            name='inverter',
+            field=models.CharField(default='ABB__MICRO_0_25_I_OUTD_US_208__208V_', max_length=100, validators=[pv_app.models.validate_inverter], verbose_name='Choose Inverter'),
+        ),
+        migrations.AlterField(
+            model_name='pvsimulation',
+            name='module',
+            field=models.CharField(default='Advent_Solar_AS160___2006_', max_length=100, validators=[pv_app.models.validate_module], verbose_name='Choose Module'),
+        ),
+    ]
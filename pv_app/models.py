@@ -1,47 +1,53 @@
 from django.db import models
 from django.utils import timezone
 import pytz
-from geopy.geocoders import Nominatim
 import pvlib
 # from pvlib.modelchain import  ac_models
 import pandas as pd
 import numpy as np
+from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
-from utils.extractors import fetch_all_weather_data
-from utils.pv import get_lat_long, get_timezone_from_address
+from utils.aggregations import aggregate_daily
+from utils.extractors import MAX_SITES_PER_REQUEST, fetch_all_weather_frames, fetch_all_weather_frames_for_sites
+from utils.pv import (
+    REVERSE_GEOCODE_MAX_KM, get_address_from_coordinates, get_lat_long, get_timezone, resolve_timezones,
+    reverse_geocode,
+)
+from utils.simulation_stages import STAGE_CACHE_DIR, StagedChain
+from utils.simulation_stream import STREAM_CHUNK_FREQ, stream_scenarios
+from utils.sweep import run_sweep
+from utils.sam_catalogue import inverter_catalogue, module_catalogue
+from utils.result_cache import RESULT_CACHE_MAX_BYTES, ResultCache, fingerprint
+from utils.result_store import RESULT_STORE_DIR, RESULT_STORE_MAX_BYTES, ResultStore, window
 import pvlib
 from django.conf  import settings
 import pvlib
 from retry_requests import retry
-import requests_cache
 import os
 
-# Enable caching using requests_cache
-cache_path = os.path.join(os.getcwd(), 'cache2')
-requests_cache.install_cache(cache_name=cache_path, backend='sqlite', expire_after=3600)  # Cache expires after 1 hour
-
-def get_cached_inverter_db():
-    try:
-        # Try retrieving the inverter DB from cache
-        inverter_db = pvlib.pvsystem.retrieve_sam('cecinverter')
-        return inverter_db
-    except Exception as e:
-        print(f"Error fetching inverter database: {e}")
-        return None
+# HTTP caching (PVGIS, geocoding, Open-Meteo) is set up by utils.cache.cache_manager,
+# see HTTP_CACHE_NAMESPACES in the settings
 
-def get_cached_module_db():
-    try:
-        # Try retrieving the module DB from cache
-        module_db = pvlib.pvsystem.retrieve_sam('sandiamod')
-        return module_db
-    except Exception as e:
-        print(f"Error fetching module database: {e}")
-        return None
+# SAM component libraries, parsed once into a memory-mapped snapshot on first access
+inverter_db = inverter_catalogue
+module_db = module_catalogue
+
+# Bump when run_simulation changes its output so cached results are not reused
+SIMULATION_RESULT_VERSION = 1
 
-# Retrieve databases with caching
-inverter_db = get_cached_inverter_db()
-module_db = get_cached_module_db()
+# Simulation results shared by every worker, one HDF5 file per simulation,
+# see PVSimulation.get_results
+result_store = ResultStore(
+    getattr(settings, 'SIMULATION_RESULT_STORE_DIR', RESULT_STORE_DIR),
+    getattr(settings, 'SIMULATION_RESULT_STORE_MAX_BYTES', RESULT_STORE_MAX_BYTES),
+)
+
+# Intermediate outputs of the simulation stages, see utils.simulation_stages
+simulation_stages = ResultCache(
+    getattr(settings, 'SIMULATION_STAGE_CACHE_DIR', STAGE_CACHE_DIR),
+    getattr(settings, 'SIMULATION_STAGE_CACHE_MAX_BYTES', RESULT_CACHE_MAX_BYTES),
+)
 
 
 # Extract all available temperature model configurations from pvlib
@@ -50,6 +56,8 @@ temperature_model_choices = [
     for key in pvlib.temperature.TEMPERATURE_MODEL_PARAMETERS['sapm'].keys()
 ]
 
+DEFAULT_TIMEZONE = 'Etc/GMT+0'
+
 class PVLocation(models.Model):
     """
     Represents the geographical location of the PV system.
@@ -82,8 +90,9 @@ class PVLocation(models.Model):
     )
     timezone = models.CharField(
         max_length=63,  # max length for timezone strings
-        help_text="Timezone of the location (e.g., 'Etc/GMT+5' for New York).",
-        default='Etc/GMT+0',
+        help_text="Timezone of the location (e.g., 'Etc/GMT+5' for New York); found from the coordinates when left blank.",
+        blank=True,
+        default='',
         choices=TIMEZONE_CHOICES,
     )
     class Meta:
@@ -92,57 +101,151 @@ class PVLocation(models.Model):
     
     
     def get_address(self):
-        geolocator = Nominatim(user_agent="abcd")
-        location = geolocator.reverse(query=(self.latitude,self.longitude),exactly_one=True, limit=1)  
-        return f'{location}'
+        return get_address_from_coordinates(float(self.latitude), float(self.longitude))
+
     def save(self, *args, **kwargs):
         if not self.latitude:
             location=get_lat_long(self.address)
             self.latitude,self.longitude=location.latitude,location.longitude
-        # elif not self.address:
-        #     self.address= self.get_address
-        if not self.timezone:
-            self.timezone=get_timezone_from_address(self.address)
         if self.latitude and self.longitude:
+            if not self.timezone:
+                self.timezone = get_timezone(self.latitude, self.longitude) or DEFAULT_TIMEZONE
             if not self.address:
-
-                self.address=self.get_address
+                self.address=self.get_address()
 
 
         super().save(*args, **kwargs)
 
+    def localize(self, value):
+        """
+        `value` as a Timestamp in this location's timezone; naive values are
+        taken as local time.
+        """
+        value = pd.Timestamp(value)
+        if value.tz is None:
+            return value.tz_localize(self.timezone, ambiguous='NaT', nonexistent='NaT')
+        return value.tz_convert(self.timezone)
+
+    def weather_request(self, start_time, end_time, variables=None):
+        """
+        Weather of this location between two localized timestamps, as the
+        fetch callable of StagedChain's weather stage.
+
+        Returns:
+        - callable returning the weather frames
+        """
+        latitude = float(self.latitude)
+        longitude = float(self.longitude)
+        timezone_str = self.timezone
+        snap_resolution = getattr(settings, 'WEATHER_H3_RESOLUTION', None)
+
+        def fetch_weather():
+            # Weather is looked up for the site's H3 cell; pvlib keeps the exact coordinates
+            weather_frames = fetch_all_weather_frames(
+                start_time, end_time, latitude, longitude, timezone_str,
+                snap_resolution=snap_resolution, variables=variables, derive_daily=True,
+            )
+            weather_df = weather_frames['hourly_df']
+            # Ensure that weather_df's index is localized to the correct timezone
+            if weather_df.index.tz is None:
+                weather_df.index = pd.to_datetime(weather_df.index).tz_localize(timezone_str, ambiguous='NaT', nonexistent='NaT')
+            else:
+                weather_df.index = weather_df.index.tz_convert(timezone_str)
+            return weather_frames
+
+        return fetch_weather
+
+    def run_sweep(self, start_time, end_time, modules, inverters, modules_per_string, **options):
+        """
+        Rank module x inverter x string size combinations at this location
+        (see utils.sweep.run_sweep, which receives `options`).
+
+        Weather comes from the local weather store, as in PVSimulation.run_simulation.
+        """
+        start_time, end_time = self.localize(start_time), self.localize(end_time)
+        weather_frames = self.weather_request(start_time, end_time, ['dni', 'ghi', 'dhi'])()
+        weather = weather_frames['hourly_df'][['dni', 'ghi', 'dhi']].loc[start_time:end_time]
+        location = pvlib.location.Location(float(self.latitude), float(self.longitude), self.timezone)
+        return run_sweep(location, weather, modules, inverters, modules_per_string, **options)
+
+    @classmethod
+    def resolve_places(cls, locations, max_distance_km=REVERSE_GEOCODE_MAX_KM):
+        """
+        Fill in the missing addresses and timezones of many unsaved locations
+        with one KD-tree query and one batched timezone lookup.
+
+        Locations with no gazetteer place within `max_distance_km` keep an
+        empty address: `save` reverse geocodes it through Nominatim, callers
+        that bulk_create (which skips `save`) have to do it themselves.
+        """
+        locations = [location for location in locations if location.latitude is not None and location.longitude is not None]
+        if not locations:
+            return locations
+        latitudes = [float(location.latitude) for location in locations]
+        longitudes = [float(location.longitude) for location in locations]
+        addresses = reverse_geocode(latitudes, longitudes, max_distance_km)
+        timezones = resolve_timezones(latitudes, longitudes)
+        for location, address, timezone_str in zip(locations, addresses, timezones):
+            if not location.address and address:
+                location.address = address[:cls._meta.get_field('address').max_length]
+            if not location.timezone:
+                location.timezone = timezone_str or DEFAULT_TIMEZONE
+        return locations
 
     def __str__(self):
 
         return f"Location:{self.address}, lat: {self.latitude} lon:{self.longitude} "
 
+    @classmethod
+    def fetch_weather(cls, locations, start_date, end_date, variables=None, batch_size=MAX_SITES_PER_REQUEST):
+        """
+        Fetch weather for many locations with batched multi-site requests.
+
+        Returns one {'hourly_df', 'daily_df'} dict per location, in order,
+        with hourly times in each location's timezone.
+        """
+        sites = [(float(location.latitude), float(location.longitude), location.timezone) for location in locations]
+        return fetch_all_weather_frames_for_sites(
+            sites, start_date, end_date, batch_size=batch_size,
+            snap_resolution=getattr(settings, 'WEATHER_H3_RESOLUTION', None),
+            variables=variables,
+        )
+
 
-# Retrieve inverter and module databases
+# Defaults: the first component of each SAM library
+DEFAULT_INVERTER = 'ABB__MICRO_0_25_I_OUTD_US_208__208V_'
+DEFAULT_MODULE = 'Advent_Solar_AS160___2006_'
+
+
+def validate_inverter(value):
+    if value not in inverter_db:
+        raise ValidationError(_('%(value)s is not an inverter of the CEC library'), params={'value': value})
+
+
+def validate_module(value):
+    if value not in module_db:
+        raise ValidationError(_('%(value)s is not a module of the Sandia library'), params={'value': value})
 
-inverter_choices = [(name, name) for name in inverter_db.keys()]
-module_choices = [(name, name) for name in module_db.keys()]
 
 class PVSimulation(models.Model):
-    # Assuming you have these choices defined elsewhere
-    inverter_choices = [(key, key.replace('_', ' ').title()) for key in inverter_db.keys()]
-    module_choices = [(key, key.replace('_', ' ').title()) for key in module_db.keys()]
-    
+    # Components are picked through the search endpoint (utils.component_search)
+    # rather than choices, which would list every SAM component in each form
     location = models.ForeignKey(PVLocation, null=True, on_delete=models.SET_NULL)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     
     inverter = models.CharField(
-        choices=inverter_choices,
         max_length=100,
         verbose_name="Choose Inverter",
-        default=inverter_choices[0][0]  # Set default to the first choice
+        default=DEFAULT_INVERTER,
+        validators=[validate_inverter],
     )
     
     module = models.CharField(
-        choices=module_choices,
         max_length=100,
         verbose_name="Choose Module",
-        default=module_choices[0][0]  # Set default to the first choice
+        default=DEFAULT_MODULE,
+        validators=[validate_module],
     )
     
     temperature_model = models.CharField(
@@ -153,76 +256,225 @@ class PVSimulation(models.Model):
     )
     modules_per_string=models.IntegerField(default=10)
     
-    def run_simulation(self,):
-        # Access location parameters
-        latitude = float(self.location.latitude)
-        longitude = float(self.location.longitude)
-        timezone_str = self.location.timezone
-
+    def build_pv_system(self):
+        """
+        The pvlib PVSystem of this simulation's components.
+        """
         # Retrieve parameters from pvlib databases
         inverter_params = inverter_db[self.inverter]
         module_params = module_db[self.module]
         temp_model_params = pvlib.temperature.TEMPERATURE_MODEL_PARAMETERS['sapm'][self.temperature_model]
-
-        # Ensure that start_time and end_time are timezone-aware
-        if pd.Timestamp(self.start_time).tz is None:
-            start_time = pd.to_datetime(self.start_time).tz_localize(timezone_str, ambiguous='NaT', nonexistent='NaT')
-        else:
-            start_time = pd.to_datetime(self.start_time).tz_convert(timezone_str)
-
-        if pd.Timestamp(self.end_time).tz is None:
-            end_time = pd.to_datetime(self.end_time).tz_localize(timezone_str, ambiguous='NaT', nonexistent='NaT')
-        else:
-            end_time = pd.to_datetime(self.end_time).tz_convert(timezone_str)
-
-        # Create the PV system
-        pv_system = pvlib.pvsystem.PVSystem(
+        return pvlib.pvsystem.PVSystem(
             module_parameters=module_params,
             inverter_parameters=inverter_params,
             temperature_model_parameters=temp_model_params,
             modules_per_string=self.modules_per_string
         )
 
+    def run_simulation(self, weather_variables=None, extra_scenarios=None, engine=None, progress=None, skip_night=None):
+        """
+        Run the pvlib model chain for this simulation.
+
+        `weather_variables` lists the extra weather columns to fetch and
+        return alongside the 'dni', 'ghi' and 'dhi' the model needs; every
+        variable is fetched when it is None.
+
+        The real weather, the clear sky and any `extra_scenarios` (name ->
+        weather DataFrame with 'ghi', 'dni', 'dhi' on the same hours) run
+        in one batched pass through the memoized stages of
+        utils.simulation_stages.StagedChain; each extra scenario adds a
+        '<name>_ac_power_output' column.
+
+        `engine` selects the chain's implementation, 'pvlib' or the
+        opt-in 'fused' kernel; defaults to the SIMULATION_ENGINE setting.
+        `progress` is called with the name of each stage as it completes.
+        `skip_night` runs the chain on daylight samples only, with the same
+        result; defaults to the SIMULATION_SKIP_NIGHT setting.
+        """
+        # Access location parameters
+        latitude = float(self.location.latitude)
+        longitude = float(self.location.longitude)
+        timezone_str = self.location.timezone
+
+        # Ensure that start_time and end_time are timezone-aware
+        start_time = self.location.localize(self.start_time)
+        end_time = self.location.localize(self.end_time)
+
+        # Create the PV system
+        pv_system = self.build_pv_system()
+
         # Fetch weather data with timezone-awareness
         location = pvlib.location.Location(latitude, longitude, timezone_str)
-        weather_df = fetch_all_weather_data(start_time, end_time, latitude, longitude, timezone_str)
-        daily_weather_df = fetch_all_weather_data(start_time, end_time, latitude, longitude, timezone_str,df_interval='daily')
 
-        # Ensure that weather_df's index is localized to the correct timezone
-        if weather_df.index.tz is None:
-            weather_df.index = pd.to_datetime(weather_df.index).tz_localize(timezone_str, ambiguous='NaT', nonexistent='NaT')
-        else:
-            weather_df.index = weather_df.index.tz_convert(timezone_str)
+        # Ensure that the weather_df contains the required columns for the model chain
+        required_weather_columns = ['dni', 'ghi', 'dhi']
+        if weather_variables is not None:
+            weather_variables = required_weather_columns + list(weather_variables)
+
+        fetch_weather = self.location.weather_request(start_time, end_time, weather_variables)
+
+        # Each stage after the weather (geometry, POA, cell temperature, DC,
+        # AC) is memoized on its own inputs, so changing e.g. the inverter
+        # only recomputes the AC stage; the clear sky shares the real geometry
+        chain = StagedChain(simulation_stages, progress=progress)
+        weather_frames, outputs = chain.run(
+            pv_system, location, fetch_weather, extra_scenarios=extra_scenarios,
+            engine=engine or getattr(settings, 'SIMULATION_ENGINE', 'pvlib'),
+            skip_night=skip_night if skip_night is not None else getattr(settings, 'SIMULATION_SKIP_NIGHT', True),
+        )
+        weather_df = weather_frames['hourly_df']
+
+        # Merge the real AC power output and clear sky AC power output into the weather_df
+        weather_df['ac_power_output'] = outputs['real']['ac']
+        # Clear sky output covers the requested window only
+        in_window = (weather_df.index >= start_time) & (weather_df.index <= end_time)
+        weather_df['clear_sky_ac_power_output'] = outputs['clear_sky']['ac'].where(in_window)
+        for name in extra_scenarios or {}:
+            weather_df[f'{name}_ac_power_output'] = outputs[name]['ac']
+
+        # Daily UV maxima, per-variable summaries and energy totals come from the hourly frame
+        daily_summary = aggregate_daily(weather_df)
+        daily_weather_df = weather_frames['daily_df']
+        daily_weather_df = daily_weather_df.join(daily_summary.drop(columns=daily_weather_df.columns, errors='ignore'), how='outer')
+        # Return the combined dataframe; get_results persists it in the result store
+        return {'weather_df':weather_df,'daily_weather_df':daily_weather_df}
+
+    def stream_simulation(self, chunk_freq=None, persist=False, weather_variables=(), engine=None, progress=None):
+        """
+        Run this simulation in time chunks with memory bounded by the chunk
+        length, for multi-year windows run_simulation cannot hold.
 
-        # Create a date range with explicit timezone
-        times = pd.date_range(start=start_time, end=end_time, freq='h', tz=timezone_str)
+        Only monthly aggregates (energy, clear-sky energy, POA insolation,
+        peak power, specific yield, performance ratio) are kept in memory;
+        with `persist` the full series is appended chunk by chunk to the
+        result store under stream_fingerprint(). Chunks follow the
+        SIMULATION_STREAM_CHUNK setting unless `chunk_freq` is given.
 
-        # Ensure that the weather_df contains only the required columns for the model chain
-        required_weather_columns = ['dni', 'ghi', 'dhi']
-        weather_df_filtered = weather_df[required_weather_columns]
+        Returns:
+        - dict: 'monthly' DataFrame and 'totals' dict, see utils.simulation_stream
+        """
+        start_time = self.location.localize(self.start_time)
+        end_time = self.location.localize(self.end_time)
+        variables = ['dni', 'ghi', 'dhi'] + list(weather_variables) if weather_variables is not None else None
+
+        def fetch_chunk(chunk_start, chunk_end):
+            fetch_weather = self.location.weather_request(chunk_start, chunk_end, variables)
+            return fetch_weather()['hourly_df']
+
+        spill = None
+        persisted = False
+        if persist and self.pk is not None:
+            key = self.stream_fingerprint(weather_variables)
+            result_store.delete(self.pk, key)
+            persisted = True
+
+            def spill(chunk):
+                # A series that cannot be stored is left incomplete (never
+                # served); the run itself and its aggregates carry on
+                nonlocal persisted
+                if not persisted:
+                    return
+                try:
+                    result_store.append(self.pk, key, 'weather_df', chunk)
+                except OSError as error:
+                    print(f"Could not persist simulation {self.pk}, streaming without it: {error}")
+                    persisted = False
+
+        location = pvlib.location.Location(float(self.location.latitude), float(self.location.longitude), self.location.timezone)
+        result = stream_scenarios(
+            self.build_pv_system(), location, start_time, end_time, fetch_chunk,
+            chunk_freq=chunk_freq or getattr(settings, 'SIMULATION_STREAM_CHUNK', STREAM_CHUNK_FREQ),
+            spill=spill,
+            engine=engine or getattr(settings, 'SIMULATION_ENGINE', 'pvlib'),
+            skip_night=getattr(settings, 'SIMULATION_SKIP_NIGHT', True),
+            progress=progress,
+        )
+        if persisted:
+            try:
+                result_store.finish(self.pk, key)
+            except OSError as error:
+                print(f"Could not persist simulation {self.pk}: {error}")
+        return result
+
+    def result_fingerprint(self, weather_variables=None):
+        """
+        Digest of every input run_simulation depends on.
+        """
+        return fingerprint({
+            'version': SIMULATION_RESULT_VERSION,
+            'latitude': float(self.location.latitude),
+            'longitude': float(self.location.longitude),
+            'timezone': self.location.timezone,
+            'start_time': pd.Timestamp(self.start_time).isoformat(),
+            'end_time': pd.Timestamp(self.end_time).isoformat(),
+            'module': self.module,
+            'inverter': self.inverter,
+            'temperature_model': self.temperature_model,
+            'modules_per_string': self.modules_per_string,
+            'weather_variables': sorted(weather_variables) if weather_variables is not None else None,
+            'snap_resolution': getattr(settings, 'WEATHER_H3_RESOLUTION', None),
+            'engine': getattr(settings, 'SIMULATION_ENGINE', 'pvlib'),
+        })
+
+    def stream_fingerprint(self, weather_variables=()):
+        """
+        Result store key of the series persisted by stream_simulation.
+        """
+        return f'stream_{self.result_fingerprint(weather_variables)}'
 
-        # Get clear sky data for the location
-        sky = location.get_clearsky(times=times)
+    def get_results(self, weather_variables=None, progress=None):
+        """
+        Return run_simulation's result, served from the result store when
+        this simulation already ran with the same parameters.
 
-        # Set up and run the model chain
-        model_chain = pvlib.modelchain.ModelChain(system=pv_system, location=location)
+        Results are dropped when the simulation or its location is saved or
+        deleted (see pv_app.signals); the fingerprint in the key also guards
+        against changes that bypass the signals.
+        """
+        if self.pk is None:
+            return self.run_simulation(weather_variables, progress=progress)
+        return result_store.get_or_compute(
+            self.pk, self.result_fingerprint(weather_variables),
+            lambda: self.run_simulation(weather_variables, progress=progress),
+        )
 
-        # Run the model with actual weather data
-        model_chain.run_model(weather_df_filtered)
-        real_ac_power_output = model_chain.results.ac
+    def read_results(self, name='weather_df', start=None, end=None, columns=None, resolution=None,
+                     weather_variables=None, progress=None):
+        """
+        A time window of one result frame ('weather_df' or 'daily_weather_df').
 
-        # Run the model with clear sky data
-        model_chain.run_model(sky)
-        clear_sky_ac_power_output = model_chain.results.ac
+        Stored results are read through ResultStore.read_range, which only
+        touches the rows and columns asked for; the simulation runs (and is
+        stored) first when there is no stored result yet.
 
-        # Merge the real AC power output and clear sky AC power output into the weather_df
-        weather_df['ac_power_output'] = real_ac_power_output
-        weather_df['clear_sky_ac_power_output'] = clear_sky_ac_power_output
-        # Return the combined dataframe
-        file_path = os.path.join(settings.BASE_DIR, 'data', f'weather_data_{self.location.latitude}.csv')
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        weather_df.to_csv(file_path)
-        return {'weather_df':weather_df,'daily_weather_df':daily_weather_df}
+        Parameters:
+        - start, end: timestamp-like, inclusive window; naive values are
+          local time at the simulation's location
+        - columns: list of columns, defaults to all
+        - resolution: None for the stored samples, or 'D', 'W', 'MS' for
+          column means per day, week or month
+
+        Returns:
+        - DataFrame in the location's timezone
+        """
+        start = self.location.localize(start) if start is not None else None
+        end = self.location.localize(end) if end is not None else None
+        if self.pk is not None:
+            df = result_store.read_range(
+                self.pk, self.result_fingerprint(weather_variables), name,
+                start=start, end=end, columns=columns, resolution=resolution,
+            )
+            if df is not None:
+                return df
+        frames = self.get_results(weather_variables, progress=progress)
+        return window(frames[name], start, end, columns, resolution)
+
+    def invalidate_results(self):
+        """
+        Drop every stored result of this simulation.
+        """
+        if self.pk is not None:
+            result_store.delete(self.pk)
 
     
     def get_inverter_details(self):
@@ -264,4 +516,74 @@ class PVSimulation(models.Model):
             return pd.Series(temp_model_params).to_dict()  # Return as dictionary
         
         return None
-registerable_models=[PVLocation,PVSimulation]
\ No newline at end of file
+
+
+class SimulationJob(models.Model):
+    """
+    A queued run of a PVSimulation, executed by the simulation workers
+    (see pv_app.jobs and the run_simulation_workers command).
+
+    The table is the queue: workers claim the oldest due QUEUED job with a
+    conditional update, report progress as the simulation's stages
+    complete, and store the result in the simulation result cache, from
+    which `result()` reads it back.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+    ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+    simulation = models.ForeignKey(PVSimulation, on_delete=models.CASCADE, related_name='jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    progress = models.FloatField(default=0, help_text="Percentage of the simulation's stages completed")
+    message = models.CharField(max_length=255, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    cancel_requested = models.BooleanField(default=False)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not picked up before this time (retry backoff)")
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ('-created_at',)
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return f'Job {self.pk} for simulation {self.simulation_id} ({self.status})'
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+    def cancel(self):
+        """
+        Cancel a queued job now, or ask the worker running it to stop after its current stage.
+        """
+        cancelled = SimulationJob.objects.filter(pk=self.pk, status=self.QUEUED).update(
+            status=self.CANCELLED, cancel_requested=True, finished_at=timezone.now(), message='Cancelled',
+        )
+        if not cancelled:
+            SimulationJob.objects.filter(pk=self.pk, status=self.RUNNING).update(cancel_requested=True, message='Cancelling')
+        self.refresh_from_db()
+
+    def result(self):
+        """
+        The simulation's result, read from the result cache (recomputed if it was evicted).
+        """
+        return self.simulation.get_results()
+
+
+registerable_models=[PVLocation,PVSimulation,SimulationJob]
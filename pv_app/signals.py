@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import PVLocation, PVSimulation
+
+
+@receiver(post_save, sender=PVSimulation)
+@receiver(post_delete, sender=PVSimulation)
+def invalidate_simulation_results(sender, instance, **kwargs):
+    instance.invalidate_results()
+
+
+# pre_delete: the simulations still point at the location at that point
+@receiver(post_save, sender=PVLocation)
+@receiver(pre_delete, sender=PVLocation)
+def invalidate_location_results(sender, instance, **kwargs):
+    for simulation in PVSimulation.objects.filter(location=instance).only('pk'):
+        simulation.invalidate_results()
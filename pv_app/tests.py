@@ -1,3 +1,765 @@
-from django.test import TestCase
+import io
+import itertools
+import sqlite3
+import tempfile
+import threading
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import pvlib
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+
+from utils import extractors, fleet
+from utils.aggregations import aggregate_daily
+from utils.cache import CacheManager
+from utils.gazetteer import gazetteer
+from utils.pv import get_timezone, resolve_timezones, tracking_angles
+from utils.result_cache import ResultCache
+from utils.result_store import RESOLUTIONS, ResultStore, window
+from utils.sam_catalogue import inverter_catalogue, module_catalogue
+from utils.simulation_engine import (
+    ENGINES, FUSED_ATOL, FUSED_RTOL, clear_sky_weather, compute_geometry, run_scenarios, run_with_clear_sky,
+)
+from utils.simulation_stream import stream_scenarios
+from utils.simulation_stages import StagedChain
+from utils.singleflight import SingleFlight, single_flight
+from utils.sweep import run_sweep
+from utils.weather_store import WeatherStore
+
+from .importers import import_locations
+from .jobs import claim_next_job, enqueue_simulation, requeue_stale_jobs, run_job
+from .models import PVLocation, PVSimulation, SimulationJob
+
+MODULE = 'Advent_Solar_AS160___2006_'
+INVERTER = 'ABB__MICRO_0_25_I_OUTD_US_208__208V_'
+
+
+def make_system(module=MODULE, inverter=INVERTER, modules_per_string=1, surface_tilt=0, surface_azimuth=180):
+    return pvlib.pvsystem.PVSystem(
+        surface_tilt=surface_tilt, surface_azimuth=surface_azimuth,
+        module_parameters=module_catalogue[module], inverter_parameters=inverter_catalogue[inverter],
+        temperature_model_parameters=pvlib.temperature.TEMPERATURE_MODEL_PARAMETERS['sapm']['open_rack_glass_glass'],
+        modules_per_string=modules_per_string,
+    )
+
+
+def make_weather(location, times, seed=0):
+    """
+    Cloudy clear-sky weather with a few missing hours, so results are
+    deterministic and no weather API is needed.
+    """
+    rng = np.random.default_rng(seed)
+    clear_sky = location.get_clearsky(times)
+    factor = rng.uniform(0.2, 1.0, len(times))
+    weather = pd.DataFrame({
+        'ghi': clear_sky['ghi'] * factor,
+        'dni': clear_sky['dni'] * factor,
+        'dhi': clear_sky['dhi'] * (2 - factor),
+    }, index=times)
+    weather.iloc[rng.integers(0, len(times), 10)] = np.nan
+    return weather
+
+
+def fake_weather_windows(date_ranges, latitude, longitude, user_timezone, max_workers, hourly_variables, daily_variables):
+    """
+    Stand-in for extractors.fetch_weather_windows: whole UTC days of the
+    windows, every hourly column set to the UTC hour of its row.
+    """
+    times = pd.DatetimeIndex(np.concatenate([
+        pd.date_range(start, pd.Timestamp(end) + pd.Timedelta(hours=23), freq='h', tz='UTC') for start, end in date_ranges
+    ]), name='datetime')
+    columns = [column for variable in hourly_variables for column in extractors.HOURLY_VARIABLES[variable]]
+    hourly_df = pd.DataFrame({column: times.hour.astype(float) for column in columns}, index=times.tz_convert(user_timezone))
+    daily_df = pd.DataFrame(index=pd.DatetimeIndex([], tz='UTC', name='datetime'))
+    hourly_df.attrs['window_timings'] = daily_df.attrs['window_timings'] = []
+    return {'hourly_df': hourly_df, 'daily_df': daily_df}
+
+
+class WeatherStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.store = WeatherStore(f'{tempfile.mkdtemp()}/weather.h5', lock_timeout=0)
+
+    def fetch(self, start_date, end_date, variables):
+        with mock.patch('utils.extractors.fetch_weather_windows', side_effect=fake_weather_windows) as fetch:
+            frames = extractors.fetch_stored_weather_frames(
+                start_date, end_date, 6.5, 3.4, 'UTC', store=self.store, key='site', hourly_variables=variables,
+                daily_variables=[],
+            )
+        return frames, [date_range for call in fetch.call_args_list for date_range in call.args[0]]
+
+    def test_new_variable_over_stored_days_is_missing(self):
+        self.fetch('2024-01-01', '2024-01-10', ['shortwave_radiation'])
+        self.assertEqual(self.store.missing_ranges('site', '2024-01-01', '2024-01-10', ['shortwave_radiation'], []), [])
+        self.assertEqual(
+            self.store.missing_ranges('site', '2024-01-03', '2024-01-05', ['shortwave_radiation', 'uv_index'], []),
+            [(date(2024, 1, 3), date(2024, 1, 5))],
+        )
+        frames, fetched = self.fetch('2024-01-03', '2024-01-05', ['shortwave_radiation', 'uv_index'])
+        self.assertEqual(fetched, [('2024-01-03', '2024-01-05')])
+        self.assertEqual(list(frames['hourly_df'].columns), ['ghi', 'shortwave_radiation', 'uv_index'])
+        self.assertFalse(frames['hourly_df'].isna().any().any())
+
+    def test_variable_missing_from_a_response_is_not_covered(self):
+        times = pd.date_range('2024-01-01', '2024-01-02 23:00', freq='h', tz='UTC', name='datetime')
+        hourly_df = pd.DataFrame({'ghi': 1., 'uv_index': np.nan}, index=times)
+        hourly_df.iloc[30, 0] = np.nan
+        self.store.write('site', hourly_df, hourly_df[[]], {'shortwave_radiation': ('ghi',), 'uv_index': ('uv_index',)}, {})
+        self.assertEqual(
+            self.store.missing_ranges('site', '2024-01-01', '2024-01-02', ['shortwave_radiation'], []),
+            [(date(2024, 1, 2), date(2024, 1, 2))],
+        )
+        self.assertEqual(
+            self.store.missing_ranges('site', '2024-01-01', '2024-01-02', ['uv_index'], []),
+            [(date(2024, 1, 1), date(2024, 1, 2))],
+        )
+
+    def test_stored_subset_is_served_without_fetching(self):
+        stored, _ = self.fetch('2024-01-01', '2024-01-31', ['shortwave_radiation', 'uv_index', 'temperature_2m'])
+        frames, fetched = self.fetch('2024-01-10', '2024-01-12', ['uv_index'])
+        self.assertEqual(fetched, [])
+        pd.testing.assert_frame_equal(
+            frames['hourly_df'], stored['hourly_df'].loc['2024-01-10':'2024-01-12', ['uv_index']], check_freq=False,
+        )
+
+    def test_gaps_cover_only_absent_days(self):
+        self.fetch('2024-01-01', '2024-01-05', ['shortwave_radiation'])
+        self.fetch('2024-01-11', '2024-01-15', ['shortwave_radiation'])
+        self.fetch('2024-01-18', '2024-01-18', ['shortwave_radiation'])
+        frames, fetched = self.fetch('2023-12-30', '2024-01-20', ['shortwave_radiation'])
+        self.assertEqual(fetched, [
+            ('2023-12-30', '2023-12-31'), ('2024-01-06', '2024-01-10'), ('2024-01-16', '2024-01-17'),
+            ('2024-01-19', '2024-01-20'),
+        ])
+        expected = pd.date_range('2023-12-30', '2024-01-20 23:00', freq='h', tz='UTC', name='datetime')
+        pd.testing.assert_index_equal(frames['hourly_df'].index, expected, check_exact=True)
+
+    def test_recent_days_are_fetched_again(self):
+        today = pd.Timestamp.now(tz='UTC').date()
+        first = today - pd.Timedelta(days=5)
+        self.fetch(first, today, ['shortwave_radiation'])
+        self.assertEqual(
+            self.store.missing_ranges('site', first, today, ['shortwave_radiation'], []),
+            [(today - pd.Timedelta(days=1), today)],
+        )
+
+
+class DerivedDailyTests(SimpleTestCase):
+    def test_derived_days_are_whole_local_days(self):
+        for timezone in ('Africa/Lagos', 'America/New_York', 'Asia/Tokyo'):
+            with self.subTest(timezone=timezone), \
+                    mock.patch('utils.extractors.fetch_weather_windows', fake_weather_windows):
+                frames = extractors.fetch_all_weather_frames(
+                    '2024-01-01', '2024-01-10', 6.5, 3.4, timezone, use_store=False,
+                    variables=['uv_index', 'uv_index_max'], derive_daily=True,
+                )
+                hourly_df, daily_df = frames['hourly_df'], frames['daily_df']
+                self.assertEqual(hourly_df.index[0], pd.Timestamp('2024-01-01', tz=timezone))
+                self.assertEqual(hourly_df.index[-1], pd.Timestamp('2024-01-10 23:00', tz=timezone))
+                self.assertEqual(list(daily_df.index), list(pd.date_range('2024-01-01', '2024-01-10', tz=timezone)))
+                expected = hourly_df['uv_index'].groupby(hourly_df.index.date).max().to_numpy()
+                np.testing.assert_array_equal(daily_df['uv_index_max'].to_numpy(), expected)
+
+
+class FleetTests(SimpleTestCase):
+    sites = pd.DataFrame({
+        'city': ['Ibadan', 'Kano', 'Enugu'], 'region': ['Oyo', 'Kano', 'Enugu'],
+        'latitude': [7.3775, 12.0, 6.45], 'longitude': [3.947, 8.5167, 7.5], 'timezone': 'Africa/Lagos',
+    })
+
+    @staticmethod
+    def fetch_batch(start_date, end_date, latitudes, longitudes, hourly_variables, daily_variables):
+        return [(start_date, end_date, latitude, longitude) for latitude, longitude in zip(latitudes, longitudes)]
+
+    @staticmethod
+    def process_response(response, user_timezone, hourly_variables, daily_variables):
+        start_date, end_date, latitude, longitude = response
+        times = pd.date_range(start_date, pd.Timestamp(end_date) + pd.Timedelta(hours=23), freq='h', tz='UTC')
+        hourly_df = make_weather(pvlib.location.Location(latitude, longitude), times, seed=int(latitude * 1000))
+        hourly_df['shortwave_radiation'] = hourly_df['ghi']
+        hourly_df = hourly_df.rename_axis('datetime').reset_index()
+        return {'hourly_df': hourly_df, 'daily_df': pd.DataFrame({'datetime': pd.DatetimeIndex([], tz='UTC')})}
+
+    def run_fleet(self, store_path, batch_size):
+        with mock.patch('utils.extractors.fetch_weather_data_batch', self.fetch_batch), \
+                mock.patch('utils.extractors.process_weather_response', self.process_response), \
+                mock.patch.multiple(extractors.weather_store, path=store_path, lock_timeout=0):
+            return fleet.run_fleet(
+                self.sites, '2024-03-01', '2024-03-10 23:00', MODULE, INVERTER,
+                output=f'{tempfile.mkdtemp()}/fleet.csv', max_workers=1, batch_size=batch_size,
+            )
+
+    def test_locked_weather_store_falls_back_to_fetched_weather(self):
+        stored = f'{tempfile.mkdtemp()}/weather.h5'
+        expected = self.run_fleet(stored, batch_size=3)
+        self.assertTrue((expected['energy_kwh'] > 0).all())
+        locked = BlockingIOError(11, 'unable to lock file')
+        # Locked while writing fetched weather, and while looking up stored weather
+        for store_path, batch_size in ((f'{tempfile.mkdtemp()}/weather.h5', 1), (f'{tempfile.mkdtemp()}/weather.h5', 3), (stored, 3)):
+            with self.subTest(store_path=store_path, batch_size=batch_size), \
+                    mock.patch('utils.h5frames.h5py', **{'File.side_effect': locked}):
+                pd.testing.assert_frame_equal(self.run_fleet(store_path, batch_size), expected)
+
+
+class RunScenariosTests(SimpleTestCase):
+    location = pvlib.location.Location(7.25, 5.19, 'Africa/Lagos')
+    times = pd.date_range('2024-03-01', '2024-04-30 23:00', freq='h', tz='Africa/Lagos')
+
+    def model_chain(self, system, weather):
+        chain = pvlib.modelchain.ModelChain(system=system, location=self.location)
+        chain.run_model(weather)
+        return chain.results
+
+    def test_matches_model_chain(self):
+        weather = make_weather(self.location, self.times)
+        weather['wind_speed'] = 2.
+        system = make_system(modules_per_string=10, surface_tilt=10)
+        geometry = compute_geometry(self.location, self.times, 10, 180)
+        clear_sky = clear_sky_weather(self.location, geometry)
+        outputs = run_scenarios(system, self.location, {'real': weather, 'clear_sky': clear_sky}, geometry)
+
+        for name, scenario in (('real', weather), ('clear_sky', clear_sky)):
+            expected = self.model_chain(system, scenario)
+            frame = outputs[name]
+            pd.testing.assert_series_equal(frame['ac'], expected.ac, check_names=False)
+            pd.testing.assert_series_equal(frame['p_mp'], expected.dc['p_mp'], check_names=False)
+            pd.testing.assert_series_equal(frame['cell_temperature'], expected.cell_temperature, check_names=False)
+            pd.testing.assert_series_equal(
+                frame['effective_irradiance'], expected.effective_irradiance, check_names=False,
+            )
+            pd.testing.assert_series_equal(
+                frame['poa_global'], expected.total_irrad['poa_global'], check_names=False,
+            )
+
+    def test_air_temperature_corrects_refraction_as_model_chain(self):
+        weather = make_weather(self.location, self.times)
+        weather['temp_air'] = np.linspace(15, 35, len(self.times))
+        system = make_system(surface_tilt=20)
+        outputs = run_scenarios(system, self.location, {'real': weather})
+        expected = self.model_chain(system, weather)
+        pd.testing.assert_series_equal(outputs['real']['ac'], expected.ac, check_names=False)
+        pd.testing.assert_series_equal(outputs['real']['cell_temperature'], expected.cell_temperature, check_names=False)
+
+
+class FusedEngineTests(SimpleTestCase):
+    location = pvlib.location.Location(7.25, 5.19, 'Africa/Lagos')
+    times = pd.date_range('2024-03-01', '2024-04-30 23:00', freq='h', tz='Africa/Lagos')
+
+    def test_matches_model_chain_within_tolerance(self):
+        rng = np.random.default_rng(1)
+        weather = make_weather(self.location, self.times)
+        weather['wind_speed'] = rng.uniform(0, 5, len(self.times))
+        weather['temp_air'] = rng.uniform(15, 35, len(self.times))
+        modules = list(module_catalogue.keys())
+        inverters = list(inverter_catalogue.keys())
+        geometry = compute_geometry(self.location, self.times, 20, 180, weather['temp_air'])
+        for _ in range(10):
+            module = modules[rng.integers(len(modules))]
+            inverter = inverters[rng.integers(len(inverters))]
+            modules_per_string = int(rng.integers(1, 20))
+            with self.subTest(module=module, inverter=inverter, modules_per_string=modules_per_string):
+                system = make_system(module, inverter, modules_per_string, surface_tilt=20)
+                chain = pvlib.modelchain.ModelChain(system=system, location=self.location)
+                chain.run_model(weather)
+                ac = run_scenarios(system, self.location, {'real': weather}, geometry, engine='fused')['real']['ac']
+                np.testing.assert_array_equal(ac.isna(), chain.results.ac.isna())
+                np.testing.assert_allclose(ac, chain.results.ac, rtol=FUSED_RTOL, atol=FUSED_ATOL)
+
+
+class ResultStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.store = ResultStore(tempfile.mkdtemp(), max_bytes=None, lock_timeout=0)
+        index = pd.date_range('2024-01-01', '2024-06-30 23:00', freq='h', tz='Africa/Lagos', name='datetime')
+        self.frame = pd.DataFrame({'ac': np.arange(len(index), dtype=float)}, index=index)
+
+    def test_get_or_compute_returns_result_it_cannot_store(self):
+        locked = BlockingIOError(11, 'unable to lock file')
+        with mock.patch('utils.h5frames.h5py', **{'File.side_effect': locked}):
+            frames = self.store.get_or_compute(1, 'key', lambda: {'weather_df': self.frame})
+        pd.testing.assert_frame_equal(frames['weather_df'], self.frame)
+        self.assertIsNone(self.store.read(1, 'key'))
+
+    def test_read_range_matches_in_memory_window(self):
+        self.store.write(1, 'key', {'weather_df': self.frame})
+        timezone = self.frame.index.tz
+        windows = [
+            ('2024-03-15', '2024-04-15'),
+            ('2024-03-15 10:00', '2024-04-15 13:00'),
+            ('2024-03-01', '2024-03-31 23:00'),
+            ('2024-03-04', '2024-03-05'),
+            (None, '2024-05-03'),
+            ('2024-02-10', None),
+            (None, None),
+        ]
+        for start, end in windows:
+            start = pd.Timestamp(start, tz=timezone) if start else None
+            end = pd.Timestamp(end, tz=timezone) if end else None
+            for resolution in RESOLUTIONS:
+                with self.subTest(start=start, end=end, resolution=resolution):
+                    stored = self.store.read_range(1, 'key', 'weather_df', start, end, resolution=resolution)
+                    expected = window(self.frame, start, end, resolution=resolution)
+                    pd.testing.assert_frame_equal(stored, expected, check_freq=False)
+
+
+class SkipNightTests(SimpleTestCase):
+    sites = [
+        (pvlib.location.Location(7.25, 5.19, 'Africa/Lagos'), 0, 180, 'h'),
+        (pvlib.location.Location(60.2, 24.9, 'Europe/Helsinki'), 40, 180, 'h'),
+        (pvlib.location.Location(-33.9, 18.4, 'Africa/Johannesburg'), 30, 0, '15min'),
+    ]
+    # Spans the spring daylight saving change in Helsinki
+    start, end = '2024-03-20', '2024-04-10 23:45'
+
+    def assert_same(self, frames, expected):
+        self.assertEqual(frames.keys(), expected.keys())
+        for name in expected:
+            pd.testing.assert_frame_equal(frames[name], expected[name])
+
+    def test_run_with_clear_sky_matches_unmasked(self):
+        for location, tilt, azimuth, freq in self.sites:
+            times = pd.date_range(self.start, self.end, freq=freq, tz=location.tz)
+            weather = make_weather(location, times)
+            for module, inverter, modules_per_string in [
+                (MODULE, INVERTER, 1), ('Canadian_Solar_CS5P_220M___2009_', 'iPower__SHO_5_2__240V_', 20),
+            ]:
+                system = make_system(module, inverter, modules_per_string, tilt, azimuth)
+                for engine in ENGINES:
+                    with self.subTest(timezone=str(location.tz), module=module, engine=engine):
+                        self.assert_same(
+                            run_with_clear_sky(system, location, weather, engine=engine, skip_night=True),
+                            run_with_clear_sky(system, location, weather, engine=engine, skip_night=False),
+                        )
+
+    def run_chain(self, cache, system, location, weather, extra_scenarios, engine, skip_night):
+        chain = StagedChain(cache)
+        return chain.run(
+            system, location, lambda: {'hourly_df': weather.copy()}, extra_scenarios=extra_scenarios,
+            engine=engine, skip_night=skip_night,
+        )[1]
+
+    def test_staged_chain_matches_unmasked(self):
+        location, tilt, azimuth, freq = self.sites[1]
+        times = pd.date_range(self.start, self.end, freq=freq, tz=location.tz)
+        weather = make_weather(location, times)
+        extra = {'hot': weather.assign(temp_air=35.)}
+        system = make_system(surface_tilt=tilt, surface_azimuth=azimuth)
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                self.assert_same(
+                    self.run_chain(ResultCache(tempfile.mkdtemp(), None), system, location, weather, extra, engine, True),
+                    self.run_chain(ResultCache(tempfile.mkdtemp(), None), system, location, weather, extra, engine, False),
+                )
+
+    def test_staged_chain_does_not_reuse_geometry_of_another_mask(self):
+        location, tilt, azimuth, freq = self.sites[0]
+        times = pd.date_range(self.start, self.end, freq=freq, tz=location.tz)
+        weather = make_weather(location, times)
+        # Missing and non-zero night irradiance widen the daylight mask
+        night = weather.copy()
+        night.iloc[:3] = np.nan
+        night.iloc[23, night.columns.get_loc('dhi')] = 5.
+        extra = {'night': night}
+        system = make_system(surface_tilt=tilt, surface_azimuth=azimuth)
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                cache = ResultCache(tempfile.mkdtemp(), None)
+                self.run_chain(cache, system, location, weather, None, engine, True)
+                self.assert_same(
+                    self.run_chain(cache, system, location, weather, extra, engine, True),
+                    self.run_chain(ResultCache(tempfile.mkdtemp(), None), system, location, weather, extra, engine, False),
+                )
+
+    def test_tracking_angles_match_unmasked(self):
+        for location, _, _, _ in self.sites:
+            with self.subTest(timezone=str(location.tz)):
+                times = pd.date_range(self.start, self.end, freq='5min', tz=location.tz)
+                pd.testing.assert_frame_equal(
+                    tracking_angles(times, location.latitude, location.longitude, skip_night=True),
+                    tracking_angles(times, location.latitude, location.longitude, skip_night=False),
+                )
+
+
+@override_settings(SIMULATION_JOB_RETRY_DELAY=30, SIMULATION_JOB_STALE_AFTER=120)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('pv_app.models.result_store', ResultStore(tempfile.mkdtemp(), max_bytes=None))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.location = PVLocation.objects.create(address='Ibadan', latitude=7.38, longitude=3.95, timezone='Africa/Lagos')
+
+    def make_simulation(self):
+        return PVSimulation.objects.create(
+            location=self.location, start_time=timezone.now() - timedelta(days=10), end_time=timezone.now(),
+        )
+
+    def test_only_one_claimant_wins(self):
+        first = enqueue_simulation(self.make_simulation())
+        second = enqueue_simulation(self.make_simulation())
+        claims = {}
+        update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            # Worker b claims between worker a reading the queue and claiming its first job
+            if kwargs.get('worker') == 'a' and 'b' not in claims:
+                claims['b'] = claim_next_job('b')
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            claims['a'] = claim_next_job('a')
+        self.assertEqual(claims['b'].pk, first.pk)
+        self.assertEqual(claims['a'].pk, second.pk)
+        self.assertIsNone(claim_next_job('c'))
+        for job, worker in ((first, 'b'), (second, 'a')):
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.worker, job.attempts), (SimulationJob.RUNNING, worker, 1))
+
+    def test_failure_is_retried_with_backoff_until_max_attempts(self):
+        job = enqueue_simulation(self.make_simulation(), max_attempts=3)
+        with mock.patch.object(PVSimulation, 'get_results', side_effect=RuntimeError('weather unavailable')):
+            for attempt, delay in ((1, 30), (2, 60)):
+                started = timezone.now()
+                run_job(claim_next_job('worker'))
+                job.refresh_from_db()
+                self.assertEqual((job.status, job.attempts), (SimulationJob.QUEUED, attempt))
+                self.assertIn('weather unavailable', job.error)
+                self.assertGreaterEqual(job.run_after, started + timedelta(seconds=delay))
+                self.assertLess(job.run_after, timezone.now() + timedelta(seconds=delay))
+                # Not due before its backoff has passed
+                self.assertIsNone(claim_next_job('worker'))
+                SimulationJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            run_job(claim_next_job('worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (SimulationJob.FAILED, 3))
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(claim_next_job('worker'))
+
+    def test_cancelled_job_is_not_run(self):
+        queued = enqueue_simulation(self.make_simulation())
+        queued.cancel()
+        self.assertEqual(queued.status, SimulationJob.CANCELLED)
+        self.assertIsNone(claim_next_job('worker'))
+
+        enqueue_simulation(self.make_simulation())
+        running = claim_next_job('worker')
+        running.cancel()
+        self.assertEqual((running.status, running.cancel_requested), (SimulationJob.RUNNING, True))
+        stages = []
+
+        def get_results(progress):
+            for stage in ('weather', 'geometry'):
+                progress(stage)
+                stages.append(stage)
+
+        with mock.patch.object(PVSimulation, 'get_results', side_effect=get_results):
+            run_job(running)
+        running.refresh_from_db()
+        self.assertEqual(running.status, SimulationJob.CANCELLED)
+        self.assertEqual(stages, [])
+
+    def test_jobs_with_stale_heartbeats_are_requeued(self):
+        now = timezone.now()
+        jobs = {}
+        for name, attempts, heartbeat in (('stale', 1, 300), ('exhausted', 3, 300), ('alive', 1, 10)):
+            jobs[name] = SimulationJob.objects.create(
+                simulation=self.make_simulation(), status=SimulationJob.RUNNING, worker='gone', attempts=attempts,
+                max_attempts=3, heartbeat_at=now - timedelta(seconds=heartbeat),
+            )
+        self.assertEqual(requeue_stale_jobs(), 2)
+        for job in jobs.values():
+            job.refresh_from_db()
+        self.assertEqual((jobs['stale'].status, jobs['stale'].worker), (SimulationJob.QUEUED, ''))
+        self.assertEqual(jobs['exhausted'].status, SimulationJob.FAILED)
+        self.assertEqual((jobs['alive'].status, jobs['alive'].worker), (SimulationJob.RUNNING, 'gone'))
+        self.assertEqual(claim_next_job('worker').pk, jobs['stale'].pk)
+
+
+class ImportLocationsTests(TestCase):
+    rows = [
+        'name,lat,lon,tz',
+        'Ibadan office,7.3775,3.947,',
+        ',7.377500001,3.947,',
+        'Kano depot,12.0,8.5167,',
+        'Buoy,0.0,-30.0,',
+        ',1.0,-30.0,Atlantic/Azores',
+        'Lagos HQ,,,',
+        'Ibadan again,,,',
+        'Nowhere,,,',
+        ',abc,3.9,',
+        'Pole,95,0,',
+        ',,,',
+    ]
+    geocoded = {'Lagos HQ': (6.45, 3.39), 'Ibadan again': (7.3775, 3.947)}
+
+    def geocode(self, address):
+        if address not in self.geocoded:
+            return None
+        latitude, longitude = self.geocoded[address]
+        return SimpleNamespace(latitude=latitude, longitude=longitude)
+
+    def test_import(self):
+        PVLocation.objects.create(address='Kano', latitude=12.0, longitude=8.5167, timezone='Africa/Lagos')
+        bulk_create = PVLocation.objects.bulk_create
+        with mock.patch('pv_app.importers.get_lat_long', side_effect=self.geocode), \
+                mock.patch('pv_app.models.get_address_from_coordinates', return_value='Mid-Atlantic Ridge') as reverse, \
+                mock.patch.object(PVLocation.objects, 'bulk_create', wraps=bulk_create) as batches:
+            stats = import_locations(self.rows, batch_size=3, max_workers=2)
+
+        self.assertEqual(stats, {'created': 4, 'duplicates': 3, 'invalid': 3, 'unresolved': 1})
+        self.assertEqual([len(call.args[0]) for call in batches.call_args_list], [1, 3, 0, 0])
+        reverse.assert_called_once_with(1.0, -30.0)
+        created = {
+            location.address: (float(location.latitude), float(location.longitude), location.timezone)
+            for location in PVLocation.objects.exclude(address='Kano')
+        }
+        self.assertEqual(created['Buoy'][:2], (0.0, -30.0))
+        self.assertEqual(created['Mid-Atlantic Ridge'], (1.0, -30.0, 'Atlantic/Azores'))
+        self.assertEqual(created['Lagos HQ'], (6.45, 3.39, 'Africa/Lagos'))
+        self.assertEqual(created['Ibadan office'], (7.3775, 3.947, 'Africa/Lagos'))
+        self.assertEqual(len(created), 4)
+
+
+class TimezoneTests(TestCase):
+    def test_resolve_timezones_matches_get_timezone(self):
+        rng = np.random.default_rng(0)
+        # Border towns (Nigeria / Benin / Niger / Cameroon), a coast and open sea
+        latitudes = np.concatenate([rng.uniform(2, 14, 300), [6.45, 6.45, 0.0, 13.5]])
+        longitudes = np.concatenate([rng.uniform(1, 16, 300), [3.39, 3.39, -30.0, 2.1]])
+        self.assertEqual(
+            resolve_timezones(latitudes, longitudes),
+            [get_timezone(lat, lng) for lat, lng in zip(latitudes, longitudes)],
+        )
+        self.assertEqual(resolve_timezones([], []), [])
+
+    def test_save_keeps_chosen_timezone(self):
+        with mock.patch('pv_app.models.get_address_from_coordinates') as reverse:
+            chosen = PVLocation.objects.create(address='Lagos', latitude=6.45, longitude=3.39, timezone='Etc/GMT+0')
+            found = PVLocation.objects.create(address='Lagos', latitude=6.45, longitude=3.39)
+        reverse.assert_not_called()
+        self.assertEqual(PVLocation.objects.get(pk=chosen.pk).timezone, 'Etc/GMT+0')
+        self.assertEqual(PVLocation.objects.get(pk=found.pk).timezone, 'Africa/Lagos')
+
+    def test_gazetteer_ambiguous_name(self):
+        # 'Adani' is a town in both Kogi and Anambra
+        self.assertIsNone(gazetteer.lookup('Adani'))
+        place = gazetteer.lookup('Adani, Anambra, Nigeria')
+        self.assertEqual(place['label'], 'Adani, Anambra, Nigeria')
+        self.assertEqual((place['latitude'], place['longitude']), (6.63, 7.12))
+
+
+class FakeAdapter(HTTPAdapter):
+    """
+    Transport answering every request with 40 kB of bytes seeded by the URL,
+    recording the URLs that reached it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(request.url)
+        body = np.random.default_rng(ord(request.url[-1])).bytes(40000)
+        return self.build_response(request, HTTPResponse(
+            body=io.BytesIO(body), status=200, preload_content=False, request_url=request.url,
+        ))
+
+
+class CacheNamespaceTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Room for three responses: the fourth evicts down to two
+        self.manager = CacheManager(cache_dir=directory.name, namespaces={
+            'test': {'ttl': None, 'max_bytes': 150000, 'compress': False},
+        })
+        self.namespace = self.manager.namespace('test')
+        self.session = self.manager.session('test')
+        self.addCleanup(self.session.close)
+        self.adapter = FakeAdapter()
+        self.session.mount('http://', self.adapter)
+
+    def cached(self):
+        with sqlite3.connect(self.namespace.path) as connection:
+            responses = {key for key, in connection.execute('SELECT key FROM responses')}
+            accessed = {key for key, in connection.execute('SELECT key FROM cache_access')}
+        urls = {self.session.cache.responses[key].url for key in responses}
+        return urls, responses, accessed
+
+    def test_least_recently_used_evicted_first(self):
+        with mock.patch('utils.cache.time', **{'time.side_effect': itertools.count(1.0)}):
+            for name in ['a', 'b', 'c', 'a', 'd']:
+                self.session.get(f'http://example.com/{name}')
+
+        self.assertEqual(self.adapter.sent, [f'http://example.com/{name}' for name in 'abcd'])
+        urls, responses, accessed = self.cached()
+        # 'b' is the least recently used once 'a' is read again
+        self.assertEqual(urls, {f'http://example.com/{name}' for name in 'acd'})
+        self.assertEqual(accessed, responses)
+        stats = self.manager.stats()['test']
+        self.assertEqual(
+            {name: stats[name] for name in ['hits', 'misses', 'hit_rate', 'bytes_served', 'bytes_fetched', 'evictions']},
+            {'hits': 1, 'misses': 4, 'hit_rate': 0.2, 'bytes_served': 40000, 'bytes_fetched': 160000, 'evictions': 1},
+        )
+        self.assertEqual(stats['size_bytes'], self.namespace.size())
+
+    def test_under_limit_keeps_everything(self):
+        self.namespace.max_bytes = None
+        for name in 'abcd':
+            self.session.get(f'http://example.com/{name}')
+        self.namespace.enforce_limit()
+
+        urls, responses, accessed = self.cached()
+        self.assertEqual(len(urls), 4)
+        self.assertEqual(accessed, responses)
+        self.assertEqual(self.namespace.stats()['evictions'], 0)
+
+
+class SingleFlightTests(SimpleTestCase):
+    followers = 4
+
+    def run_concurrently(self, flight, function):
+        """
+        Call flight.do('key', function) from a leader and `followers` threads
+        joining while the leader's call is in flight; returns each caller's
+        result or exception, leader first.
+        """
+        started, release = threading.Event(), threading.Event()
+        outcomes = [None] * (self.followers + 1)
+
+        def leader_function():
+            started.set()
+            self.assertTrue(release.wait(5))
+            return function()
+
+        def call(index, target):
+            try:
+                outcomes[index] = flight.do('key', target)
+            except Exception as error:
+                outcomes[index] = error
+
+        leader = threading.Thread(target=call, args=(0, leader_function))
+        leader.start()
+        self.assertTrue(started.wait(5))
+        # Count the followers blocking on the leader's call before releasing it
+        waiting = threading.Semaphore(0)
+        done = flight._calls['key'].done
+        wait = done.wait
+        done.wait = lambda *args: (waiting.release(), wait(*args))[1]
+        threads = [
+            threading.Thread(target=call, args=(index, function)) for index in range(1, self.followers + 1)
+        ]
+        for thread in threads:
+            thread.start()
+        for _ in threads:
+            self.assertTrue(waiting.acquire(timeout=5))
+        release.set()
+        for thread in [leader] + threads:
+            thread.join(5)
+        self.assertEqual(flight.in_flight(), 0)
+        return outcomes
+
+    def test_concurrent_calls_fetch_once(self):
+        fetch = mock.Mock(return_value={'lat': 6.45})
+        outcomes = self.run_concurrently(SingleFlight(), fetch)
+
+        fetch.assert_called_once_with()
+        self.assertTrue(all(outcome is outcomes[0] for outcome in outcomes))
+
+    def test_error_is_shared(self):
+        fetch = mock.Mock(side_effect=ConnectionError('Nominatim is down'))
+        outcomes = self.run_concurrently(SingleFlight(), fetch)
+
+        fetch.assert_called_once_with()
+        self.assertIsInstance(outcomes[0], ConnectionError)
+        self.assertTrue(all(outcome is outcomes[0] for outcome in outcomes))
+
+    def test_decorator_runs_again_once_done(self):
+        fetch = mock.Mock(side_effect=lambda address: address.upper())
+        geocode = single_flight(lambda address: address.lower())(fetch)
+
+        self.assertEqual(geocode('Lagos'), 'LAGOS')
+        self.assertEqual(geocode('lagos'), 'LAGOS')
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(geocode.flight.in_flight(), 0)
+
+
+class SweepTests(SimpleTestCase):
+    location = pvlib.location.Location(7.25, 5.19, 'Africa/Lagos')
+    times = pd.date_range('2024-03-01', '2024-03-14 23:00', freq='h', tz='Africa/Lagos')
+    modules = [MODULE, 'Canadian_Solar_CS5P_220M___2009_']
+    inverters = [INVERTER, 'iPower__SHO_5_2__240V_']
+
+    def test_ranking_matches_full_runs(self):
+        weather = make_weather(self.location, self.times)
+        table = run_sweep(self.location, weather, self.modules, self.inverters, [2, 1], surface_tilt=10, max_workers=1)
+
+        self.assertEqual(list(table.index), list(range(1, 9)))
+        energies = {}
+        for module in self.modules:
+            for inverter in self.inverters:
+                for modules_per_string in (1, 2):
+                    system = make_system(module, inverter, modules_per_string, surface_tilt=10)
+                    ac = run_scenarios(system, self.location, {'real': weather})['real']['ac']
+                    energies[module, inverter, modules_per_string] = np.nansum(ac) / 1000
+        ranked = sorted(energies, key=energies.get, reverse=True)
+        self.assertEqual(list(zip(table['module'], table['inverter'], table['modules_per_string'])), ranked)
+        np.testing.assert_allclose(table['energy_kwh'], [energies[key] for key in ranked])
+        # Two 220 W modules on the 250 W micro-inverter produce the most, and clip
+        best = table.loc[1]
+        self.assertEqual((best['module'], best['inverter'], best['modules_per_string']), (self.modules[1], INVERTER, 2))
+        self.assertGreater(best['clipping_loss_kwh'], 0)
+
+        by_clipping = run_sweep(
+            self.location, weather, self.modules, self.inverters, [1, 2], surface_tilt=10, max_workers=2,
+            rank_by='clipping_loss_pct',
+        )
+        pd.testing.assert_series_equal(by_clipping.loc[1], best)
+
+    def test_unknown_component(self):
+        weather = make_weather(self.location, self.times)
+        with self.assertRaisesMessage(ValueError, 'Unknown components: Nope'):
+            run_sweep(self.location, weather, self.modules, ['Nope'], [1], max_workers=1)
+
+
+class StreamTests(SimpleTestCase):
+    location = pvlib.location.Location(7.25, 5.19, 'Africa/Lagos')
+    times = pd.date_range('2024-01-15', '2024-07-10 23:00', freq='h', tz='Africa/Lagos')
+
+    def test_streamed_totals_match_daily_aggregates(self):
+        weather = make_weather(self.location, self.times)
+        system = make_system(modules_per_string=2, surface_tilt=10)
+        outputs = run_with_clear_sky(system, self.location, weather[['dni', 'ghi', 'dhi']])
+        hourly = weather.assign(
+            ac_power_output=outputs['real']['ac'], clear_sky_ac_power_output=outputs['clear_sky']['ac'],
+        )
+        daily = aggregate_daily(hourly)
+        monthly_energy = daily[['ac_power_output_energy_wh', 'clear_sky_ac_power_output_energy_wh']].resample('MS').sum() / 1000
+
+        def fetch_chunk(start, end):
+            return weather[(weather.index >= start) & (weather.index <= end)]
+
+        for chunk_freq in ('QS', 'MS', 'W'):
+            with self.subTest(chunk_freq=chunk_freq):
+                chunks = []
+                result = stream_scenarios(
+                    system, self.location, self.times[0], self.times[-1], fetch_chunk, chunk_freq, spill=chunks.append,
+                )
+                # Every hour is simulated exactly once
+                pd.testing.assert_index_equal(pd.concat(chunks).index, self.times)
+                monthly, totals = result['monthly'], result['totals']
+                np.testing.assert_allclose(monthly['energy_kwh'], monthly_energy['ac_power_output_energy_wh'])
+                np.testing.assert_allclose(
+                    monthly['clear_sky_energy_kwh'], monthly_energy['clear_sky_ac_power_output_energy_wh'],
+                )
+                self.assertAlmostEqual(totals['energy_kwh'], daily['ac_power_output_energy_wh'].sum() / 1000)
+                self.assertAlmostEqual(
+                    totals['clear_sky_energy_kwh'], daily['clear_sky_ac_power_output_energy_wh'].sum() / 1000,
+                )
+                self.assertAlmostEqual(totals['peak_power_w'], daily['ac_power_output_max'].max())
+                self.assertEqual(totals['hours'], hourly['ac_power_output'].count())
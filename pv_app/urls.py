@@ -7,6 +7,9 @@ urlpatterns=[
     path('map/',map_view,name='map'),
     path('pv_tracking/',PVTrackingView.as_view(),name='pv_tracking'),
     path('get-address-suggestions/', get_address_suggestions, name='get_address_suggestions'),
+    path('cache-stats/', cache_stats_view, name='cache_stats'),
+    path('locations/import/', import_locations_view, name='import_locations'),
+    path('components/<str:kind>/search/', search_components_view, name='search_components'),
 
     # path('upload/', DataUploadView.as_view(), name='upload_data'),
     # path('plot_data/', plot_data_view, name='plot_data'),
@@ -14,6 +17,9 @@ urlpatterns=[
     # # path('clean-and-visualize/', CleanAndVisualizeView.as_view(), name='clean_and_visualize'),
     # path('clean-and-visualize/', get_columns_view, name='clean_and_visualize'),
     path('run-simulation/', run_simulation_view, name='run_simulation'),
+    path('jobs/<int:job_id>/', simulation_job_status_view, name='simulation_job_status'),
+    path('jobs/<int:job_id>/cancel/', cancel_simulation_job_view, name='cancel_simulation_job'),
+    path('jobs/<int:job_id>/retry/', retry_simulation_job_view, name='retry_simulation_job'),
     path('update-graph/<int:simulation_id>/', update_graph_view, name='update_graph'),
     path('simulation/', SimulationInterfaceView.as_view(), name='simulation_interface'),
     path('list/<str:app_name>/<str:model_name>/', GenericListView.as_view(), name='generic_list'),
@@ -1,3 +1,5 @@
+import io
+
 from django.shortcuts import redirect, render, get_object_or_404
 from django.http import JsonResponse, HttpResponse
 from django.urls import reverse_lazy
@@ -7,18 +9,21 @@ from django.apps import apps
 from django.db import transaction
 from django.template.loader import render_to_string
 
-from geopy.geocoders import Nominatim
 from plotly.offline import plot
 import plotly.graph_objs as go
 
+from utils.cache import cache_manager
+from utils.component_search import component_indexes
 from utils.helper import generate_correlation_plot_with_regression, generate_plot
 
-from .models import PVSimulation
-from .forms import PVSimulationForm, PVTrackingForm, AddressForm, PlotForm, PlotTypeForm
+from .models import PVSimulation, SimulationJob, result_store, simulation_stages
+from .forms import PVSimulationForm, PVTrackingForm, AddressForm, PlotForm, PlotTypeForm, LocationImportForm, GraphWindowForm
+from .importers import import_locations
+from .jobs import enqueue_simulation, retry_job
 from utils.pv import (
     interactive_map, get_timezone_from_address, plot_puv_index_max, plot_temperature, plot_uv_index_clear_sky_max, 
     plot_wind_speed, plot_ghi, plot_dni, plot_relative_humidity, 
-    plot_pressure, plot_dhi, pv_tracking
+    plot_pressure, plot_dhi, pv_tracking, suggest_addresses
 )
 
 # Create your views here.
@@ -55,6 +60,7 @@ class GenericDetailView(DetailView):
         context['model_name']=self.kwargs['model_name']
         context['app_name']=self.kwargs['app_name']
         context['plot_form']=PlotTypeForm
+        context['window_form']=GraphWindowForm
         context['title']=self.kwargs['model_name'].title()
 
         get_context_heper(self, context)
@@ -191,21 +197,39 @@ class GenericListView(ListView):
         return model
 
 def run_simulation_view(request):
+    job = None
     if request.method == 'POST':
         form = PVSimulationForm(request.POST)
         if form.is_valid():
             # Save the simulation object
             simulation = form.save()
 
-            # Run the simulation (method from the model)
-            result = simulation.run_simulation()
-
-            # Redirect to the results page or render the results in the same template
-            return render(request, 'simulation_results.html', {'result': result, 'simulation': simulation})
+            # Queue the simulation for the workers (run_simulation_workers); the page polls its progress
+            job = enqueue_simulation(simulation)
+            form = PVSimulationForm()
     else:
         form = PVSimulationForm()
 
-    return render(request, 'simulation_form.html', {'form': form})
+    return render(request, 'simulation_form.html', {'form': form, 'job': job})
+
+
+def simulation_job_status_view(request, job_id):
+    job = get_object_or_404(SimulationJob, pk=job_id)
+    return render(request, 'include/job_status.html', {'job': job})
+
+
+def cancel_simulation_job_view(request, job_id):
+    job = get_object_or_404(SimulationJob, pk=job_id)
+    if request.method == 'POST':
+        job.cancel()
+    return render(request, 'include/job_status.html', {'job': job})
+
+
+def retry_simulation_job_view(request, job_id):
+    job = get_object_or_404(SimulationJob, pk=job_id)
+    if request.method == 'POST':
+        job = retry_job(job)
+    return render(request, 'include/job_status.html', {'job': job})
 
 # Dynamic Delete View
 def dynamic_delete(request, app_name, model_name, pk):
@@ -239,10 +263,19 @@ def update_graph_view(request, simulation_id):
     purpose_of_plot = request.GET.get('purpose_of_plot', 'power_output')  # Default to 'line'
     
     
-    # Run the simulation once and get the result
-    simulation_result = simulation.run_simulation()
-    result = simulation_result.get('weather_df')
-    daily = simulation_result.get('daily_weather_df')
+    # Zoom window and resolution; naive datetimes are local to the simulation's location
+    window_form = GraphWindowForm(request.GET)
+    window = window_form.cleaned_data if window_form.is_valid() else {}
+    start = window.get('start')
+    end = window.get('end')
+    resolution = window.get('resolution') or None
+
+    # Only the window and the plotted columns are read from the stored result,
+    # so zooming or toggling variables never reruns the simulation nor loads the whole year
+    result = simulation.read_results('weather_df', start, end, columns=selected_variables, resolution=resolution)
+    daily = simulation.read_results(
+        'daily_weather_df', start, end, columns=['uv_index_max', 'uv_index_clear_sky_max'], resolution=resolution,
+    )
     
     if result is None or daily is None:
         return render(request, 'graph.html', {'graph': 'No data available'})
@@ -373,15 +406,56 @@ def get_address_suggestions(request):
     suggestions = []
 
     if query:
-        geolocator = Nominatim(user_agent="abcd")
-        locations = geolocator.geocode(query, exactly_one=False, limit=100)  # Limit to 100 suggestions
-
-        if locations:
-            suggestions = [location.address for location in locations]
+        # Concurrent keystrokes for the same prefix share one Nominatim call
+        suggestions = suggest_addresses(query, limit=100)
 
     return render(request, 'options.html', {'suggestions': suggestions})
 
 
+def import_locations_view(request):
+    form = LocationImportForm(request.POST or None, request.FILES or None)
+    stats, error = None, None
+    if request.method == 'POST' and form.is_valid():
+        # Stream the upload instead of reading it into memory
+        lines = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+        try:
+            stats = import_locations(lines)
+        except (ValueError, UnicodeDecodeError) as exception:
+            error = str(exception)
+    return render(request, 'location_import.html', {'form': form, 'stats': stats, 'error': error})
+
+
+def _float_param(request, name):
+    try:
+        return float(request.GET[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def search_components_view(request, kind):
+    index = component_indexes.get(kind)
+    if index is None:
+        return HttpResponse(status=404)
+    # The picker input sends its own value under the field name ('inverter' or 'module')
+    query = request.GET.get('q', request.GET.get(kind, ''))
+    components = index.search(
+        query,
+        min_power=_float_param(request, 'min_power'),
+        max_power=_float_param(request, 'max_power'),
+        min_voltage=_float_param(request, 'min_voltage'),
+        max_voltage=_float_param(request, 'max_voltage'),
+    )
+    return render(request, 'component_options.html', {'components': components, 'kind': kind})
+
+
+def cache_stats_view(request):
+    # Hit rate, size and eviction counters of the HTTP and result caches used by this worker
+    stats = cache_manager.stats()
+    stats['simulation_results'] = result_store.stats()
+    stats['simulation_stages'] = simulation_stages.stats()
+    return JsonResponse(stats)
+
+
 def map_view(request):
     address = 'Nigeria'
     form = AddressForm(request.POST or None)
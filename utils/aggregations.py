@@ -0,0 +1,84 @@
+import pandas as pd
+
+# Daily Open-Meteo variables that can be computed from an hourly variable:
+# daily name -> (hourly column, aggregation)
+DERIVED_DAILY_VARIABLES = {
+    'uv_index_max': ('uv_index', 'max'),
+    'uv_index_clear_sky_max': ('uv_index_clear_sky', 'max'),
+}
+
+# Aggregations computed for every hourly column by `aggregate_daily`
+DAILY_AGGREGATIONS = ('max', 'min', 'mean', 'sum')
+
+# Power columns (W) integrated into daily energy (Wh) by `aggregate_daily`
+ENERGY_COLUMNS = ('ac_power_output', 'clear_sky_ac_power_output')
+
+
+def sample_hours(index):
+    """
+    Length of one sample in hours, taken from the most common spacing.
+    """
+    if len(index) < 2:
+        return 1.0
+    return pd.Series(index[1:] - index[:-1]).mode().iloc[0] / pd.Timedelta(hours=1)
+
+
+def derive_daily_variables(hourly_df, names):
+    """
+    Compute daily Open-Meteo variables from the hourly frame.
+
+    Days follow the timezone of the hourly index.
+
+    Parameters:
+    - hourly_df: DataFrame with a DatetimeIndex and the source hourly columns
+    - names: daily variable names, keys of DERIVED_DAILY_VARIABLES
+
+    Returns:
+    - DataFrame indexed by day with one column per name
+    """
+    sources = {name: DERIVED_DAILY_VARIABLES[name] for name in names}
+    columns = sorted({column for column, _ in sources.values()})
+    resampled = hourly_df[columns].resample('D')
+    daily = pd.DataFrame({name: resampled[column].agg(aggregation) for name, (column, aggregation) in sources.items()})
+    daily.index.name = 'datetime'
+    return daily
+
+
+def aggregate_daily(hourly_df, columns=None, aggregations=DAILY_AGGREGATIONS, energy_columns=ENERGY_COLUMNS):
+    """
+    Summarise an hourly frame per day with vectorized resampling.
+
+    Every column gets '<column>_<aggregation>' summaries and every power
+    column in `energy_columns` a '<column>_energy_wh' daily energy total.
+    Derivable daily variables (see DERIVED_DAILY_VARIABLES) are added under
+    their Open-Meteo names when their source column is present.
+
+    Parameters:
+    - hourly_df: DataFrame with a DatetimeIndex
+    - columns: columns to summarise, defaults to every numeric column
+    - aggregations: aggregations applied to each column
+    - energy_columns: power columns (W) to integrate into energy (Wh)
+
+    Returns:
+    - DataFrame indexed by day (in the timezone of the hourly index)
+    """
+    if columns is None:
+        columns = list(hourly_df.select_dtypes('number').columns)
+    resampled = hourly_df[columns].resample('D')
+    daily = resampled.agg(list(aggregations))
+    daily.columns = [f'{column}_{aggregation}' for column, aggregation in daily.columns]
+
+    step_hours = sample_hours(hourly_df.index)
+    for column in energy_columns:
+        if column in hourly_df:
+            daily[f'{column}_energy_wh'] = hourly_df[column].resample('D').sum() * step_hours
+
+    # 'uv_index' summarised with 'max' already yields 'uv_index_max'
+    derivable = [
+        name for name, (column, _) in DERIVED_DAILY_VARIABLES.items()
+        if column in hourly_df and name not in daily.columns
+    ]
+    if derivable:
+        daily = derive_daily_variables(hourly_df, derivable).join(daily)
+    daily.index.name = 'datetime'
+    return daily
@@ -0,0 +1,245 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests_cache
+from requests_cache.serializers import SerializerPipeline, Stage
+from requests_cache.serializers.preconf import base_stage
+
+# Directory holding one SQLite file per cache namespace
+CACHE_DIR = os.path.join(os.getcwd(), 'cache')
+
+# Per-namespace settings:
+# - ttl: seconds before a cached response expires (None never expires)
+# - max_bytes: size of the namespace's file above which least recently used
+#   responses are evicted (None disables the limit)
+# - compress: zlib-compress stored response bodies
+# Override or extend them with HTTP_CACHE_NAMESPACES in the Django settings.
+DEFAULT_NAMESPACES = {
+    # Open-Meteo weather requests (utils.extractors)
+    'openmeteo': {'ttl': 3600, 'max_bytes': 256 * 1024 * 1024, 'compress': True},
+    # Every other `requests` call: PVGIS, Nominatim geocoding
+    'http': {'ttl': 3600, 'max_bytes': 128 * 1024 * 1024, 'compress': True},
+}
+
+# Evict down to this fraction of max_bytes so eviction does not run on every write
+EVICTION_TARGET = 0.9
+
+compressed_pickle_serializer = SerializerPipeline(
+    [base_stage, Stage(pickle), Stage(zlib, dumps='compress', loads='decompress')],
+    name='pickle_zlib',
+    is_binary=True,
+)
+
+
+def _django_setting(name, default=None):
+    try:
+        from django.conf import settings
+        if settings.configured:
+            return getattr(settings, name, default)
+    except ImportError:
+        pass
+    return default
+
+
+class CacheNamespace:
+    """
+    One HTTP cache namespace: a requests_cache SQLite file with its own TTL,
+    size limit, compression and hit/miss counters.
+
+    Access times are kept in a `cache_access` table next to the cached
+    responses, which is what least-recently-used eviction is based on.
+    """
+
+    def __init__(self, name, path, ttl=3600, max_bytes=None, compress=True):
+        self.name = name
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self.bytes_fetched = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._backend = None
+
+    def session_kwargs(self):
+        """
+        Keyword arguments for CachedSession/install_cache.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if self._backend is None:
+            self._backend = requests_cache.SQLiteCache(
+                self.path,
+                serializer=compressed_pickle_serializer if self.compress else 'pickle',
+            )
+            self._init_access_table()
+        return {
+            'cache_name': self.path,
+            'backend': self._backend,
+            'expire_after': self.ttl if self.ttl is not None else requests_cache.NEVER_EXPIRE,
+        }
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _init_access_table(self):
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS cache_access (key TEXT PRIMARY KEY, accessed REAL)')
+
+    def record(self, response):
+        """
+        Count a hit/miss, stamp the access time and evict if over the limit.
+        Called once the response has been saved to the cache.
+        """
+        size = len(response.content or b'')
+        from_cache = getattr(response, 'from_cache', False)
+        key = getattr(response, 'cache_key', None)
+        with self._lock:
+            if from_cache:
+                self.hits += 1
+                self.bytes_served += size
+            else:
+                self.misses += 1
+                self.bytes_fetched += size
+        if key:
+            try:
+                with self._connect() as connection:
+                    connection.execute(
+                        'INSERT OR REPLACE INTO cache_access (key, accessed) VALUES (?, ?)', (key, time.time())
+                    )
+            except sqlite3.Error as error:
+                print(f"Could not record cache access for {self.name}: {error}")
+        if not from_cache:
+            self.enforce_limit()
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def enforce_limit(self):
+        """
+        Evict least recently used responses until the file fits in max_bytes.
+        """
+        if self.max_bytes is None or self.size() <= self.max_bytes or self._backend is None:
+            return
+        with self._lock, self._connect() as connection:
+            rows = connection.execute(
+                'SELECT r.key, LENGTH(r.value), COALESCE(a.accessed, 0) FROM responses r '
+                'LEFT JOIN cache_access a ON a.key = r.key ORDER BY 3 ASC'
+            ).fetchall()
+            total = sum(length for _, length, _ in rows)
+            target = self.max_bytes * EVICTION_TARGET
+            evicted = []
+            for key, length, _ in rows:
+                if total <= target:
+                    break
+                evicted.append(key)
+                total -= length
+            if evicted:
+                connection.executemany('DELETE FROM cache_access WHERE key = ?', [(key,) for key in evicted])
+        if evicted:
+            self._backend.delete(*evicted, vacuum=True)
+            self.evictions += len(evicted)
+            print(f"Evicted {len(evicted)} responses from the {self.name} cache")
+
+    def stats(self):
+        requests_seen = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests_seen if requests_seen else None,
+            'bytes_served': self.bytes_served,
+            'bytes_fetched': self.bytes_fetched,
+            'evictions': self.evictions,
+            'size_bytes': self.size(),
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+        }
+
+    def clear(self):
+        if self._backend is not None:
+            self._backend.clear()
+        with self._connect() as connection:
+            connection.execute('DELETE FROM cache_access')
+
+
+class NamespacedCachedSession(requests_cache.CachedSession):
+    """
+    CachedSession reporting every response to its CacheNamespace.
+    """
+
+    namespace = None
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if self.namespace is not None:
+            self.namespace.record(response)
+        return response
+
+
+class CacheManager:
+    """
+    Single entry point for the app's HTTP caches.
+
+    Namespaces are configured from DEFAULT_NAMESPACES, overridden by the
+    HTTP_CACHE_DIR and HTTP_CACHE_NAMESPACES Django settings when available.
+    """
+
+    def __init__(self, cache_dir=None, namespaces=None):
+        self._cache_dir = cache_dir
+        self._namespace_settings = namespaces
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    def _settings(self):
+        settings = {name: dict(options) for name, options in DEFAULT_NAMESPACES.items()}
+        overrides = self._namespace_settings
+        if overrides is None:
+            overrides = _django_setting('HTTP_CACHE_NAMESPACES', {})
+        for name, options in overrides.items():
+            settings.setdefault(name, {}).update(options)
+        return settings
+
+    def namespace(self, name):
+        with self._lock:
+            if name not in self._namespaces:
+                cache_dir = self._cache_dir or _django_setting('HTTP_CACHE_DIR', CACHE_DIR)
+                options = self._settings()[name]
+                self._namespaces[name] = CacheNamespace(name, os.path.join(str(cache_dir), f'{name}.sqlite'), **options)
+            return self._namespaces[name]
+
+    def session(self, name):
+        """
+        A CachedSession storing its responses in namespace `name`.
+        """
+        namespace = self.namespace(name)
+        session = NamespacedCachedSession(**namespace.session_kwargs())
+        session.namespace = namespace
+        return session
+
+    def install_global(self, name='http'):
+        """
+        Patch `requests` so every session (including those created by pvlib
+        and geopy) caches into namespace `name`.
+        """
+        namespace = self.namespace(name)
+
+        session_factory = type('GlobalCachedSession', (NamespacedCachedSession,), {'namespace': namespace})
+        options = namespace.session_kwargs()
+        requests_cache.install_cache(options.pop('cache_name'), session_factory=session_factory, **options)
+
+    def stats(self):
+        """
+        Counters and sizes of every namespace in use, keyed by name.
+        """
+        with self._lock:
+            namespaces = list(self._namespaces.values())
+        return {namespace.name: namespace.stats() for namespace in namespaces}
+
+
+cache_manager = CacheManager()
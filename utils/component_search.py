@@ -0,0 +1,137 @@
+import bisect
+import re
+import threading
+
+import numpy as np
+
+from .sam_catalogue import inverter_catalogue, module_catalogue
+
+# Maximum number of components returned by a search
+SEARCH_LIMIT = 50
+
+
+def tokenize(text):
+    """
+    Lowercase alphanumeric tokens of a component name or query.
+    """
+    return [token for token in re.split(r'[^0-9a-z]+', str(text).lower()) if token]
+
+
+def manufacturer(name, kind='inverter'):
+    """
+    Manufacturer part of a SAM component name: the text before the first
+    '__' for CEC inverters ('ABB' in 'ABB__MICRO_0_25_I_OUTD_US_208__208V_'),
+    the first token for Sandia modules ('SunPower' in 'SunPower_SPR_200_BLK__2004__E__').
+    """
+    head = name.split('__')[0] if kind == 'inverter' and '__' in name else name.split('_')[0]
+    return head.replace('_', ' ').strip()
+
+
+class ComponentIndex:
+    """
+    Search index over one SAM component library.
+
+    Name tokens are kept in a sorted list mapped to the positions of the
+    components containing them, so every query token is a prefix lookup;
+    the positions of all query tokens are intersected. Power and voltage
+    filters are vectorized masks over the catalogue's numeric matrix:
+
+    - power: AC rating (Paco) for inverters, Impo * Vmpo at STC for modules
+    - voltage window: for inverters the MPPT range [Mppt_low, Mppt_high]
+      must contain [min_voltage, max_voltage]; for modules Vmpo must lie
+      inside it
+
+    The index is built on first use, once per process.
+    """
+
+    def __init__(self, catalogue, kind):
+        self.catalogue = catalogue
+        self.kind = kind
+        self._tokens = None
+        self._token_positions = None
+        self._lock = threading.Lock()
+
+    def _column(self, parameter):
+        return np.asarray(self.catalogue.values[:, self.catalogue.numeric_parameters.index(parameter)])
+
+    def _build(self):
+        positions = {}
+        for position, name in enumerate(self.catalogue.keys()):
+            for token in set(tokenize(name)):
+                positions.setdefault(token, []).append(position)
+        self._tokens = sorted(positions)
+        self._token_positions = [np.array(positions[token]) for token in self._tokens]
+        if self.kind == 'inverter':
+            self.power = self._column('Paco')
+            self.voltage_low = self._column('Mppt_low')
+            self.voltage_high = self._column('Mppt_high')
+        else:
+            self.power = self._column('Impo') * self._column('Vmpo')
+            self.voltage_low = self.voltage_high = self._column('Vmpo')
+
+    def ensure_built(self):
+        if self._tokens is None:
+            with self._lock:
+                if self._tokens is None:
+                    self._build()
+
+    def _token_matches(self, token):
+        low = bisect.bisect_left(self._tokens, token)
+        high = bisect.bisect_left(self._tokens, token + '\uffff')
+        if low == high:
+            return np.array([], dtype=int)
+        return np.unique(np.concatenate(self._token_positions[low:high]))
+
+    def search(self, query='', min_power=None, max_power=None, min_voltage=None, max_voltage=None, limit=SEARCH_LIMIT):
+        """
+        Components matching every query token (as a prefix) and the filters.
+
+        Parameters:
+        - query: str, free text such as 'sma 240v'
+        - min_power, max_power: float, power range in W
+        - min_voltage, max_voltage: float, voltage window in V
+        - limit: int, maximum number of results
+
+        Returns:
+        - list of dicts with 'name', 'manufacturer', 'power' and the voltage range, sorted by power
+        """
+        self.ensure_built()
+        names = self.catalogue.keys()
+        mask = np.ones(len(names), dtype=bool)
+        for token in tokenize(query):
+            token_mask = np.zeros(len(names), dtype=bool)
+            token_mask[self._token_matches(token)] = True
+            mask &= token_mask
+        with np.errstate(invalid='ignore'):
+            if min_power is not None:
+                mask &= self.power >= min_power
+            if max_power is not None:
+                mask &= self.power <= max_power
+            if self.kind == 'inverter':
+                if min_voltage is not None:
+                    mask &= self.voltage_low <= min_voltage
+                if max_voltage is not None:
+                    mask &= self.voltage_high >= max_voltage
+            else:
+                if min_voltage is not None:
+                    mask &= self.voltage_low >= min_voltage
+                if max_voltage is not None:
+                    mask &= self.voltage_high <= max_voltage
+        positions = np.flatnonzero(mask)
+        positions = positions[np.argsort(self.power[positions], kind='stable')][:limit]
+        return [
+            {
+                'name': names[position],
+                'manufacturer': manufacturer(names[position], self.kind),
+                'power': float(self.power[position]),
+                'voltage_low': float(self.voltage_low[position]),
+                'voltage_high': float(self.voltage_high[position]),
+            }
+            for position in positions
+        ]
+
+
+component_indexes = {
+    'inverter': ComponentIndex(inverter_catalogue, 'inverter'),
+    'module': ComponentIndex(module_catalogue, 'module'),
+}
@@ -3,16 +3,36 @@ from datetime import datetime,date
 import requests
 
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import openmeteo_requests
-import requests_cache
 from datetime import datetime, timedelta
 from retry_requests import retry
 
+from .aggregations import DERIVED_DAILY_VARIABLES, derive_daily_variables
+from .cache import cache_manager
+from .singleflight import SingleFlight
+from .weather_store import as_date, site_key, snap_to_cell, weather_store
+
 # Setup the Open-Meteo API client with cache and retry on error
-cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
+cache_session = cache_manager.session('openmeteo')
 retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
 openmeteo = openmeteo_requests.Client(session=retry_session)
 
+# Maximum number of date windows requested from Open-Meteo at the same time
+MAX_CONCURRENT_REQUESTS = 4
+
+# Maximum number of sites sent to Open-Meteo in one multi-site request
+MAX_SITES_PER_REQUEST = 50
+
+# Identical Open-Meteo requests made concurrently share one upstream call
+weather_requests = SingleFlight()
+
+# Days fetched on each side of a range whose daily values are derived
+# locally, so the UTC days fetched cover every local day of the range
+LOCAL_DAY_PADDING = timedelta(days=1)
+
 
 
 
@@ -87,116 +107,519 @@ def generate_date_ranges(start_date, end_date, delta_days=30):
     if (end - start).days <= delta_days:
         ranges.append((start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")))
     else:
-        while start < end:
+        while start <= end:
             range_end = min(start + timedelta(days=delta_days - 1), end)
             ranges.append((start.strftime("%Y-%m-%d"), range_end.strftime("%Y-%m-%d")))
             start = range_end + timedelta(days=1)
     
     return ranges
 
-def fetch_weather_data(start_date, end_date, latitude, longitude):
+# Hourly Open-Meteo variables, in request order, and the frame columns each
+# one is decoded into (the irradiance components get pvlib's names)
+HOURLY_VARIABLES = {
+    'temperature_2m': ('temperature_2m',),
+    'dewpoint_2m': ('dewpoint_2m',),
+    'relative_humidity_2m': ('relative_humidity_2m',),
+    'surface_pressure': ('surface_pressure',),
+    'precipitation': ('precipitation',),
+    'snowfall': ('snowfall',),
+    'windspeed_10m': ('windspeed_10m',),
+    'winddirection_10m': ('winddirection_10m',),
+    'windgusts_10m': ('windgusts_10m',),
+    'cloudcover': ('cloudcover',),
+    'shortwave_radiation': ('ghi', 'shortwave_radiation'),
+    'direct_radiation': ('direct_radiation',),
+    'direct_normal_irradiance': ('dni',),
+    'diffuse_radiation': ('dhi',),
+    'global_tilted_irradiance': ('global_tilted_irradiance',),
+    'precipitation_probability': ('precipitation_probability',),
+    'uv_index': ('uv_index',),
+    'uv_index_clear_sky': ('uv_index_clear_sky',),
+}
+
+# Daily Open-Meteo variables and their frame columns
+DAILY_VARIABLES = {
+    'uv_index_max': ('uv_index_max',),
+    'uv_index_clear_sky_max': ('uv_index_clear_sky_max',),
+}
+
+
+def resolve_variables(names, catalogue):
     """
-    Fetch weather data from Open-Meteo API for a given date range and location.
+    Map requested names onto Open-Meteo variables of `catalogue`.
+
+    Parameters:
+    - names: iterable of Open-Meteo variable names or frame column names
+      (e.g. 'ghi' for 'shortwave_radiation'), or None for every variable
+    - catalogue: HOURLY_VARIABLES or DAILY_VARIABLES
+
+    Returns:
+    - list: Open-Meteo variable names in catalogue order
+    """
+    if names is None:
+        return list(catalogue)
+    if isinstance(names, str):
+        names = [names]
+    wanted = set()
+    for name in names:
+        matches = [variable for variable, columns in catalogue.items() if name == variable or name in columns]
+        if not matches:
+            raise ValueError(f"Unknown weather variable: {name}")
+        wanted.update(matches)
+    return [variable for variable in catalogue if variable in wanted]
+
+
+def split_variables(names):
+    """
+    Split a mixed list of hourly and daily names into the Open-Meteo variables
+    to request for each interval.
+
+    Returns:
+    - tuple: (hourly variables, daily variables)
+    """
+    if names is None:
+        return list(HOURLY_VARIABLES), list(DAILY_VARIABLES)
+    if isinstance(names, str):
+        names = [names]
+    daily_columns = {column for columns in DAILY_VARIABLES.values() for column in columns}
+    daily_names = [name for name in names if name in DAILY_VARIABLES or name in daily_columns]
+    hourly_names = [name for name in names if name not in daily_names]
+    return resolve_variables(hourly_names, HOURLY_VARIABLES), resolve_variables(daily_names, DAILY_VARIABLES)
+
+
+def fetch_weather_data_batch(start_date, end_date, latitudes, longitudes, hourly_variables=None, daily_variables=None):
+    """
+    Fetch one date window for several sites with a single Open-Meteo request.
+
+    The coordinates are sent as comma-separated lists and Open-Meteo answers
+    with one response per site, in the same order.
     """
+    hourly_variables = resolve_variables(hourly_variables, HOURLY_VARIABLES)
+    daily_variables = resolve_variables(daily_variables, DAILY_VARIABLES)
     url = "https://historical-forecast-api.open-meteo.com/v1/forecast"
     params = {
-        "latitude": latitude,
-        "longitude": longitude,
+        "latitude": ",".join(str(latitude) for latitude in latitudes),
+        "longitude": ",".join(str(longitude) for longitude in longitudes),
         "start_date": start_date,
         "end_date": end_date,
-        "hourly": "temperature_2m,dewpoint_2m,relative_humidity_2m,surface_pressure,precipitation,snowfall,windspeed_10m,winddirection_10m,windgusts_10m,cloudcover,shortwave_radiation,direct_radiation,direct_normal_irradiance,diffuse_radiation,global_tilted_irradiance,precipitation_probability",
-        "daily": ["uv_index_max", "uv_index_clear_sky_max"],
     }
-    responses = openmeteo.weather_api(url, params=params)
+    if hourly_variables:
+        params["hourly"] = ",".join(hourly_variables)
+    if daily_variables:
+        params["daily"] = daily_variables
+    key = (url, tuple((name, tuple(value) if isinstance(value, list) else value) for name, value in sorted(params.items())))
+    return weather_requests.do(key, openmeteo.weather_api, url, params=params)
+
+
+def fetch_weather_data(start_date, end_date, latitude, longitude, hourly_variables=None, daily_variables=None):
+    """
+    Fetch weather data from Open-Meteo API for a given date range and location.
+
+    Only the requested variables are asked for (every variable by default),
+    which keeps responses and cache rows small.
+    """
+    responses = fetch_weather_data_batch(start_date, end_date, [latitude], [longitude], hourly_variables, daily_variables)
     return responses[0]
 
-def process_weather_response(response, user_timezone="Europe/Berlin"):
+
+def _decode_block(block, variables, catalogue, user_timezone):
+    """
+    Decode an Hourly() or Daily() block into a frame with a 'datetime' column.
+
+    Open-Meteo returns variables in the order they were requested, so the
+    values are matched to their names by position in `variables`.
+    """
+    if block is None or not variables:
+        return pd.DataFrame({"datetime": pd.DatetimeIndex([], tz=user_timezone)})
+
+    data = {"datetime": pd.date_range(
+        start=pd.to_datetime(block.Time(), unit="s", utc=True),
+        end=pd.to_datetime(block.TimeEnd(), unit="s", utc=True),
+        freq=pd.Timedelta(seconds=block.Interval()),
+        inclusive="left"
+    ).tz_convert(user_timezone)}
+    for position, variable in enumerate(variables):
+        values = block.Variables(position).ValuesAsNumpy()
+        for column in catalogue[variable]:
+            data[column] = values
+    return pd.DataFrame(data)
+
+
+def process_weather_response(response, user_timezone="Europe/Berlin", hourly_variables=None, daily_variables=None):
     """
     Process the weather API response and convert it to a DataFrame with correctly spaced datetime indices.
+
+    `hourly_variables` and `daily_variables` must be the variables the
+    response was requested with (every variable by default). Hourly times
+    are converted to `user_timezone`, daily times stay in UTC.
     """
-    hourly = response.Hourly()
-    daily = response.Daily()
-    
-    # If `hourly.Time()` returns a single timestamp
-    first_timestamp = pd.to_datetime(hourly.Time(), unit="s", utc=True).tz_convert(user_timezone)
+    hourly_variables = resolve_variables(hourly_variables, HOURLY_VARIABLES)
+    daily_variables = resolve_variables(daily_variables, DAILY_VARIABLES)
+    hourly_df = _decode_block(response.Hourly() if hourly_variables else None, hourly_variables, HOURLY_VARIABLES, user_timezone)
+    daily_df = _decode_block(response.Daily() if daily_variables else None, daily_variables, DAILY_VARIABLES, "UTC")
+    return {'hourly_df': hourly_df, 'daily_df': daily_df}
 
-    # Assuming the interval between data points is 1 hour (3600 seconds)
-    interval_seconds = 3600
 
-    # Generate the datetime index using the first timestamp and the number of periods
-    date_range = pd.date_range(
-        start=first_timestamp,
-        periods=len(hourly.Variables(0).ValuesAsNumpy()),  # Assuming the number of periods matches the length of data
-        freq=pd.Timedelta(seconds=interval_seconds)
-    )
-    
-    # Create a dictionary for the DataFrame
-    hourly_data = {
-        "datetime": date_range,
-        "temperature_2m": hourly.Variables(0).ValuesAsNumpy(),
-        "dewpoint_2m": hourly.Variables(1).ValuesAsNumpy(),
-        "relative_humidity_2m": hourly.Variables(2).ValuesAsNumpy(),
-        "surface_pressure": hourly.Variables(3).ValuesAsNumpy(),
-        "precipitation": hourly.Variables(4).ValuesAsNumpy(),
-        "snowfall": hourly.Variables(5).ValuesAsNumpy(),
-        "windspeed_10m": hourly.Variables(6).ValuesAsNumpy(),
-        "winddirection_10m": hourly.Variables(7).ValuesAsNumpy(),
-        "windgusts_10m": hourly.Variables(8).ValuesAsNumpy(),
-        "cloudcover": hourly.Variables(9).ValuesAsNumpy(),
-        "ghi": hourly.Variables(10).ValuesAsNumpy(),
-        "shortwave_radiation": hourly.Variables(10).ValuesAsNumpy(),
-        "direct_radiation": hourly.Variables(11).ValuesAsNumpy(),
-        # "direct_normal_irradiance": hourly.Variables(12).ValuesAsNumpy(),
-        "dni": hourly.Variables(12).ValuesAsNumpy(),
-        # "diffuse_radiation": hourly.Variables(13).ValuesAsNumpy(),
-        "dhi": hourly.Variables(13).ValuesAsNumpy(),
-        # "ghi": hourly.Variables(14).ValuesAsNumpy(),
-        "global_tilted_irradiance": hourly.Variables(14).ValuesAsNumpy(),
-        "precipitation_probability": hourly.Variables(15).ValuesAsNumpy(),
-        
-    }
-    daily_data = {"datetime": pd.date_range(
-	start = pd.to_datetime(daily.Time(), unit = "s", utc = True),
-	end = pd.to_datetime(daily.TimeEnd(), unit = "s", utc = True),
-	freq = pd.Timedelta(seconds = daily.Interval()),
-	inclusive = "left"
-    ),
-    "uv_index_max":daily.Variables(0).ValuesAsNumpy(),
-    "uv_index_clear_sky_max":daily.Variables(1).ValuesAsNumpy(),
-    
-}
-    
-    daily_df=pd.DataFrame(daily_data)
-    # Convert the dictionary to a DataFrame
-    df = pd.DataFrame(hourly_data)
-    
-    # Set datetime as the index
-    # df.set_index("datetime", inplace=True)
-    
-    return {'hourly_df':df,'daily_df':daily_df}
+def fetch_weather_window(date_range, latitude, longitude, hourly_variables=None, daily_variables=None):
+    """
+    Fetch a single (start, end) date window and measure how long the request took.
+    """
+    start, end = date_range
+    started = time.perf_counter()
+    response = fetch_weather_data(start, end, latitude, longitude, hourly_variables, daily_variables)
+    elapsed = time.perf_counter() - started
+    print(f"Fetched data from {start} to {end} in {elapsed:.2f}s")
+    return response, elapsed
 
 
-def fetch_all_weather_data(start_date, end_date, latitude, longitude,user_timezone,df_interval='hourly'):
+def fetch_weather_windows(date_ranges, latitude, longitude, user_timezone, max_workers=MAX_CONCURRENT_REQUESTS, hourly_variables=None, daily_variables=None):
     """
-    Fetch weather data for a range of dates, handling up to 30 days at a time.
+    Fetch and decode a list of (start, end) date windows.
+
+    The windows are requested concurrently with at most `max_workers`
+    requests in flight (use 1 for sequential fetching). Each response is
+    decoded once and results are concatenated in date order; the per-window
+    timings are available in `df.attrs['window_timings']` on both frames.
+
+    Returns:
+    - dict: {'hourly_df': DataFrame, 'daily_df': DataFrame}
     """
-    date_ranges = generate_date_ranges(start_date, end_date, delta_days=30)
+    hourly_variables = resolve_variables(hourly_variables, HOURLY_VARIABLES)
+    daily_variables = resolve_variables(daily_variables, DAILY_VARIABLES)
     all_hourly_data_frames = []
     all_daily_data_frames = []
-    
-    for start, end in date_ranges:
-        print(f"Fetching data from {start} to {end}")
-        response = fetch_weather_data(start, end, latitude, longitude)
-        hourly_df = process_weather_response(response,user_timezone).get('hourly_df')
-        daily_df = process_weather_response(response,user_timezone).get('daily_df')
-        all_daily_data_frames.append(daily_df)
-        all_hourly_data_frames.append(hourly_df)
+    window_timings = []
+
+    def fetch(date_range):
+        return fetch_weather_window(date_range, latitude, longitude, hourly_variables, daily_variables)
+
+    workers = max(1, min(max_workers, len(date_ranges)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # executor.map yields results in submission order, so the frames stay sorted
+        for (start, end), (response, elapsed) in zip(date_ranges, executor.map(fetch, date_ranges)):
+            frames = process_weather_response(response, user_timezone, hourly_variables, daily_variables)
+            all_hourly_data_frames.append(frames['hourly_df'])
+            all_daily_data_frames.append(frames['daily_df'])
+            window_timings.append({'start': start, 'end': end, 'seconds': elapsed})
     
     # Combine all DataFrames into one
     daily_df_all= pd.concat(all_daily_data_frames, ignore_index=True)
     hourly_df_all= pd.concat(all_hourly_data_frames, ignore_index=True)
     hourly_df_all.set_index('datetime', inplace=True)
     daily_df_all.set_index('datetime', inplace=True)
+    hourly_df_all.attrs['window_timings'] = window_timings
+    daily_df_all.attrs['window_timings'] = window_timings
+    return {'hourly_df': hourly_df_all, 'daily_df': daily_df_all}
+
+
+def _frame_columns(variables, catalogue):
+    return [column for variable in variables for column in catalogue[variable]]
+
+
+def _variable_columns(variables, catalogue):
+    return {variable: catalogue[variable] for variable in variables}
+
+
+def fetch_stored_weather_frames(start_date, end_date, latitude, longitude, user_timezone, max_workers=MAX_CONCURRENT_REQUESTS, store=weather_store, key=None, hourly_variables=None, daily_variables=None):
+    """
+    Serve a date range from the local weather store, fetching only the gaps.
+
+    The store tracks which days each variable has been fetched for. Days of
+    [start_date, end_date] where any requested variable is missing, and the
+    most recent days, are grouped into contiguous runs, fetched in 30-day windows and merged into
+    the store; the requested columns are then read back locally. Variables
+    fetched earlier as part of a larger set are reused.
+    """
+    hourly_variables = resolve_variables(hourly_variables, HOURLY_VARIABLES)
+    daily_variables = resolve_variables(daily_variables, DAILY_VARIABLES)
+    if key is None:
+        key = site_key(latitude, longitude)
+    missing = store.missing_ranges(key, start_date, end_date, hourly_variables, daily_variables)
+    date_ranges = [window for first, last in missing for window in generate_date_ranges(first, last, delta_days=30)]
+    window_timings = []
+    if date_ranges:
+        fetched = fetch_weather_windows(date_ranges, latitude, longitude, 'UTC', max_workers, hourly_variables, daily_variables)
+        store.write(
+            key, fetched['hourly_df'], fetched['daily_df'],
+            _variable_columns(hourly_variables, HOURLY_VARIABLES), _variable_columns(daily_variables, DAILY_VARIABLES),
+        )
+        window_timings = fetched['hourly_df'].attrs['window_timings']
+    else:
+        print(f"Weather for {key} from {as_date(start_date)} to {as_date(end_date)} served from the local store")
+
+    frames = store.read(
+        key, start_date, end_date,
+        _frame_columns(hourly_variables, HOURLY_VARIABLES),
+        _frame_columns(daily_variables, DAILY_VARIABLES),
+    )
+    frames['hourly_df'].index = frames['hourly_df'].index.tz_convert(user_timezone)
+    frames['hourly_df'].attrs['window_timings'] = window_timings
+    frames['daily_df'].attrs['window_timings'] = window_timings
+    return frames
+
+
+def plan_derived_daily(hourly_variables, daily_variables):
+    """
+    Swap daily variables that can be computed locally for their hourly source.
+
+    Returns:
+    - tuple: (hourly variables to fetch, daily variables to fetch, daily variables to derive)
+    """
+    derived = [variable for variable in daily_variables if variable in DERIVED_DAILY_VARIABLES]
+    daily_variables = [variable for variable in daily_variables if variable not in derived]
+    sources = [DERIVED_DAILY_VARIABLES[variable][0] for variable in derived]
+    return resolve_variables(list(hourly_variables) + sources, HOURLY_VARIABLES), daily_variables, derived
+
+
+def padded_dates(start_date, end_date):
+    """
+    The range to fetch so that every local day of [start_date, end_date]
+    is covered, whatever the site's UTC offset.
+    """
+    return as_date(start_date) - LOCAL_DAY_PADDING, as_date(end_date) + LOCAL_DAY_PADDING
+
+
+def local_days(df, start_date, end_date):
+    """
+    Rows of `df` on the calendar days [start_date, end_date] of its index's
+    timezone.
+    """
+    dates = df.index.tz_localize(None).normalize()
+    trimmed = df[(dates >= pd.Timestamp(as_date(start_date))) & (dates <= pd.Timestamp(as_date(end_date)))]
+    trimmed.attrs = dict(df.attrs)
+    return trimmed
+
+
+def attach_derived_daily(frames, derived, start_date=None, end_date=None):
+    """
+    Add the `derived` daily variables, computed from the hourly frame, to the
+    daily frame. Days follow the hourly timezone; fetched daily rows are
+    matched to them by calendar date.
+
+    With `start_date` and `end_date` both frames are then trimmed to those
+    whole local days, so the hourly frame must have been fetched for the
+    `padded_dates` of the range: the days at its edges are partial.
+    """
+    hourly_df = frames['hourly_df']
+    daily_df = frames['daily_df']
+    if derived:
+        fetched = daily_df
+        daily_df = derive_daily_variables(hourly_df, derived)
+        if len(fetched.columns):
+            fetched = fetched.copy()
+            fetched.index = fetched.index.tz_localize(None).tz_localize(hourly_df.index.tz)
+            daily_df = daily_df.join(fetched, how='outer')
+        daily_df.attrs = dict(fetched.attrs)
+    if start_date is not None:
+        hourly_df = local_days(hourly_df, start_date, end_date)
+        daily_df = local_days(daily_df, start_date, end_date)
+    return {'hourly_df': hourly_df, 'daily_df': daily_df}
+
+
+def fetch_all_weather_frames(start_date, end_date, latitude, longitude, user_timezone, max_workers=MAX_CONCURRENT_REQUESTS, use_store=True, snap_resolution=None, variables=None, derive_daily=False):
+    """
+    Fetch hourly and daily weather data for a range of dates in a single pass.
+
+    Each 30-day window is requested once and decoded once; both frames are
+    taken from the same response. With `use_store` the local weather store
+    is consulted first and only the missing days are requested (see
+    `fetch_stored_weather_frames`); if the store cannot be opened the range
+    is fetched directly.
+
+    With `snap_resolution` the site is snapped to the centre of its H3 cell
+    at that resolution before querying Open-Meteo, so nearby sites share the
+    same request, HTTP cache entries and store key. Callers keep the exact
+    coordinates for solar geometry.
+
+    `variables` lists the hourly and daily variables the caller needs, by
+    Open-Meteo name or frame column (e.g. ['ghi', 'dni', 'dhi']); every
+    variable is fetched when it is None.
+
+    With `derive_daily` the daily variables that can be computed from hourly
+    data (e.g. 'uv_index_max') are aggregated locally from their hourly
+    source instead of being requested, and both frames cover the whole days
+    [start_date, end_date] of `user_timezone`.
+
+    Returns:
+    - dict: {'hourly_df': DataFrame, 'daily_df': DataFrame}
+    """
+    hourly_variables, daily_variables = split_variables(variables)
+    derived = []
+    days = (None, None)
+    if derive_daily:
+        hourly_variables, daily_variables, derived = plan_derived_daily(hourly_variables, daily_variables)
+        days = (start_date, end_date)
+        start_date, end_date = padded_dates(start_date, end_date)
+    key = None
+    if snap_resolution is not None:
+        key = site_key(latitude, longitude, snap_resolution)
+        _, latitude, longitude = snap_to_cell(latitude, longitude, snap_resolution)
+
+    if use_store:
+        try:
+            frames = fetch_stored_weather_frames(
+                start_date, end_date, latitude, longitude, user_timezone, max_workers=max_workers, key=key,
+                hourly_variables=hourly_variables, daily_variables=daily_variables,
+            )
+            return attach_derived_daily(frames, derived, *days)
+        except OSError as error:
+            print(f"Weather store unavailable, fetching directly: {error}")
+
+    date_ranges = generate_date_ranges(start_date, end_date, delta_days=30)
+    frames = fetch_weather_windows(date_ranges, latitude, longitude, user_timezone, max_workers, hourly_variables, daily_variables)
+    return attach_derived_daily(frames, derived, *days)
+
+
+def _concat_frames(frames_list):
+    hourly_df = pd.concat([frames['hourly_df'] for frames in frames_list], ignore_index=True).set_index('datetime')
+    daily_df = pd.concat([frames['daily_df'] for frames in frames_list], ignore_index=True).set_index('datetime')
+    return {'hourly_df': hourly_df, 'daily_df': daily_df}
+
+
+def _day_set(ranges):
+    return {first + timedelta(days=offset) for first, last in ranges for offset in range((last - first).days + 1)}
+
+
+def fetch_all_weather_frames_for_sites(sites, start_date, end_date, max_workers=MAX_CONCURRENT_REQUESTS, batch_size=MAX_SITES_PER_REQUEST, use_store=True, snap_resolution=None, variables=None, derive_daily=False):
+    """
+    Fetch hourly and daily weather for many sites with multi-site requests.
+
+    Sites sharing a store key (the same coordinates, or the same H3 cell when
+    `snap_resolution` is set) are fetched once. For every 30-day window the
+    sites that need it are sent to Open-Meteo in batches of at most
+    `batch_size` coordinates, the batches running concurrently with at most
+    `max_workers` requests in flight. With `use_store` only the days missing
+    from the local weather store are requested, per site; a site whose
+    weather cannot be stored or read back (e.g. the store is locked by
+    another process) gets the weather just fetched, or its whole range
+    fetched directly.
+
+    Parameters:
+    - sites: list of (latitude, longitude, timezone) tuples
+    - start_date, end_date: date range, inclusive
+    - variables: hourly and daily variables to fetch, every variable when None
+    - derive_daily: compute derivable daily variables locally (see
+      `fetch_all_weather_frames`)
+
+    Returns:
+    - list: one {'hourly_df': DataFrame, 'daily_df': DataFrame} dict per site,
+      in the order of `sites`, hourly times in the site's timezone
+    """
+    hourly_variables, daily_variables = split_variables(variables)
+    derived = []
+    days = (None, None)
+    if derive_daily:
+        hourly_variables, daily_variables, derived = plan_derived_daily(hourly_variables, daily_variables)
+        days = (start_date, end_date)
+        start_date, end_date = padded_dates(start_date, end_date)
+
+    # Map every site onto the coordinates actually queried and its store key
+    queries = {}
+    site_keys = []
+    for latitude, longitude, _ in sites:
+        if snap_resolution is not None:
+            key = site_key(latitude, longitude, snap_resolution)
+            _, latitude, longitude = snap_to_cell(latitude, longitude, snap_resolution)
+        else:
+            key = site_key(latitude, longitude)
+        queries.setdefault(key, (latitude, longitude))
+        site_keys.append(key)
+
+    if use_store:
+        try:
+            missing = {key: _day_set(weather_store.missing_ranges(key, start_date, end_date, hourly_variables, daily_variables)) for key in queries}
+        except OSError as error:
+            print(f"Weather store unavailable, fetching directly: {error}")
+            use_store = False
+    requested = _day_set([(as_date(start_date), as_date(end_date))])
+    if not use_store:
+        missing = {key: requested for key in queries}
+
+    # One task per (window, batch of sites missing days in that window)
+    all_missing = sorted(set().union(*missing.values()))
+    runs = []
+    for day in all_missing:
+        if runs and day == runs[-1][1] + timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    tasks = []
+    for first, last in runs:
+        for window in generate_date_ranges(first, last, delta_days=30):
+            window_days = _day_set([(as_date(window[0]), as_date(window[1]))])
+            keys = [key for key in queries if missing[key] & window_days]
+            for offset in range(0, len(keys), batch_size):
+                tasks.append((window, keys[offset:offset + batch_size]))
+
+    def fetch(task):
+        (start, end), keys = task
+        started = time.perf_counter()
+        responses = fetch_weather_data_batch(
+            start, end, [queries[key][0] for key in keys], [queries[key][1] for key in keys],
+            hourly_variables, daily_variables,
+        )
+        print(f"Fetched data for {len(keys)} sites from {start} to {end} in {time.perf_counter() - started:.2f}s")
+        return keys, responses
+
+    fetched = {key: [] for key in queries}
+    workers = max(1, min(max_workers, len(tasks) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for keys, responses in executor.map(fetch, tasks):
+            for key, response in zip(keys, responses):
+                fetched[key].append(process_weather_response(response, 'UTC', hourly_variables, daily_variables))
+
+    frames_by_key = {}
+    for key, frames_list in fetched.items():
+        if use_store:
+            try:
+                if frames_list:
+                    frames = _concat_frames(frames_list)
+                    weather_store.write(
+                        key, frames['hourly_df'], frames['daily_df'],
+                        _variable_columns(hourly_variables, HOURLY_VARIABLES), _variable_columns(daily_variables, DAILY_VARIABLES),
+                    )
+                frames_by_key[key] = weather_store.read(
+                    key, start_date, end_date,
+                    _frame_columns(hourly_variables, HOURLY_VARIABLES),
+                    _frame_columns(daily_variables, DAILY_VARIABLES),
+                )
+                continue
+            except OSError as error:
+                print(f"Weather store unavailable for {key}, using fetched weather: {error}")
+        if missing[key] == requested:
+            frames_by_key[key] = _concat_frames(frames_list)
+        else:
+            # Part of the range was to be read from the store
+            latitude, longitude = queries[key]
+            frames_by_key[key] = fetch_weather_windows(
+                generate_date_ranges(start_date, end_date, delta_days=30), latitude, longitude, 'UTC',
+                max_workers, hourly_variables, daily_variables,
+            )
+
+    results = []
+    for (_, _, timezone), key in zip(sites, site_keys):
+        frames = frames_by_key[key]
+        hourly_df = frames['hourly_df'].copy()
+        hourly_df.index = hourly_df.index.tz_convert(timezone)
+        results.append(attach_derived_daily({'hourly_df': hourly_df, 'daily_df': frames['daily_df'].copy()}, derived, *days))
+    return results
+
+
+def fetch_all_weather_data(start_date, end_date, latitude, longitude,user_timezone,df_interval='hourly', max_workers=MAX_CONCURRENT_REQUESTS, use_store=True, snap_resolution=None, variables=None, derive_daily=False):
+    """
+    Fetch weather data for a range of dates, handling up to 30 days at a time.
+
+    Returns the hourly frame, or the daily frame when `df_interval` is not
+    'hourly'. Use `fetch_all_weather_frames` when both are needed. When
+    `variables` is given only those are fetched; otherwise only the
+    variables of the requested interval are.
+    """
+    if variables is None:
+        variables = list(HOURLY_VARIABLES) if df_interval == 'hourly' else list(DAILY_VARIABLES)
+    frames = fetch_all_weather_frames(
+        start_date, end_date, latitude, longitude, user_timezone, max_workers=max_workers,
+        use_store=use_store, snap_resolution=snap_resolution, variables=variables, derive_daily=derive_daily,
+    )
     if df_interval != 'hourly':
-        return daily_df_all
-    return hourly_df_all
+        return frames['daily_df']
+    return frames['hourly_df']
@@ -0,0 +1,262 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pvlib
+from branca.colormap import LinearColormap
+from folium import CircleMarker, Map
+
+from .extractors import MAX_SITES_PER_REQUEST, fetch_all_weather_frames_for_sites
+from .pv import resolve_timezones
+from .result_cache import fingerprint
+from .sam_catalogue import inverter_catalogue, module_catalogue
+from .simulation_engine import run_with_clear_sky
+from .simulation_stream import FETCH_PADDING, StreamAggregates
+
+# Cities of the national fleet run
+FLEET_SITES = os.path.join(os.getcwd(), 'data', 'nigeria.csv')
+
+# Per-city result table and yield map written by run_fleet / yield_map
+FLEET_RESULTS = os.path.join(os.getcwd(), 'data', 'fleet', 'fleet_results.csv')
+FLEET_MAP = os.path.join(os.getcwd(), 'data', 'fleet', 'yield_map.html')
+
+HOURS_PER_YEAR = 365.25 * 24
+
+# Columns of the per-city result table
+FLEET_COLUMNS = [
+    'city', 'region', 'latitude', 'longitude', 'timezone', 'dc_capacity_kw',
+    'energy_kwh', 'annual_energy_kwh', 'clear_sky_energy_kwh', 'poa_insolation_kwh_m2',
+    'specific_yield_kwh_per_kwp', 'performance_ratio', 'capacity_factor', 'peak_power_w', 'fingerprint',
+]
+
+# Inputs shared by every site, set once per worker process
+_context = None
+
+
+def load_sites(path=FLEET_SITES):
+    """
+    One site per city of a city CSV such as data/nigeria.csv.
+
+    The file lists weather observations labelled with the nearest city, so
+    a city may appear at several coordinates; each city is placed at the
+    median of its coordinates.
+
+    Parameters:
+    - path: str, CSV with 'city', 'latitude', 'longitude' and optionally 'region'
+
+    Returns:
+    - DataFrame with 'city', 'region', 'latitude', 'longitude', one row per city
+    """
+    df = pd.read_csv(path)
+    if 'region' not in df.columns:
+        df['region'] = ''
+    df['region'] = df['region'].fillna('')
+    sites = df.groupby(['city', 'region'], as_index=False)[['latitude', 'longitude']].median()
+    return sites.round({'latitude': 4, 'longitude': 4})
+
+
+def _init_worker(context):
+    global _context
+    _context = context
+
+
+def _simulate_site(task):
+    """
+    Simulate the reference system at one site and summarise it in one row.
+    """
+    latitude, longitude, timezone, weather = task
+    context = _context
+    surface_tilt = context['surface_tilt'] if context['surface_tilt'] is not None else abs(latitude)
+    surface_azimuth = context['surface_azimuth']
+    system = pvlib.pvsystem.PVSystem(
+        surface_tilt=surface_tilt, surface_azimuth=surface_azimuth,
+        module_parameters=context['module'], inverter_parameters=context['inverter'],
+        temperature_model_parameters=context['temperature'],
+        modules_per_string=context['modules_per_string'], strings_per_inverter=context['strings'],
+    )
+    location = pvlib.location.Location(latitude, longitude, timezone)
+    module = context['module']
+    dc_capacity_kw = module['Impo'] * module['Vmpo'] * context['modules_per_string'] * context['strings'] / 1000
+    aggregates = StreamAggregates(dc_capacity_kw)
+    if not weather.empty:
+        outputs = run_with_clear_sky(
+            system, location, weather[['dni', 'ghi', 'dhi']], engine=context['engine'], skip_night=context['skip_night'],
+        )
+        aggregates.update(pd.DataFrame({
+            'ac_power_output': outputs['real']['ac'],
+            'clear_sky_ac_power_output': outputs['clear_sky']['ac'],
+            'poa_global': outputs['real']['poa_global'],
+        }, index=weather.index))
+    totals = aggregates.result()['totals']
+    hours = totals['hours']
+    return {
+        'dc_capacity_kw': dc_capacity_kw,
+        'energy_kwh': totals['energy_kwh'],
+        'annual_energy_kwh': totals['energy_kwh'] * HOURS_PER_YEAR / hours if hours else np.nan,
+        'clear_sky_energy_kwh': totals['clear_sky_energy_kwh'],
+        'poa_insolation_kwh_m2': totals['poa_insolation_kwh_m2'],
+        'specific_yield_kwh_per_kwp': totals['energy_kwh'] * HOURS_PER_YEAR / hours / dc_capacity_kw if hours and dc_capacity_kw else np.nan,
+        'performance_ratio': totals['performance_ratio'],
+        'capacity_factor': totals['energy_kwh'] / (dc_capacity_kw * hours) if hours and dc_capacity_kw else np.nan,
+        'peak_power_w': totals['peak_power_w'],
+    }
+
+
+def _write_table(table, path):
+    # Write next to the destination and rename, so an interrupted run never leaves a truncated table
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temporary = f'{path}.tmp'
+    table.to_csv(temporary, index=False)
+    os.replace(temporary, path)
+
+
+def run_fleet(sites, start_time, end_time, module, inverter, modules_per_string=1, strings=1,
+              temperature_model='open_rack_glass_glass', surface_tilt=None, surface_azimuth=180,
+              output=FLEET_RESULTS, max_workers=None, batch_size=MAX_SITES_PER_REQUEST, engine='pvlib',
+              snap_resolution=None, skip_night=False, restart=False, progress=None):
+    """
+    Simulate one reference system at every site and tabulate its yield.
+
+    Sites are processed in batches: the weather of a batch comes from one
+    multi-site Open-Meteo request (fetch_all_weather_frames_for_sites, so
+    the local weather store is used as well, falling back to the fetched
+    weather while another process holds the store), then its sites are
+    simulated in a process pool whose workers receive the component
+    parameters once.
+    The table is rewritten after every batch and rows already computed
+    with the same parameters are skipped, so an interrupted run resumes
+    where it stopped.
+
+    Parameters:
+    - sites: DataFrame from load_sites ('city', 'region', 'latitude', 'longitude',
+      optionally 'timezone')
+    - start_time, end_time: timestamp-like, inclusive window in each site's local time
+    - module, inverter: Sandia module / CEC inverter names
+    - modules_per_string, strings: int, array layout per inverter
+    - temperature_model: str, SAPM temperature model name
+    - surface_tilt: float, tilt in degrees, or None to tilt each array at its latitude
+    - surface_azimuth: float, azimuth in degrees
+    - output: str, CSV path of the result table
+    - max_workers: int, worker processes (None for one per CPU, 1 to run inline)
+    - batch_size: int, sites per weather request
+    - engine: run_scenarios engine
+    - snap_resolution: int, H3 resolution sites' weather is shared at, or None
+    - skip_night: bool, only run the chain on daylight samples (same results)
+    - restart: bool, ignore rows of a previous run
+    - progress: callable (sites done, total sites)
+
+    Returns:
+    - DataFrame with FLEET_COLUMNS, one row per site
+    """
+    if module not in module_catalogue:
+        raise ValueError(f"Unknown module {module!r}")
+    if inverter not in inverter_catalogue:
+        raise ValueError(f"Unknown inverter {inverter!r}")
+
+    start_time, end_time = pd.Timestamp(start_time), pd.Timestamp(end_time)
+    parameters = fingerprint({
+        'start_time': start_time.isoformat(), 'end_time': end_time.isoformat(),
+        'module': module, 'inverter': inverter, 'modules_per_string': modules_per_string, 'strings': strings,
+        'temperature_model': temperature_model, 'surface_tilt': surface_tilt, 'surface_azimuth': surface_azimuth,
+        'engine': engine, 'snap_resolution': snap_resolution,
+    })
+
+    sites = sites.reset_index(drop=True).copy()
+    if 'region' not in sites.columns:
+        sites['region'] = ''
+    if 'timezone' not in sites.columns:
+        sites['timezone'] = resolve_timezones(sites['latitude'], sites['longitude'])
+    sites['timezone'] = sites['timezone'].fillna('UTC')
+
+    done = pd.DataFrame(columns=FLEET_COLUMNS)
+    if not restart and os.path.exists(output):
+        done = pd.read_csv(output, keep_default_na=False, na_values=[''])
+        done = done[done['fingerprint'] == parameters]
+        print(f"Resuming fleet run: {len(done)} of {len(sites)} sites already simulated")
+    done_keys = set(zip(done['city'], done['region'].fillna(''), done['latitude'].round(4), done['longitude'].round(4)))
+    pending = sites[[
+        (city, region, round(latitude, 4), round(longitude, 4)) not in done_keys
+        for city, region, latitude, longitude in zip(sites['city'], sites['region'], sites['latitude'], sites['longitude'])
+    ]]
+
+    context = {
+        'module': module_catalogue[module],
+        'inverter': inverter_catalogue[inverter],
+        'temperature': pvlib.temperature.TEMPERATURE_MODEL_PARAMETERS['sapm'][temperature_model],
+        'modules_per_string': modules_per_string,
+        'strings': strings,
+        'surface_tilt': surface_tilt,
+        'surface_azimuth': surface_azimuth,
+        'engine': engine,
+        'skip_night': skip_night,
+    }
+    rows = [done] if len(done) else []
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(pending)))
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(context,))
+    else:
+        _init_worker(context)
+    try:
+        for batch_start in range(0, len(pending), batch_size):
+            batch = pending.iloc[batch_start:batch_start + batch_size]
+            weather_frames = fetch_all_weather_frames_for_sites(
+                list(zip(batch['latitude'], batch['longitude'], batch['timezone'])),
+                start_time - FETCH_PADDING, end_time + FETCH_PADDING,
+                batch_size=batch_size, snap_resolution=snap_resolution, variables=['dni', 'ghi', 'dhi'],
+            )
+            tasks = []
+            for site, frames in zip(batch.itertuples(index=False), weather_frames):
+                weather = frames['hourly_df']
+                site_start = start_time.tz_localize(site.timezone) if start_time.tz is None else start_time.tz_convert(site.timezone)
+                site_end = end_time.tz_localize(site.timezone) if end_time.tz is None else end_time.tz_convert(site.timezone)
+                weather = weather[(weather.index >= site_start) & (weather.index <= site_end)]
+                tasks.append((float(site.latitude), float(site.longitude), site.timezone, weather[['dni', 'ghi', 'dhi']]))
+            results = executor.map(_simulate_site, tasks) if executor is not None else map(_simulate_site, tasks)
+            table = batch[['city', 'region', 'latitude', 'longitude', 'timezone']].reset_index(drop=True)
+            table = pd.concat([table, pd.DataFrame(list(results))], axis=1)
+            table['fingerprint'] = parameters
+            rows.append(table[FLEET_COLUMNS])
+            _write_table(pd.concat(rows, ignore_index=True), output)
+            if progress is not None:
+                progress(len(sites) - len(pending) + batch_start + len(batch), len(sites))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    table = pd.concat(rows, ignore_index=True)[FLEET_COLUMNS] if rows else pd.DataFrame(columns=FLEET_COLUMNS)
+    _write_table(table, output)
+    return table
+
+
+def yield_map(table, path=FLEET_MAP, column='specific_yield_kwh_per_kwp'):
+    """
+    Render a fleet result table as an HTML map of coloured city markers.
+
+    Parameters:
+    - table: DataFrame returned by run_fleet
+    - path: str, HTML file to write
+    - column: str, FLEET_COLUMNS entry setting the marker colours
+
+    Returns:
+    - folium.Map
+    """
+    values = table[column].astype(float)
+    finite = values[np.isfinite(values)]
+    low, high = (finite.min(), finite.max()) if len(finite) else (0., 1.)
+    colormap = LinearColormap(['#313695', '#ffffbf', '#a50026'], vmin=low, vmax=high if high > low else low + 1)
+    colormap.caption = column.replace('_', ' ')
+
+    m = Map(location=[table['latitude'].mean(), table['longitude'].mean()], zoom_start=6)
+    for row, value in zip(table.itertuples(index=False), values):
+        if not np.isfinite(value):
+            continue
+        CircleMarker(
+            [row.latitude, row.longitude], radius=6, color=colormap(value), fill=True, fill_opacity=0.8, weight=1,
+            tooltip=f"{row.city}, {row.region}: {value:.1f}",
+        ).add_to(m)
+    colormap.add_to(m)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    m.save(path)
+    return m
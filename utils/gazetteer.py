@@ -0,0 +1,268 @@
+import bisect
+import csv
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+DATA_DIR = os.path.join(os.getcwd(), 'data')
+
+# Places geocoded through Nominatim, appended as they are resolved so the
+# gazetteer keeps growing from real lookups
+GEOCODED_PLACES_PATH = os.path.join(DATA_DIR, 'geocoded_places.csv')
+
+GEOCODED_PLACES_COLUMNS = ['name', 'region', 'country', 'latitude', 'longitude', 'timezone', 'population']
+
+COUNTRY_NAMES = {'NG': 'Nigeria', 'CA': 'Canada'}
+
+# Fixed offsets in data/nigeria.csv are all West Africa Time
+NIGERIA_TIMEZONE = 'Africa/Lagos'
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def normalize(text):
+    """
+    Lowercase, strip accents and punctuation and collapse whitespace, so
+    'Abúja,  FCT' and 'abuja fct' share a key.
+    """
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(character for character in text if not unicodedata.combining(character))
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text.lower()).split())
+
+
+def _unit_vectors(latitudes, longitudes):
+    latitudes = np.radians(np.asarray(latitudes, dtype=float))
+    longitudes = np.radians(np.asarray(longitudes, dtype=float))
+    return np.column_stack([
+        np.cos(latitudes) * np.cos(longitudes),
+        np.cos(latitudes) * np.sin(longitudes),
+        np.sin(latitudes),
+    ])
+
+
+def _label(name, region, country):
+    parts = []
+    for part in (name, region, country):
+        if part and part not in parts:
+            parts.append(part)
+    return ', '.join(parts)
+
+
+def load_nigeria_places(path=os.path.join(DATA_DIR, 'nigeria.csv')):
+    df = pd.read_csv(path, usecols=['country', 'city', 'latitude', 'longitude', 'region', 'population'])
+    df = df.drop_duplicates(['city', 'region'])
+    return pd.DataFrame({
+        'name': df['city'],
+        'region': df['region'],
+        'country': df['country'].map(lambda code: COUNTRY_NAMES.get(code, code)),
+        'latitude': df['latitude'],
+        'longitude': df['longitude'],
+        'timezone': NIGERIA_TIMEZONE,
+        'population': df['population'],
+    })
+
+
+def load_global_places(path=os.path.join(DATA_DIR, 'global_weather.csv')):
+    df = pd.read_csv(path, usecols=['country', 'location_name', 'latitude', 'longitude', 'timezone'])
+    df = df.drop_duplicates(['location_name', 'country'])
+    return pd.DataFrame({
+        'name': df['location_name'],
+        'region': None,
+        'country': df['country'],
+        'latitude': df['latitude'],
+        'longitude': df['longitude'],
+        'timezone': df['timezone'],
+        'population': 0,
+    })
+
+
+def load_canada_places(path=os.path.join(DATA_DIR, 'canada.csv')):
+    df = pd.read_csv(path, usecols=['Longitude (x)', 'Latitude (y)', 'Station Name'], encoding='utf-8-sig')
+    df = df.drop_duplicates('Station Name')
+    return pd.DataFrame({
+        'name': df['Station Name'].str.title(),
+        'region': None,
+        'country': 'Canada',
+        'latitude': df['Latitude (y)'],
+        'longitude': df['Longitude (x)'],
+        'timezone': None,
+        'population': 0,
+    })
+
+
+def load_geocoded_places(path=GEOCODED_PLACES_PATH):
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=GEOCODED_PLACES_COLUMNS)
+    return pd.read_csv(path)
+
+
+PLACE_LOADERS = [load_nigeria_places, load_global_places, load_canada_places]
+
+
+class Gazetteer:
+    """
+    In-memory place index for offline address autocomplete.
+
+    Places come from the CSVs shipped in data/ plus every place geocoded
+    through Nominatim so far. Each place is indexed under its normalized
+    name and label ('name, region, country') in a sorted key list, so a
+    prefix lookup is two bisections. Matches are ranked exact name first,
+    then by population, then shortest label.
+
+    Reverse lookups use a KD-tree over the places' unit vectors, so the
+    nearest place of many coordinates is found in one vectorized query.
+    """
+
+    def __init__(self, loaders=PLACE_LOADERS, geocoded_path=GEOCODED_PLACES_PATH):
+        self.loaders = loaders
+        self.geocoded_path = geocoded_path
+        self.places = None
+        self._keys = []
+        self._key_places = []
+        self._tree = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        frames = []
+        for loader in self.loaders:
+            try:
+                frames.append(loader())
+            except (OSError, ValueError, KeyError) as error:
+                print(f"Could not load places with {loader.__name__}: {error}")
+        frames.append(load_geocoded_places(self.geocoded_path))
+        frames = [frame for frame in frames if len(frame)]
+        places = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=GEOCODED_PLACES_COLUMNS)
+        places['population'] = pd.to_numeric(places['population'], errors='coerce').fillna(0)
+        places = places.astype({'latitude': float, 'longitude': float})
+        places = places.where(places.notna(), None)
+        places['label'] = [_label(*row) for row in places[['name', 'region', 'country']].itertuples(index=False)]
+        places = places.drop_duplicates('label', keep='first').reset_index(drop=True)
+        return places
+
+    def _index(self, places, start=0):
+        entries = []
+        for position, (name, label) in enumerate(zip(places['name'], places['label']), start=start):
+            for key in {normalize(name), normalize(label)}:
+                if key:
+                    entries.append((key, position))
+        return entries
+
+    def ensure_loaded(self):
+        if self.places is not None:
+            return
+        with self._lock:
+            if self.places is not None:
+                return
+            places = self._load()
+            entries = sorted(self._index(places))
+            self._keys = [key for key, _ in entries]
+            self._key_places = [position for _, position in entries]
+            self.places = places
+
+    def suggest(self, query, limit=10):
+        """
+        Places whose name or label starts with `query`, best ranked first.
+
+        Returns:
+        - list of dicts with 'label', 'latitude', 'longitude' and 'timezone'
+        """
+        self.ensure_loaded()
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        low = bisect.bisect_left(self._keys, prefix)
+        high = bisect.bisect_left(self._keys, prefix + '\uffff')
+        positions = {self._key_places[index] for index in range(low, high)}
+        if not positions:
+            return []
+        matches = self.places.loc[sorted(positions)]
+        ranked = sorted(
+            matches.itertuples(),
+            key=lambda place: (normalize(place.name) != prefix, -place.population, len(place.label)),
+        )
+        return [
+            {'label': place.label, 'latitude': place.latitude, 'longitude': place.longitude, 'timezone': place.timezone}
+            for place in ranked[:limit]
+        ]
+
+    def lookup(self, address):
+        """
+        The place whose name or label is exactly `address`, or None when no
+        place or several places match (e.g. a town name found in two
+        regions), so the caller can fall back to a geocoder.
+        """
+        self.ensure_loaded()
+        key = normalize(address)
+        if not key:
+            return None
+        low = bisect.bisect_left(self._keys, key)
+        high = bisect.bisect_right(self._keys, key)
+        positions = set(self._key_places[low:high])
+        if len(positions) != 1:
+            return None
+        place = self.places.loc[positions.pop()]
+        return {'label': place['label'], 'latitude': place['latitude'], 'longitude': place['longitude'], 'timezone': place['timezone']}
+
+    def nearest(self, latitudes, longitudes, max_distance_km=None):
+        """
+        Nearest place of each coordinate pair.
+
+        Parameters:
+        - latitudes, longitudes: array-likes of decimal degrees
+        - max_distance_km: float, places further than this are not matched
+
+        Returns:
+        - tuple: (positions into `places`, -1 where unmatched; distances in km)
+        """
+        self.ensure_loaded()
+        with self._lock:
+            if self._tree is None and len(self.places):
+                self._tree = cKDTree(_unit_vectors(self.places['latitude'], self.places['longitude']))
+            tree = self._tree
+        count = len(np.atleast_1d(latitudes))
+        if tree is None:
+            return np.full(count, -1), np.full(count, np.inf)
+        chords, positions = tree.query(_unit_vectors(np.atleast_1d(latitudes), np.atleast_1d(longitudes)))
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chords / 2, 1.0))
+        if max_distance_km is not None:
+            positions = np.where(distances <= max_distance_km, positions, -1)
+        return positions, distances
+
+    def learn(self, name, latitude, longitude, region=None, country=None, timezone=None, population=0):
+        """
+        Add a geocoded place to the index and persist it for later runs.
+        """
+        self.ensure_loaded()
+        place = {
+            'name': name, 'region': region, 'country': country, 'latitude': float(latitude),
+            'longitude': float(longitude), 'timezone': timezone, 'population': population,
+        }
+        label = _label(name, region, country)
+        with self._lock:
+            if (self.places['label'] == label).any():
+                return
+            position = len(self.places)
+            self.places.loc[position] = {**place, 'label': label}
+            self._tree = None
+            for key, index in self._index(self.places.loc[[position]], start=position):
+                insert_at = bisect.bisect_left(self._keys, key)
+                self._keys.insert(insert_at, key)
+                self._key_places.insert(insert_at, index)
+            try:
+                os.makedirs(os.path.dirname(self.geocoded_path), exist_ok=True)
+                is_new = not os.path.exists(self.geocoded_path)
+                with open(self.geocoded_path, 'a', newline='', encoding='utf-8') as handle:
+                    writer = csv.DictWriter(handle, fieldnames=GEOCODED_PLACES_COLUMNS)
+                    if is_new:
+                        writer.writeheader()
+                    writer.writerow(place)
+            except OSError as error:
+                print(f"Could not persist geocoded place {label}: {error}")
+
+
+gazetteer = Gazetteer()
@@ -0,0 +1,133 @@
+import bisect
+import time
+
+import h5py
+import pandas as pd
+
+
+def open_file(path, mode, lock_timeout):
+    """
+    Open an HDF5 file, waiting for other processes to release it.
+
+    HDF5 locks a file for as long as any process has it open (a
+    BlockingIOError on open), so opening is retried with a growing delay
+    for up to `lock_timeout` seconds before the error is raised.
+    """
+    deadline = time.monotonic() + lock_timeout
+    delay = 0.05
+    while True:
+        try:
+            return h5py.File(path, mode)
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(delay)
+            delay = min(delay * 2, 1)
+
+
+def _time_values(index):
+    """
+    Convert a DatetimeIndex to int64 nanoseconds since the epoch in UTC.
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is None:
+        index = index.tz_localize('UTC')
+    return index.tz_convert('UTC').asi8
+
+
+def write_frame(group, df):
+    """
+    Write a time-indexed DataFrame into an h5py group, replacing what was there.
+
+    The index is stored as an int64 'time' dataset (UTC nanoseconds) and every
+    column as its own resizable dataset, so single columns and time slices can
+    be read back without loading the rest of the group.
+
+    Parameters:
+    - group: h5py.Group, destination group
+    - df: DataFrame with a DatetimeIndex
+    """
+    for name in list(group.keys()):
+        del group[name]
+    df = df.sort_index()
+    group.create_dataset('time', data=_time_values(df.index), maxshape=(None,), chunks=True)
+    for column in df.columns:
+        group.create_dataset(column, data=df[column].to_numpy(), maxshape=(None,), chunks=True)
+    group.attrs['columns'] = list(df.columns)
+
+
+def read_frame(group, start=None, end=None, columns=None):
+    """
+    Read a time slice of a frame written with `write_frame`.
+
+    The time dataset is sorted, so the slice boundaries are found with a
+    binary search over the dataset on disk (a logarithmic number of single
+    element reads) and only the rows inside [start, end] are read.
+
+    Parameters:
+    - group: h5py.Group, group written by `write_frame`
+    - start, end: timestamp-like, inclusive bounds (naive values are UTC)
+    - columns: list of column names to read, defaults to all
+
+    Returns:
+    - DataFrame indexed by a UTC DatetimeIndex named 'datetime'
+    """
+    stored_columns = list(group.attrs.get('columns', []))
+    if columns is None:
+        columns = stored_columns
+    else:
+        columns = [column for column in columns if column in stored_columns]
+
+    if 'time' not in group:
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], tz='UTC', name='datetime'))
+
+    times = group['time']
+    lo, hi = 0, times.shape[0]
+    if start is not None:
+        lo = bisect.bisect_left(times, _time_values([pd.Timestamp(start)])[0])
+    if end is not None:
+        hi = bisect.bisect_right(times, _time_values([pd.Timestamp(end)])[0])
+    hi = max(lo, hi)
+
+    index = pd.to_datetime(times[lo:hi], unit='ns', utc=True)
+    index.name = 'datetime'
+    data = {column: group[column][lo:hi] for column in columns}
+    return pd.DataFrame(data, index=index, columns=columns)
+
+
+def append_frame(group, df):
+    """
+    Append rows to a frame stored with `write_frame`.
+
+    Rows that are strictly newer than the stored data are appended in place
+    by resizing the datasets. Anything else (overlapping rows, new columns)
+    is merged with the stored frame, new values taking precedence, and the
+    group is rewritten.
+    """
+    if df.empty:
+        return
+    df = df.sort_index()
+    stored_columns = list(group.attrs.get('columns', []))
+    if 'time' not in group:
+        write_frame(group, df)
+        return
+
+    new_times = _time_values(df.index)
+    times = group['time']
+    if list(df.columns) == stored_columns and (times.shape[0] == 0 or new_times[0] > times[-1]):
+        size = times.shape[0]
+        times.resize((size + len(new_times),))
+        times[size:] = new_times
+        for column in stored_columns:
+            dataset = group[column]
+            dataset.resize((size + len(df),))
+            dataset[size:] = df[column].to_numpy()
+        return
+
+    existing = read_frame(group)
+    new = df.copy()
+    new.index = pd.to_datetime(new_times, unit='ns', utc=True)
+    new.index.name = 'datetime'
+    merged = new.combine_first(existing)
+    ordered = stored_columns + [column for column in df.columns if column not in stored_columns]
+    write_frame(group, merged[ordered])
@@ -1,24 +1,53 @@
 import datetime
+import threading
+import h3
+import numpy as np
 import pandas as pd
 import pytz
-import requests_cache
 from folium import Map, Marker
 from geopy.geocoders import Nominatim
+from geopy.location import Location
 from pvlib import solarposition, tracking
 from pvlib.iotools import pvgis
 from timezonefinder import TimezoneFinder
+from timezonefinder.configs import SHORTCUT_H3_RES
+from timezonefinder.utils import coord2int, get_last_change_idx, inside_polygon
 from .helper import generate_plot,df_sample_to_bootstrap_cards
 import pvlib
 import os 
 import requests
-from .extractors import get_solar_irradiation,fetch_all_weather_data
+from .extractors import get_solar_irradiation,fetch_all_weather_data,split_variables
 from .transformers import extract_weather_data
+from .cache import cache_manager
+from .gazetteer import gazetteer
+from .simulation_engine import sun_up
+from .singleflight import single_flight
 # Cache requests to avoid repeated API calls
-requests_cache.install_cache('pvgis_requests_cache', backend='sqlite')
+cache_manager.install_global('http')
 
 # Initialize Geolocator
 geolocator = Nominatim(user_agent="solar_app")
 
+# Nearest gazetteer place further than this is not used as a site's address
+REVERSE_GEOCODE_MAX_KM = 25
+
+# TimezoneFinder loads its polygon data on construction, so one instance is shared
+_timezone_finder = None
+_timezone_finder_lock = threading.Lock()
+
+
+def get_timezone_finder():
+    global _timezone_finder
+    if _timezone_finder is None:
+        with _timezone_finder_lock:
+            if _timezone_finder is None:
+                _timezone_finder = TimezoneFinder()
+    return _timezone_finder
+
+
+def _address_key(address, *args, **kwargs):
+    return (str(address).strip().lower(), args, tuple(sorted(kwargs.items())))
+
 
 def fetch_pvgis_data(lat, lon, start=None, end=None, raddatabase=None, components=True,
                      surface_tilt=0, surface_azimuth=180, outputformat='json', usehorizon=True, 
@@ -97,10 +126,108 @@ def get_timezone(lat, lng):
     Returns:
     - str, timezone string
     """
-    tf = TimezoneFinder()
-    return tf.timezone_at(lng=lng, lat=lat)
+    return get_timezone_finder().timezone_at(lng=float(lng), lat=float(lat))
 
 
+def resolve_timezones(latitudes, longitudes):
+    """
+    Get the timezone of many coordinates with one lookup per shortcut cell.
+
+    TimezoneFinder indexes its polygons by H3 cell (SHORTCUT_H3_RES, cells
+    of about 60 km). Points are grouped by cell, and a cell whose polygons
+    all belong to one zone answers for all of its points at once, as
+    `timezone_at` would without a polygon test. In cells shared by several
+    zones (near borders and coasts) each candidate polygon is read once and
+    tested against all of the cell's points, in `timezone_at`'s order.
+
+    Parameters:
+    - latitudes, longitudes: array-likes of decimal degrees
+
+    Returns:
+    - list: timezone strings (None where the point has no timezone)
+    """
+    points = np.column_stack([np.atleast_1d(latitudes), np.atleast_1d(longitudes)]).astype(float)
+    if len(points) == 0:
+        return []
+    points, point_of_row = np.unique(points, axis=0, return_inverse=True)
+    finder = get_timezone_finder()
+    cells = [h3.geo_to_h3(lat, lng, SHORTCUT_H3_RES) for lat, lng in points]
+    _, cell_of_point = np.unique(cells, return_inverse=True)
+    order = np.argsort(np.ravel(cell_of_point), kind='stable')
+    timezones = [None] * len(points)
+    for members in np.split(order, np.cumsum(np.bincount(np.ravel(cell_of_point)))[:-1]):
+        for member, timezone_str in zip(members, _cell_timezones(finder, points[members])):
+            timezones[member] = timezone_str
+    return [timezones[index] for index in np.ravel(point_of_row)]
+
+
+def _cell_timezones(finder, points):
+    """
+    TimezoneFinder.timezone_at for points (lat, lng rows) sharing a shortcut cell.
+    """
+    lat, lng = points[0]
+    polygons = finder.get_shortcut_polys(lng=lng, lat=lat)
+    if len(polygons) == 0:
+        return [None] * len(points)
+    zone_ids = finder.zone_ids_of(polygons)
+    last_change = get_last_change_idx(zone_ids)
+    if len(polygons) == 1 or last_change == 0:
+        return [finder.zone_name_from_id(zone_ids[0])] * len(points)
+    xs = [coord2int(lng) for lng in points[:, 1]]
+    ys = [coord2int(lat) for lat in points[:, 0]]
+    zones = [None] * len(points)
+    for poly_id, zone_id in zip(polygons[:last_change], zone_ids[:last_change]):
+        pending = [index for index, zone in enumerate(zones) if zone is None]
+        if not pending:
+            break
+        xmax, xmin, ymax, ymin = finder.get_polygon_boundaries(poly_id)
+        pending = [index for index in pending if xmin <= xs[index] <= xmax and ymin <= ys[index] <= ymax]
+        if not pending:
+            continue
+        coords = finder.coords_of(polygon_nr=poly_id)
+        holes = None
+        for index in pending:
+            if not inside_polygon(xs[index], ys[index], coords):
+                continue
+            if holes is None:
+                holes = list(finder._holes_of_poly(poly_id))
+            if not any(inside_polygon(xs[index], ys[index], hole) for hole in holes):
+                zones[index] = zone_id
+    return [finder.zone_name_from_id(zone_ids[-1] if zone is None else zone) for zone in zones]
+
+
+def reverse_geocode(latitudes, longitudes, max_distance_km=REVERSE_GEOCODE_MAX_KM):
+    """
+    Name the nearest gazetteer place of many coordinates in one KD-tree query.
+
+    Parameters:
+    - latitudes, longitudes: array-likes of decimal degrees
+    - max_distance_km: float, points with no place this close get None
+
+    Returns:
+    - list: place labels or None
+    """
+    positions, _ = gazetteer.nearest(latitudes, longitudes, max_distance_km)
+    labels = gazetteer.places['label'].to_numpy()
+    return [labels[position] if position >= 0 else None for position in positions]
+
+
+def get_address_from_coordinates(lat, lng, max_distance_km=REVERSE_GEOCODE_MAX_KM):
+    """
+    Get an address for a point: the nearest gazetteer place, or Nominatim's
+    reverse geocode when no place is within `max_distance_km`.
+    """
+    address = reverse_geocode([lat], [lng], max_distance_km)[0]
+    if address is not None:
+        return address
+    location = geolocator.reverse(query=(lat, lng), exactly_one=True, limit=1)
+    if location is None:
+        return None
+    gazetteer.learn(location.address, location.latitude, location.longitude)
+    return location.address
+
+
+@single_flight(_address_key)
 def get_timezone_from_address(address):
     """
     Get the timezone from a given address.
@@ -111,7 +238,7 @@ def get_timezone_from_address(address):
     Returns:
     - timezone: timezone object if found, else None
     """
-    location = geolocator.geocode(address)
+    location = get_lat_long(address)
     if location is None:
         return None
 
@@ -122,6 +249,7 @@ def get_timezone_from_address(address):
     return pytz.timezone(timezone_str)
 
 
+@single_flight(_address_key)
 def get_lat_long(address):
     """
     Get latitude and longitude from a given address.
@@ -132,12 +260,42 @@ def get_lat_long(address):
     Returns:
     - location: geopy Location object if found, else None
     """
+    place = gazetteer.lookup(address)
+    if place is not None:
+        return Location(place['label'], (place['latitude'], place['longitude']), {})
     location = geolocator.geocode(address)
     if location:
+        gazetteer.learn(location.address, location.latitude, location.longitude)
         return location
     return None
 
 
+@single_flight(_address_key)
+def suggest_addresses(query, limit=100):
+    """
+    Get address suggestions for a partial address.
+
+    The local gazetteer answers first; Nominatim is only queried when it has
+    no match, and its results are added to the gazetteer.
+
+    Parameters:
+    - query: str, the text typed so far
+    - limit: int, maximum number of suggestions
+
+    Returns:
+    - list: matching address strings
+    """
+    places = gazetteer.suggest(query, limit=limit)
+    if places:
+        return [place['label'] for place in places]
+    locations = geolocator.geocode(query, exactly_one=False, limit=limit)
+    if not locations:
+        return []
+    for location in locations:
+        gazetteer.learn(location.address, location.latitude, location.longitude)
+    return [location.address for location in locations]
+
+
 def interactive_map(address='Ondo, Nigeria'):
     """
     Generate an interactive map centered on a given address.
@@ -162,7 +320,35 @@ def interactive_map(address='Ondo, Nigeria'):
     return {'search_status': 'failed', 'map': m._repr_html_()}
 
 
-def pv_tracking(from_,lat, lon, to_,tz, color=None, plot_type='line',title=None, freq='5min', max_angle=90, axis_tilt=0, axis_azimuth=180):
+def tracking_angles(times, lat, lon, max_angle=90, axis_tilt=0, axis_azimuth=180, skip_night=True):
+    """
+    Single-axis tracker angles (pvlib.tracking.singleaxis, no backtracking),
+    stowed flat (tracker_theta 0) while the sun is down.
+
+    Parameters:
+    - times: tz-aware DatetimeIndex
+    - lat, lon: float, coordinates of the location
+    - max_angle, axis_tilt, axis_azimuth: float, tracker geometry in degrees
+    - skip_night: bool, compute the solar position and tracking only where
+      the sun may be up (see simulation_engine.sun_up); the tracker has no
+      angle at night either way, so the result is unchanged
+
+    Returns:
+    - DataFrame indexed by `times`
+    """
+    daylight = sun_up(lat, lon, times) if skip_night else np.ones(len(times), dtype=bool)
+    solpos = solarposition.get_solarposition(times[daylight], lat, lon)
+    return tracking.singleaxis(
+        apparent_zenith=solpos['apparent_zenith'],
+        apparent_azimuth=solpos['azimuth'],
+        axis_tilt=axis_tilt,
+        axis_azimuth=axis_azimuth,
+        max_angle=max_angle,
+        backtrack=False
+    ).reindex(times).fillna({'tracker_theta': 0})
+
+
+def pv_tracking(from_,lat, lon, to_,tz, color=None, plot_type='line',title=None, freq='5min', max_angle=90, axis_tilt=0, axis_azimuth=180, skip_night=True):
     """
     Generate a plot of solar panel tracking angles over time.
 
@@ -178,23 +364,16 @@ def pv_tracking(from_,lat, lon, to_,tz, color=None, plot_type='line',title=None,
     - max_angle: float, maximum tilt angle for the solar panel
     - axis_tilt: float, tilt of the axis
     - axis_azimuth: float, azimuth of the axis
+    - skip_night: bool, see tracking_angles
 
     Returns:
     - dict: dictionary containing plot HTML representation
     """
     times = pd.date_range(from_, to_, freq=freq, tz=tz)
-    solpos = solarposition.get_solarposition(times, lat, lon)
     ow_sample=''
 
-    # Calculate tracking angles
-    truetracking_angles = tracking.singleaxis(
-        apparent_zenith=solpos['apparent_zenith'],
-        apparent_azimuth=solpos['azimuth'],
-        axis_tilt=axis_tilt,
-        axis_azimuth=axis_azimuth,
-        max_angle=max_angle,
-        backtrack=False
-    ).fillna({'tracker_theta': 0})
+    # Calculate tracking angles; night samples are NaN and stowed flat
+    truetracking_angles = tracking_angles(times, lat, lon, max_angle, axis_tilt, axis_azimuth, skip_night)
 
     fig = generate_plot(
         df=truetracking_angles,
@@ -209,24 +388,30 @@ def pv_tracking(from_,lat, lon, to_,tz, color=None, plot_type='line',title=None,
     return {"fig": fig.to_html(), "sample": ow_sample}
 
 
-def climate_plots(lat,from_,to_, lon, y_, plot_type='line',df_interval='hourly', tz='UTC', title='Ambient Temperature', color='#603a47'):
+def climate_plots(lat,from_,to_, lon, y_, plot_type='line', tz='UTC', title='Ambient Temperature', color='#603a47', df_interval=None):
     """
-    Fetch TMY weather data for the given location and plot the specified variable.
+    Fetch weather data for the given location and plot the specified variable.
+
+    Only the plotted variable is requested from Open-Meteo; daily UV maxima
+    are aggregated locally from the hourly UV index.
 
     Parameters:
     - lat: float, latitude of the location
     - lon: float, longitude of the location
-    - y_: str, column to plot (e.g., 'temp_air', 'wind_speed')
+    - y_: str, column to plot (e.g., 'temperature_2m', 'uv_index_max')
     - plot_type: str, type of plot (e.g., 'line')
     - tz: str, time zone of the location
     - title: str, title of the plot
     - color: str, color of the plot line
+    - df_interval: str, 'hourly' or 'daily'; inferred from y_ when None
 
     Returns:
     - dict: dictionary containing plot HTML representation
     """
+    if df_interval is None:
+        df_interval = 'daily' if split_variables([y_])[1] else 'hourly'
     ow_sample=''
-    weather=fetch_all_weather_data(start_date=from_, end_date=to_, latitude=lat, longitude=lon,user_timezone=tz,df_interval=df_interval)
+    weather=fetch_all_weather_data(start_date=from_, end_date=to_, latitude=lat, longitude=lon,user_timezone=tz,df_interval=df_interval,variables=[y_],derive_daily=True)
     try:
         ow_sample=df_sample_to_bootstrap_cards(weather)
     except Exception as e:
@@ -0,0 +1,132 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+import threading
+import zlib
+
+# Total size of the cache directory above which least recently used results are evicted
+RESULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+RESULT_SUFFIX = '.pkl.z'
+
+
+def fingerprint(params):
+    """
+    Stable hex digest of a JSON-serialisable dict of parameters.
+    """
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    File-based LRU cache of computed results (e.g. simulation DataFrames).
+
+    Each entry is a zlib-compressed pickle named '<key><RESULT_SUFFIX>', so
+    the cache is shared by every worker process on the host. Reads refresh
+    the file's modification time, which is what eviction orders by. Keys
+    are built by the caller, usually '<owner prefix>_<fingerprint>', so all
+    entries of an owner can be invalidated with `invalidate(prefix)`.
+    """
+
+    def __init__(self, directory, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}{RESULT_SUFFIX}')
+
+    def get(self, key):
+        """
+        Return the cached value of `key`, or None when it is not cached.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as handle:
+                value = pickle.loads(zlib.decompress(handle.read()))
+            os.utime(path)
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """
+        Store `value` under `key` and evict old entries past max_bytes.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        data = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        # Write then rename so concurrent readers never see a partial file
+        temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary_path, 'wb') as handle:
+            handle.write(data)
+        os.replace(temporary_path, path)
+        self.evict()
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value of `key`, computing and storing it on a miss.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def _entries(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, f'*{RESULT_SUFFIX}')):
+            try:
+                status = os.stat(path)
+            except OSError:
+                continue
+            entries.append((status.st_mtime, status.st_size, path))
+        return entries
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits in max_bytes.
+        """
+        if self.max_bytes is None:
+            return
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def invalidate(self, prefix):
+        """
+        Delete every entry whose key starts with `prefix`.
+        """
+        for path in glob.glob(os.path.join(self.directory, f'{glob.escape(prefix)}*{RESULT_SUFFIX}')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+            'entries': len(entries),
+            'size_bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
@@ -0,0 +1,367 @@
+import glob
+import os
+import threading
+
+import pandas as pd
+
+from .aggregations import sample_hours
+from .h5frames import append_frame, open_file, read_frame, write_frame
+
+# Directory holding one HDF5 file of results per simulation
+RESULT_STORE_DIR = os.path.join(os.getcwd(), 'data', 'results')
+
+# Total size of the store above which least recently used simulations are evicted
+RESULT_STORE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Resolutions read_range can serve (pandas offset alias -> approximate hours);
+# each is stored as a pre-aggregated rollup of every frame sampled more finely
+RESOLUTIONS = {'D': 24, 'W': 7 * 24, 'MS': 30 * 24}
+
+# Seconds to wait for another process to release a simulation's file: HDF5
+# locks a file for as long as any process has it open
+RESULT_STORE_LOCK_TIMEOUT = 10
+
+
+def rollup_name(name, resolution):
+    return f'{name}@{resolution}'
+
+
+def period_bounds(labels, resolution):
+    """
+    First instant and the start of the next period of each `resolution`
+    period, from the labels `DataFrame.resample` gives them: days and
+    months are labelled by their start, weeks (Monday to Sunday) by their
+    Sunday.
+
+    Returns:
+    - tuple of DatetimeIndex: (first, next)
+    """
+    if resolution == 'W':
+        return labels - pd.DateOffset(days=6), labels + pd.DateOffset(days=1)
+    if resolution == 'MS':
+        return labels, labels + pd.DateOffset(months=1)
+    return labels, labels + pd.DateOffset(days=1)
+
+
+def _utc(value):
+    value = pd.Timestamp(value)
+    return value.tz_localize('UTC') if value.tz is None else value
+
+
+def resample_to(df, resolution):
+    """
+    Column means of `df` per `resolution` period, or `df` itself when it is
+    already sampled at least that coarsely.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution {resolution!r}, expected one of {list(RESOLUTIONS)}")
+    if len(df) > 1 and sample_hours(df.index) >= RESOLUTIONS[resolution]:
+        return df
+    return df.resample(resolution).mean()
+
+
+def window(df, start=None, end=None, columns=None, resolution=None):
+    """
+    In-memory counterpart of ResultStore.read_range for a result that is
+    not stored.
+    """
+    if start is not None:
+        df = df[df.index >= start]
+    if end is not None:
+        df = df[df.index <= end]
+    if columns is not None:
+        df = df[[column for column in columns if column in df.columns]]
+    return resample_to(df, resolution) if resolution is not None else df
+
+
+def _restore_index(df, group):
+    timezone = group.attrs.get('timezone')
+    if timezone:
+        df.index = df.index.tz_convert(timezone)
+    df.index.name = group.attrs.get('index_name') or None
+    return df
+
+
+class ResultStore:
+    """
+    Columnar HDF5 store of simulation results.
+
+    Every simulation has its own file, 'simulation_<id>.h5', holding one
+    group per parameter fingerprint and in it one frame per result (e.g.
+    'weather_df', 'daily_weather_df') written with utils.h5frames: a
+    sorted int64 time dataset plus one chunked dataset per column. Reads
+    can therefore ask for a time range and a subset of columns without
+    loading the rest, and frames can be appended to in place.
+
+    Next to each frame, `write` stores its rollups: the mean of every
+    column per day, week and month (see RESOLUTIONS), named
+    '<frame>@<resolution>', so zoomed-out views read a few hundred rows
+    instead of the full series.
+
+    A fingerprint group is marked complete once all its frames are
+    written, so a result interrupted mid-write is never served. Reads
+    refresh the file's modification time, which is what eviction orders
+    by.
+
+    HDF5 locks a file while any process has it open, so opening one that
+    another worker is reading or writing is retried for up to
+    `lock_timeout` seconds before the OSError is raised.
+    """
+
+    def __init__(self, directory=RESULT_STORE_DIR, max_bytes=RESULT_STORE_MAX_BYTES,
+                 lock_timeout=RESULT_STORE_LOCK_TIMEOUT):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock_timeout = lock_timeout
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def path(self, simulation_id):
+        return os.path.join(self.directory, f'simulation_{simulation_id}.h5')
+
+    def _open(self, simulation_id, mode):
+        if mode != 'r':
+            os.makedirs(self.directory, exist_ok=True)
+        return open_file(self.path(simulation_id), mode, self.lock_timeout)
+
+    @staticmethod
+    def _write_attrs(group, df):
+        group.attrs['timezone'] = str(df.index.tz) if getattr(df.index, 'tz', None) is not None else ''
+        group.attrs['index_name'] = df.index.name or ''
+
+    def write(self, simulation_id, fingerprint, frames):
+        """
+        Store the frames of one result, replacing any previous version.
+
+        Parameters:
+        - simulation_id: int, owner of the result
+        - fingerprint: str, digest of the parameters that produced it
+        - frames: dict of name -> DataFrame with a DatetimeIndex and numeric columns
+        """
+        with self._lock, self._open(simulation_id, 'a') as store:
+            if fingerprint in store:
+                del store[fingerprint]
+            result = store.create_group(fingerprint)
+            for name, df in frames.items():
+                for frame_name, frame in [(name, df)] + self._rollups(name, df):
+                    group = result.create_group(frame_name)
+                    write_frame(group, frame)
+                    self._write_attrs(group, frame)
+            result.attrs['complete'] = True
+        self.evict()
+
+    @staticmethod
+    def _rollups(name, df):
+        if len(df) < 2:
+            return []
+        step_hours = sample_hours(df.index)
+        return [
+            (rollup_name(name, resolution), df.resample(resolution).mean())
+            for resolution, hours in RESOLUTIONS.items() if hours > step_hours
+        ]
+
+    def append(self, simulation_id, fingerprint, name, df):
+        """
+        Append rows to one frame of a result (see utils.h5frames.append_frame).
+
+        The result is marked complete by `finish` once the last rows are in.
+        Appended frames have no rollups; read_range aggregates them on read.
+        """
+        with self._lock, self._open(simulation_id, 'a') as store:
+            result = store.require_group(fingerprint)
+            result.attrs['complete'] = False
+            group = result.require_group(name)
+            append_frame(group, df)
+            self._write_attrs(group, df)
+
+    def finish(self, simulation_id, fingerprint):
+        with self._lock, self._open(simulation_id, 'a') as store:
+            store.require_group(fingerprint).attrs['complete'] = True
+        self.evict()
+
+    def read(self, simulation_id, fingerprint, names=None, start=None, end=None, columns=None):
+        """
+        Read a stored result, or None when it is missing or incomplete.
+
+        Parameters:
+        - simulation_id, fingerprint: key of the result
+        - names: list of frame names to read, defaults to every frame but the rollups
+        - start, end: timestamp-like, inclusive time range (naive values are UTC)
+        - columns: list of columns to read from each frame, defaults to all
+
+        Returns:
+        - dict of name -> DataFrame in the frame's original timezone
+        """
+        path = self.path(simulation_id)
+        frames = None
+        try:
+            with self._lock, self._open(simulation_id, 'r') as store:
+                result = store.get(fingerprint)
+                if result is not None and result.attrs.get('complete', False):
+                    if names is None:
+                        names = [name for name in result.keys() if '@' not in name]
+                    frames = {
+                        name: _restore_index(read_frame(result[name], start, end, columns), result[name])
+                        for name in names if name in result
+                    }
+            os.utime(path)
+        except OSError:
+            frames = None
+        with self._lock:
+            if frames is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return frames
+
+    def read_range(self, simulation_id, fingerprint, name, start=None, end=None, columns=None, resolution=None):
+        """
+        Read a time window of one frame, optionally at a coarser resolution.
+
+        Only the rows inside [start, end] and the requested columns are read,
+        located by binary search over the sorted time index. With a
+        `resolution` the stored rollup serves the periods lying entirely
+        inside the window, and the partial periods at its edges are
+        aggregated from their rows, so the result is the same as
+        aggregating the window (utils.result_store.window). Without a
+        rollup the whole window is aggregated (column means) after reading.
+
+        Parameters:
+        - simulation_id, fingerprint: key of the result
+        - name: str, frame name, e.g. 'weather_df'
+        - start, end: timestamp-like, inclusive window (naive values are UTC)
+        - columns: list of columns to read, defaults to all
+        - resolution: RESOLUTIONS key or None for the stored samples
+
+        Returns:
+        - DataFrame, or None when the result or frame is not stored
+        """
+        if resolution is not None and resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution {resolution!r}, expected one of {list(RESOLUTIONS)}")
+        if resolution is not None:
+            df = self._read_rollup(simulation_id, fingerprint, name, start, end, columns, resolution)
+            if df is not None:
+                return df
+        frames = self.read(simulation_id, fingerprint, names=[name], start=start, end=end, columns=columns)
+        if not frames:
+            return None
+        return resample_to(frames[name], resolution) if resolution is not None else frames[name]
+
+    def _read_rollup(self, simulation_id, fingerprint, name, start, end, columns, resolution):
+        """
+        read_range at `resolution` from the stored rollup, or None when
+        there is none.
+        """
+        start = _utc(start) if start is not None else None
+        end = _utc(end) if end is not None else None
+        # Rollup labels lie up to a month before / a week after their rows
+        margin = pd.Timedelta(days=32)
+        rollup = rollup_name(name, resolution)
+        frames = self.read(
+            simulation_id, fingerprint, names=[rollup], columns=columns,
+            start=start - margin if start is not None else None, end=end + margin if end is not None else None,
+        )
+        if not frames or rollup not in frames:
+            return None
+        df = frames[rollup]
+        first, following = period_bounds(df.index, resolution)
+        inside = pd.Series(True, index=df.index).to_numpy()
+        if start is not None:
+            inside &= first >= start
+        if end is not None:
+            inside &= following - pd.Timedelta(1, 'ns') <= end
+        if not inside.any():
+            return None
+
+        def edge(edge_start, edge_end):
+            # A partial period at the edge of the window, aggregated from its rows
+            frames = self.read(simulation_id, fingerprint, names=[name], start=edge_start, end=edge_end, columns=columns)
+            if not frames or name not in frames or frames[name].empty:
+                return []
+            return [frames[name].resample(resolution).mean()]
+
+        head, tail = [], []
+        if start is not None and start < first[inside][0]:
+            head = edge(start, first[inside][0] - pd.Timedelta(1, 'ns'))
+        if end is not None and following[inside][-1] <= end:
+            tail = edge(following[inside][-1], end)
+        return pd.concat(head + [df[inside]] + tail)
+
+    def get_or_compute(self, simulation_id, fingerprint, compute):
+        """
+        Return the stored result, computing and storing it when missing.
+
+        A result that cannot be stored (e.g. the file stayed locked) is
+        still returned; it is computed again next time.
+        """
+        frames = self.read(simulation_id, fingerprint)
+        if frames is None:
+            frames = compute()
+            try:
+                self.write(simulation_id, fingerprint, frames)
+            except OSError as error:
+                print(f"Could not store result {fingerprint} of simulation {simulation_id}: {error}")
+        return frames
+
+    def fingerprints(self, simulation_id):
+        try:
+            with self._lock, self._open(simulation_id, 'r') as store:
+                return [name for name in store.keys() if store[name].attrs.get('complete', False)]
+        except OSError:
+            return []
+
+    def delete(self, simulation_id, fingerprint=None):
+        """
+        Delete one result of a simulation, or all of them.
+        """
+        path = self.path(simulation_id)
+        with self._lock:
+            try:
+                if fingerprint is None:
+                    os.remove(path)
+                    return
+                with self._open(simulation_id, 'a') as store:
+                    if fingerprint in store:
+                        del store[fingerprint]
+            except OSError:
+                pass
+
+    def _entries(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, 'simulation_*.h5')):
+            try:
+                status = os.stat(path)
+            except OSError:
+                continue
+            entries.append((status.st_mtime, status.st_size, path))
+        return entries
+
+    def evict(self):
+        """
+        Delete the least recently used simulations' files until the store fits in max_bytes.
+        """
+        if self.max_bytes is None:
+            return
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self):
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+            'simulations': len(entries),
+            'size_bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pvlib
+
+# Directory holding the binary snapshots of the SAM component libraries
+SAM_SNAPSHOT_DIR = os.path.join(os.getcwd(), 'data', 'sam')
+
+
+class ComponentCatalogue:
+    """
+    Lazily loaded SAM component library (pvlib.pvsystem.retrieve_sam).
+
+    The library is parsed once into a snapshot: a '<name>.npy' float64
+    matrix of the numeric parameters (one row per component) and a
+    '<name>.json' file with the component names, parameter names and text
+    parameters. The matrix is memory-mapped, so worker processes share the
+    same pages, and nothing is read before the first access. Snapshots are
+    rebuilt when the installed pvlib version changes.
+
+    Lookups mirror the DataFrame retrieve_sam returns: `catalogue[name]`
+    is the component's parameter Series and `keys()` lists the names.
+    """
+
+    def __init__(self, name, directory=SAM_SNAPSHOT_DIR):
+        self.name = name
+        self.directory = directory
+        self._meta = None
+        self._values = None
+        self._positions = None
+        self._lock = threading.Lock()
+
+    @property
+    def matrix_path(self):
+        return os.path.join(self.directory, f'{self.name}.npy')
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.directory, f'{self.name}.json')
+
+    def build_snapshot(self):
+        """
+        Parse the SAM library and write its snapshot files.
+        """
+        library = pvlib.pvsystem.retrieve_sam(self.name).T
+        numeric, integer, text = [], [], {}
+        for column in library.columns:
+            kinds = set(library[column].map(lambda value: type(value).__name__))
+            if kinds <= {'float', 'int'}:
+                numeric.append(column)
+                if kinds == {'int'}:
+                    integer.append(column)
+            else:
+                text[column] = [None if isinstance(value, float) and np.isnan(value) else value for value in library[column]]
+        meta = {
+            'pvlib_version': pvlib.__version__,
+            'names': list(library.index),
+            'parameters': list(library.columns),
+            'numeric': numeric,
+            'integer': integer,
+            'text': text,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        # Write then rename so other processes never load a partial snapshot
+        temporary = f'.{os.getpid()}.tmp'
+        with open(self.matrix_path + temporary, 'wb') as handle:
+            np.save(handle, library[numeric].to_numpy(dtype=np.float64))
+        with open(self.meta_path + temporary, 'w') as handle:
+            json.dump(meta, handle)
+        os.replace(self.matrix_path + temporary, self.matrix_path)
+        os.replace(self.meta_path + temporary, self.meta_path)
+        return meta
+
+    def _load_meta(self):
+        if self._meta is not None:
+            return self._meta
+        with self._lock:
+            if self._meta is None:
+                meta = None
+                if os.path.exists(self.meta_path) and os.path.exists(self.matrix_path):
+                    with open(self.meta_path) as handle:
+                        meta = json.load(handle)
+                    if meta.get('pvlib_version') != pvlib.__version__:
+                        meta = None
+                if meta is None:
+                    print(f"Building the {self.name} component snapshot")
+                    meta = self.build_snapshot()
+                self._positions = {name: position for position, name in enumerate(meta['names'])}
+                self._meta = meta
+        return self._meta
+
+    @property
+    def values(self):
+        """
+        Memory-mapped (components x numeric parameters) matrix.
+        """
+        self._load_meta()
+        if self._values is None:
+            self._values = np.load(self.matrix_path, mmap_mode='r')
+        return self._values
+
+    @property
+    def numeric_parameters(self):
+        return self._load_meta()['numeric']
+
+    def keys(self):
+        return self._load_meta()['names']
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, name):
+        self._load_meta()
+        return name in self._positions
+
+    def position(self, name):
+        self._load_meta()
+        return self._positions[name]
+
+    def __getitem__(self, name):
+        meta = self._load_meta()
+        position = self._positions[name]
+        row = self.values[position]
+        integer = set(meta['integer'])
+        values = {
+            parameter: int(value) if parameter in integer else float(value)
+            for parameter, value in zip(meta['numeric'], row)
+        }
+        for parameter, column in meta['text'].items():
+            value = column[position]
+            values[parameter] = np.nan if value is None else value
+        return pd.Series([values[parameter] for parameter in meta['parameters']], index=meta['parameters'], name=name, dtype=object)
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def frame(self):
+        """
+        The whole library as a (components x parameters) DataFrame.
+        """
+        meta = self._load_meta()
+        df = pd.DataFrame(np.asarray(self.values), index=meta['names'], columns=meta['numeric'])
+        for parameter, column in meta['text'].items():
+            df[parameter] = column
+        return df[meta['parameters']]
+
+
+inverter_catalogue = ComponentCatalogue('cecinverter')
+module_catalogue = ComponentCatalogue('sandiamod')
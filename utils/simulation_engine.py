@@ -0,0 +1,511 @@
+import numpy as np
+import pandas as pd
+import pvlib
+from scipy import constants
+
+# ModelChain adds these when the weather has no 'temp_air' / 'wind_speed'
+DEFAULT_TEMP_AIR = 20.0
+DEFAULT_WIND_SPEED = 0.0
+
+# Per-scenario output columns of run_scenarios
+SCENARIO_COLUMNS = ('poa_global', 'effective_irradiance', 'cell_temperature', 'v_mp', 'p_mp', 'ac')
+
+# Engines of run_scenarios: pvlib's functions on stacked arrays, or the fused kernel
+ENGINES = ('pvlib', 'fused')
+
+# The fused kernel reorders a few floating point operations; its AC output
+# matches ModelChain within this relative / absolute (W) tolerance
+FUSED_RTOL = 1e-9
+FUSED_ATOL = 1e-6
+
+# SAPM reference conditions (pvlib.pvsystem.sapm, pvlib.temperature.sapm_cell)
+REFERENCE_IRRADIANCE = 1000.
+REFERENCE_TEMPERATURE = 25.
+
+# Degrees below the horizon still treated as daylight by sun_up, covering the
+# analytical solar position's error and atmospheric refraction
+NIGHT_ZENITH_MARGIN = 3.
+
+
+def sun_up(latitude, longitude, times, margin=NIGHT_ZENITH_MARGIN):
+    """
+    Samples at which the sun may be above the horizon.
+
+    Uses the analytical solar zenith (Spencer's declination and equation of
+    time), which costs a few vectorised trigonometric operations instead of
+    a full solar position calculation; `margin` degrees of slack make sure
+    no sample with the sun above the horizon is missed.
+
+    Parameters:
+    - latitude, longitude: float, decimal degrees
+    - times: tz-aware DatetimeIndex
+    - margin: float, degrees below the horizon still counted as sun-up
+
+    Returns:
+    - boolean array
+    """
+    times = pd.DatetimeIndex(times)
+    utc = times.tz_convert('UTC') if times.tz is not None else times
+    day_of_year = np.asarray(utc.dayofyear, dtype=float)
+    declination = pvlib.solarposition.declination_spencer71(day_of_year)
+    equation_of_time = pvlib.solarposition.equation_of_time_spencer71(day_of_year)
+    # Hour angle from UTC clock time, so daylight saving time cannot shift it
+    utc_hours = (utc - utc.normalize()) / pd.Timedelta(hours=1)
+    hour_angle = 15. * (np.asarray(utc_hours, dtype=float) - 12.) + longitude + equation_of_time / 4.
+    zenith = pvlib.solarposition.solar_zenith_analytical(np.radians(latitude), np.radians(hour_angle), declination)
+    return np.degrees(np.asarray(zenith, dtype=float)) < 90 + margin
+
+
+def daylight_mask(location, times, scenarios=None):
+    """
+    Samples the model chain has to run on when skipping the night.
+
+    The chain runs where the sun may be up (sun_up), or any scenario has
+    non-zero or missing irradiance, or missing temperature or wind speed.
+    Everywhere else the sun is down and nothing reaches the array, so the
+    chain's output is the same at every such sample (its cell temperature
+    aside, which equals the air temperature): the first of them is kept in
+    the mask as the night sample whose output fill_night copies to the rest.
+
+    Parameters:
+    - location: pvlib Location
+    - times: tz-aware DatetimeIndex
+    - scenarios: dict of name -> weather DataFrame, as in run_scenarios
+
+    Returns:
+    - tuple: (boolean array of the samples to run the chain on, Timestamp
+      of the night sample, or None when there is no night to skip)
+    """
+    mask = sun_up(location.latitude, location.longitude, times)
+    for weather in (scenarios or {}).values():
+        for column in ('ghi', 'dni', 'dhi', 'temp_air', 'wind_speed'):
+            if column not in weather:
+                continue
+            values = weather[column].reindex(times).to_numpy(dtype=float)
+            # NaN != 0, so missing irradiance counts as non-zero
+            mask |= (values != 0) if column in ('ghi', 'dni', 'dhi') else np.isnan(values)
+    night = np.flatnonzero(~mask)
+    if len(night) == 0:
+        return mask, None
+    mask[night[0]] = True
+    return mask, times[night[0]]
+
+
+def compute_geometry(location, times, surface_tilt, surface_azimuth, temp_air=None):
+    """
+    Weather-independent inputs of the model chain, computed once per
+    timestamp and shared by every scenario.
+
+    Uses the models ModelChain infers for our systems: 'nrel_numpy' solar
+    position, 'kastenyoung1989' airmass and the fixed mount's AOI.
+
+    Parameters:
+    - location: pvlib Location
+    - times: DatetimeIndex
+    - surface_tilt, surface_azimuth: float, orientation of the array in degrees
+    - temp_air: Series or float, air temperature of the refraction correction,
+      as ModelChain uses when its weather has 'temp_air' (pvlib's 12 C if None)
+
+    Returns:
+    - dict: 'times', 'solar_position' (DataFrame), and 'apparent_zenith',
+      'azimuth', 'airmass_relative', 'airmass_absolute', 'dni_extra', 'aoi',
+      'aoi_projection', 'cos_aoi' and 'ratio_to_horizontal' arrays
+    """
+    solar_position = location.get_solarposition(times, temperature=12 if temp_air is None else temp_air)
+    airmass = location.get_airmass(solar_position=solar_position)
+    dni_extra = pvlib.irradiance.get_extra_radiation(times)
+    apparent_zenith = solar_position['apparent_zenith'].to_numpy(dtype=float)
+    azimuth = solar_position['azimuth'].to_numpy(dtype=float)
+    projection = np.asarray(pvlib.irradiance.aoi_projection(surface_tilt, surface_azimuth, apparent_zenith, azimuth), dtype=float)
+    aoi = np.degrees(np.arccos(projection))
+    return {
+        'times': times,
+        'solar_position': solar_position,
+        'apparent_zenith': apparent_zenith,
+        'azimuth': azimuth,
+        'airmass_relative': airmass['airmass_relative'].to_numpy(dtype=float),
+        'airmass_absolute': airmass['airmass_absolute'].to_numpy(dtype=float),
+        'dni_extra': np.asarray(dni_extra, dtype=float),
+        'aoi': aoi,
+        'aoi_projection': projection,
+        # cos(aoi) as poa_components computes it, and Hay-Davies' Rb
+        'cos_aoi': np.cos(np.radians(aoi)),
+        'ratio_to_horizontal': np.maximum(projection, 0) / np.maximum(np.cos(np.radians(apparent_zenith)), 0.01745),
+    }
+
+
+def clear_sky_weather(location, geometry):
+    """
+    Ineichen clear-sky irradiance for the geometry's timestamps, reusing its
+    solar position, airmass and extraterrestrial irradiance.
+    """
+    return location.get_clearsky(
+        geometry['times'],
+        solar_position=geometry['solar_position'],
+        dni_extra=pd.Series(geometry['dni_extra'], index=geometry['times']),
+        airmass_absolute=pd.Series(geometry['airmass_absolute'], index=geometry['times']),
+    )
+
+
+def _stack(scenarios, column, default, times):
+    rows = []
+    for weather in scenarios.values():
+        if column in weather:
+            rows.append(weather[column].reindex(times).to_numpy(dtype=float))
+        else:
+            rows.append(np.full(len(times), default, dtype=float))
+    return np.vstack(rows)
+
+
+def _polyval(coefficients, values):
+    # Horner's scheme, as np.polyval
+    result = np.full_like(values, coefficients[0])
+    for coefficient in coefficients[1:]:
+        result *= values
+        result += coefficient
+    return result
+
+
+def module_modifiers(geometry, module):
+    """
+    Weather-independent SAPM factors of a module: the AOI modifier
+    (pvlib.iam.sapm) and the spectral modifier (spectral_factor_sapm).
+    Computed once per (geometry, module) by the fused kernel.
+    """
+    aoi = geometry['aoi']
+    aoi_modifier = np.clip(_polyval([module[f'B{k}'] for k in range(5, -1, -1)], aoi), 0, None)
+    aoi_modifier[~(aoi >= 0) & ~np.isnan(aoi)] = 0
+    spectral_modifier = _polyval([module[f'A{k}'] for k in range(4, -1, -1)], geometry['airmass_absolute'])
+    spectral_modifier[np.isnan(spectral_modifier)] = 0
+    np.maximum(spectral_modifier, 0, out=spectral_modifier)
+    return aoi_modifier, spectral_modifier
+
+
+def sandia_inverter(v_dc, p_dc, inverter):
+    """
+    Sandia inverter model (pvlib.inverter.sandia) on float arrays, also
+    returning the power lost to clipping at Paco.
+
+    Returns:
+    - tuple of arrays: (AC power, clipped power) in W
+    """
+    voltage_delta = v_dc - inverter['Vdco']
+    a = inverter['Pdco'] * (1 + inverter['C1'] * voltage_delta)
+    b = inverter['Pso'] * (1 + inverter['C2'] * voltage_delta)
+    c = inverter['C0'] * (1 + inverter['C3'] * voltage_delta)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        above_self_consumption = p_dc - b
+        unclipped = (inverter['Paco'] / (a - b) - c * (a - b)) * above_self_consumption + c * above_self_consumption ** 2
+        ac = np.minimum(inverter['Paco'], unclipped)
+        clipped = unclipped - ac
+        night = p_dc < inverter['Pso']
+    ac[night] = -1.0 * abs(inverter['Pnt'])
+    clipped[night] = 0
+    return ac, clipped
+
+
+def fused_sapm_sandia(geometry, ghi, dni, dhi, temp_air, wind_speed, module, inverter, temperature,
+                      surface_tilt, albedo, modules_per_string=1, strings=1, modifiers=None):
+    """
+    Hay-Davies transposition, SAPM effective irradiance, sapm_cell
+    temperature, SAPM DC and the Sandia inverter as one pass of in-place
+    NumPy operations on float64 arrays.
+
+    Implements the same equations as the pvlib functions used by
+    run_scenarios(engine='pvlib'), skipping the outputs the AC result does
+    not need (i_sc, v_oc, i_x, i_xx), the pandas wrapping and the per-call
+    parameter lookups. AC power matches ModelChain within FUSED_RTOL /
+    FUSED_ATOL.
+
+    Parameters:
+    - geometry: output of compute_geometry
+    - ghi, dni, dhi, temp_air, wind_speed: float arrays broadcastable to (..., times)
+    - module, inverter: Sandia module and CEC inverter parameters
+    - temperature: SAPM temperature model parameters ('a', 'b', 'deltaT')
+    - surface_tilt, albedo: float, array tilt in degrees and ground albedo
+    - modules_per_string, strings: int, array layout
+    - modifiers: output of module_modifiers, to reuse it across calls
+
+    Returns:
+    - dict of arrays: SCENARIO_COLUMNS
+    """
+    aoi_modifier, spectral_modifier = modifiers if modifiers is not None else module_modifiers(geometry, module)
+    projection = geometry['aoi_projection']
+    cos_tilt = np.cos(np.radians(surface_tilt))
+
+    # Plane of array irradiance (haydavies sky diffuse + isotropic ground diffuse)
+    anisotropy = dni / geometry['dni_extra']
+    sky_diffuse = dhi * (1 - anisotropy)
+    sky_diffuse *= 0.5 * (1 + cos_tilt)
+    np.maximum(sky_diffuse, 0, out=sky_diffuse)
+    circumsolar = dhi * (anisotropy * geometry['ratio_to_horizontal'])
+    np.maximum(circumsolar, 0, out=circumsolar)
+    poa_diffuse = sky_diffuse
+    poa_diffuse += circumsolar
+    poa_diffuse += ghi * albedo * (1 - cos_tilt) * 0.5
+    poa_direct = dni * geometry['cos_aoi']
+    np.maximum(poa_direct, 0, out=poa_direct)
+    poa_global = poa_direct + poa_diffuse
+
+    # Effective irradiance (suns) and cell temperature
+    effective_irradiance = poa_direct * aoi_modifier
+    effective_irradiance += module.get('FD', 1.) * poa_diffuse
+    effective_irradiance *= spectral_modifier
+    cell_temperature = poa_global * np.exp(temperature['a'] + temperature['b'] * wind_speed)
+    cell_temperature += temp_air
+    cell_temperature += poa_global / REFERENCE_IRRADIANCE * temperature['deltaT']
+    suns = effective_irradiance / REFERENCE_IRRADIANCE
+    temperature_delta = cell_temperature - REFERENCE_TEMPERATURE
+
+    # SAPM maximum power point of one module
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_suns = np.log(suns)
+    log_suns[suns == 0] = -np.inf
+    thermal_voltage = module['N'] * constants.k * (cell_temperature + 273.15) / constants.e
+    cells = module['Cells_in_Series']
+    i_mp = module['Impo'] * (module['C0'] * suns + module['C1'] * suns ** 2) * (1 + module['Aimp'] * temperature_delta)
+    with np.errstate(invalid='ignore'):
+        v_mp = (
+            module['Vmpo']
+            + module['C2'] * cells * thermal_voltage * log_suns
+            + module['C3'] * cells * (thermal_voltage * log_suns) ** 2
+            + (module['Bvmpo'] + module['Mbvmp'] * (1 - suns)) * temperature_delta
+        )
+        np.maximum(0, v_mp, out=v_mp)
+        p_mp = i_mp * v_mp
+
+    # Array DC output
+    v_mp *= modules_per_string
+    p_mp *= modules_per_string * strings
+
+    ac, _ = sandia_inverter(v_mp, p_mp, inverter)
+
+    return {
+        'poa_global': poa_global,
+        'effective_irradiance': effective_irradiance,
+        'cell_temperature': cell_temperature,
+        'v_mp': v_mp,
+        'p_mp': p_mp,
+        'ac': ac,
+    }
+
+
+def stack_weather(scenarios, times):
+    """
+    (scenarios x times) float arrays of the weather columns the chain uses,
+    with ModelChain's defaults where 'temp_air' / 'wind_speed' are missing.
+
+    Returns:
+    - dict: 'ghi', 'dni', 'dhi', 'temp_air', 'wind_speed'
+    """
+    return {
+        'ghi': _stack(scenarios, 'ghi', np.nan, times),
+        'dni': _stack(scenarios, 'dni', np.nan, times),
+        'dhi': _stack(scenarios, 'dhi', np.nan, times),
+        'temp_air': _stack(scenarios, 'temp_air', DEFAULT_TEMP_AIR, times),
+        'wind_speed': _stack(scenarios, 'wind_speed', DEFAULT_WIND_SPEED, times),
+    }
+
+
+def plane_of_array(system, geometry, ghi, dni, dhi):
+    """
+    Hay-Davies plane of array irradiance of the system's array.
+
+    Returns:
+    - dict of arrays: 'poa_global', 'poa_direct', 'poa_diffuse'
+    """
+    array = system.arrays[0]
+    irradiance = pvlib.irradiance.get_total_irradiance(
+        array.mount.surface_tilt, array.mount.surface_azimuth,
+        geometry['apparent_zenith'], geometry['azimuth'],
+        dni, ghi, dhi,
+        dni_extra=geometry['dni_extra'],
+        airmass=geometry['airmass_relative'],
+        albedo=array.albedo,
+        model='haydavies',
+    )
+    return {column: irradiance[column] for column in ('poa_global', 'poa_direct', 'poa_diffuse')}
+
+
+def module_temperature(system, poa_global, temp_air, wind_speed):
+    """
+    SAPM cell temperature (pvlib.temperature.sapm_cell) of the system's array.
+    """
+    temperature = system.arrays[0].temperature_model_parameters
+    return pvlib.temperature.sapm_cell(
+        poa_global, temp_air, wind_speed, temperature['a'], temperature['b'], temperature['deltaT'],
+    )
+
+
+def module_dc(system, geometry, poa, cell_temperature):
+    """
+    SAPM effective irradiance and maximum power point of a single module.
+
+    Returns:
+    - dict of arrays: 'effective_irradiance', 'v_mp', 'p_mp'
+    """
+    array = system.arrays[0]
+    module = array.module_parameters
+    aoi_modifier = np.asarray(array.get_iam(geometry['aoi'], iam_model='sapm'), dtype=float)
+    spectral_modifier = np.asarray(pvlib.spectrum.spectral_factor_sapm(geometry['airmass_absolute'], module), dtype=float)
+    effective_irradiance = spectral_modifier * (
+        poa['poa_direct'] * aoi_modifier + module.get('FD', 1.) * poa['poa_diffuse']
+    )
+    # Missing weather hours are NaN throughout, as in ModelChain
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dc = pvlib.pvsystem.sapm(effective_irradiance, cell_temperature, module)
+    return {'effective_irradiance': effective_irradiance, 'v_mp': dc['v_mp'], 'p_mp': dc['p_mp']}
+
+
+def array_ac(system, dc):
+    """
+    Array DC output (module_dc scaled by the string layout) and Sandia
+    inverter AC output.
+
+    Returns:
+    - dict of arrays: 'v_mp', 'p_mp', 'ac'
+    """
+    array = system.arrays[0]
+    v_mp = dc['v_mp'] * array.modules_per_string
+    p_mp = dc['p_mp'] * array.modules_per_string * array.strings
+    return {'v_mp': v_mp, 'p_mp': p_mp, 'ac': pvlib.inverter.sandia(v_mp, p_mp, system.inverter_parameters)}
+
+
+def run_scenarios(system, location, scenarios, geometry=None, engine='pvlib'):
+    """
+    Run the SAPM/Sandia model chain for several weather scenarios at once.
+
+    Geometry (solar position, airmass, AOI) is computed once; the
+    irradiance of every scenario is stacked into (scenarios x times)
+    arrays that flow through transposition, SAPM effective irradiance,
+    `sapm_cell` temperature, `sapm` DC and the Sandia inverter together, so
+    each extra scenario only adds its irradiance-dependent work. The
+    models are the ones ModelChain infers for a PVSystem with Sandia
+    module, CEC inverter and SAPM temperature parameters ('haydavies'
+    transposition, no losses), and results match `ModelChain.run_model`
+    (within FUSED_RTOL / FUSED_ATOL with engine='fused').
+
+    Parameters:
+    - system: pvlib PVSystem with a single fixed array
+    - location: pvlib Location
+    - scenarios: dict of name -> weather DataFrame with 'ghi', 'dni', 'dhi'
+      and optionally 'temp_air' and 'wind_speed'; scenarios are aligned on
+      the index of the first one unless `geometry` is given, whose air
+      temperature is used for refraction
+    - geometry: output of compute_geometry, to share it across calls
+    - engine: 'pvlib' to chain pvlib's functions, 'fused' for fused_sapm_sandia
+
+    Returns:
+    - dict: name -> DataFrame with SCENARIO_COLUMNS
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown simulation engine {engine!r}, expected one of {ENGINES}")
+    array = system.arrays[0]
+    if geometry is None:
+        first = next(iter(scenarios.values()))
+        geometry = compute_geometry(
+            location, first.index, array.mount.surface_tilt, array.mount.surface_azimuth, first.get('temp_air'),
+        )
+    times = geometry['times']
+
+    weather = stack_weather(scenarios, times)
+
+    if engine == 'fused':
+        outputs = fused_sapm_sandia(
+            geometry, weather['ghi'], weather['dni'], weather['dhi'], weather['temp_air'], weather['wind_speed'],
+            array.module_parameters, system.inverter_parameters, array.temperature_model_parameters,
+            array.mount.surface_tilt, array.albedo, array.modules_per_string, array.strings,
+        )
+        return scenario_frames(outputs, scenarios, times)
+
+    poa = plane_of_array(system, geometry, weather['ghi'], weather['dni'], weather['dhi'])
+    cell_temperature = module_temperature(system, poa['poa_global'], weather['temp_air'], weather['wind_speed'])
+    dc = module_dc(system, geometry, poa, cell_temperature)
+    outputs = {
+        'poa_global': poa['poa_global'],
+        'effective_irradiance': dc['effective_irradiance'],
+        'cell_temperature': cell_temperature,
+        **array_ac(system, dc),
+    }
+    return scenario_frames(outputs, scenarios, times)
+
+
+def fill_night(frames, scenarios, times, mask, night_time):
+    """
+    Scatter scenario frames computed on the daylight_mask samples back onto
+    `times`, giving every skipped sample the output of the night sample
+    `night_time` (for the Sandia inverter, an AC output of -abs(Pnt)) and
+    its air temperature as cell temperature.
+
+    Parameters:
+    - frames: dict of name -> DataFrame with SCENARIO_COLUMNS on times[mask]
+    - scenarios: dict of name -> weather DataFrame, for the night air temperature
+    - times: DatetimeIndex of the full series
+    - mask, night_time: output of daylight_mask
+
+    Returns:
+    - dict of name -> DataFrame with SCENARIO_COLUMNS on `times`
+    """
+    positions = np.flatnonzero(mask)
+    filled = {}
+    for name, frame in frames.items():
+        weather = scenarios.get(name)
+        night = frame.loc[night_time]
+        columns = {}
+        for column in SCENARIO_COLUMNS:
+            if column == 'cell_temperature' and weather is not None and 'temp_air' in weather:
+                values = weather['temp_air'].reindex(times).to_numpy(dtype=float, copy=True)
+            elif column == 'cell_temperature':
+                values = np.full(len(times), DEFAULT_TEMP_AIR)
+            else:
+                values = np.full(len(times), night[column], dtype=float)
+            values[positions] = frame[column].to_numpy(dtype=float)
+            columns[column] = values
+        filled[name] = pd.DataFrame(columns, index=times)
+    return filled
+
+
+def run_with_clear_sky(system, location, weather, engine='pvlib', skip_night=False):
+    """
+    run_scenarios for the 'real' weather and its Ineichen 'clear_sky'
+    scenario, both on the weather's index.
+
+    With `skip_night` the geometry and the chain are only computed on the
+    daylight_mask samples and the night is filled in with fill_night, so
+    the output is the same at roughly half the cost.
+
+    Parameters:
+    - system: pvlib PVSystem with a single fixed array
+    - location: pvlib Location
+    - weather: DataFrame with 'ghi', 'dni', 'dhi' (and optionally 'temp_air', 'wind_speed')
+    - engine: run_scenarios engine
+    - skip_night: bool, skip the night samples
+
+    Returns:
+    - dict: 'real' and 'clear_sky' -> DataFrame with SCENARIO_COLUMNS
+    """
+    mount = system.arrays[0].mount
+    times = weather.index
+    if skip_night:
+        mask, night_time = daylight_mask(location, times, {'real': weather})
+    else:
+        mask, night_time = np.ones(len(times), dtype=bool), None
+    temp_air = weather['temp_air'][mask] if 'temp_air' in weather else None
+    geometry = compute_geometry(location, times[mask], mount.surface_tilt, mount.surface_azimuth, temp_air)
+    outputs = run_scenarios(system, location, {
+        'real': weather[mask],
+        'clear_sky': clear_sky_weather(location, geometry),
+    }, geometry, engine=engine)
+    if night_time is None:
+        return outputs
+    return fill_night(outputs, {'real': weather}, times, mask, night_time)
+
+
+def scenario_frames(outputs, scenarios, times):
+    """
+    Split (scenarios x times) outputs into one DataFrame per scenario.
+    """
+    return {
+        name: pd.DataFrame({column: np.asarray(outputs[column])[position] for column in SCENARIO_COLUMNS}, index=times)
+        for position, name in enumerate(scenarios)
+    }
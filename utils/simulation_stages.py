@@ -0,0 +1,211 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from .result_cache import fingerprint
+from .simulation_engine import (
+    array_ac, clear_sky_weather, compute_geometry, daylight_mask, fill_night, fused_sapm_sandia, module_dc,
+    module_temperature, plane_of_array, scenario_frames, stack_weather,
+)
+
+# Directory holding the memoized stage outputs
+STAGE_CACHE_DIR = os.path.join(os.getcwd(), 'data', 'stage_cache')
+
+# Bump when a stage changes its output so cached stage results are not reused
+STAGE_VERSION = 1
+
+# Stages of the model chain, upstream first
+STAGES = ('weather', 'geometry', 'poa', 'cell_temperature', 'dc', 'ac')
+
+# Stages StagedChain.run reports with each engine: 'fused' runs everything
+# after the geometry in one pass
+ENGINE_STAGES = {'pvlib': STAGES, 'fused': STAGES[:2]}
+
+
+def frame_digest(df):
+    """
+    Content digest of a DataFrame (index and values).
+    """
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(','.join(map(str, df.columns)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def index_digest(times):
+    """
+    Content digest of a DatetimeIndex, e.g. the samples a stage ran on.
+    """
+    return hashlib.sha256(pd.DatetimeIndex(times).asi8.tobytes()).hexdigest()
+
+
+def parameters(values):
+    """
+    JSON-friendly dict of a parameter Series / dict, for stage inputs.
+    """
+    return {
+        str(key): None if isinstance(value, float) and np.isnan(value) else value
+        for key, value in dict(values).items()
+    }
+
+
+class StagedChain:
+    """
+    Runs the model chain as explicit stages, memoizing each stage's output.
+
+    A stage's key is the fingerprint of its own inputs only: its
+    parameters plus the keys of the stages it reads from. Changing the
+    inverter therefore only misses the 'ac' stage, changing the module
+    misses 'dc' and 'ac', and so on; everything upstream is read back from
+    the cache. Outputs are stored in a ResultCache, so they are shared by
+    every worker process and evicted least recently used first.
+
+    The weather stage is the exception: it is fetched on every run, since
+    the weather store already serves the days it has in full and refetches
+    missing days and its last `recent_days` days (see
+    utils.weather_store.WeatherStore), which a memoized copy would freeze.
+    Its key is the digest of the weather itself, so downstream stages miss
+    exactly when the weather changed.
+
+    `recomputed` lists the stages that missed during the last run, and
+    `progress`, when given, is called with each stage's name once its
+    output is available (it may raise to abort the run between stages).
+    """
+
+    def __init__(self, cache, progress=None):
+        self.cache = cache
+        self.progress = progress
+        self.recomputed = []
+
+    def stage(self, name, inputs, compute):
+        """
+        Return (key, output) of stage `name`, computing it on a miss.
+
+        Parameters:
+        - name: str, one of STAGES
+        - inputs: dict, everything the stage's output depends on
+        - compute: callable returning the stage's output
+        """
+        key = fingerprint({'stage': name, 'version': STAGE_VERSION, 'inputs': inputs})
+        cache_key = f'stage_{name}_{key}'
+        output = self.cache.get(cache_key)
+        if output is None:
+            output = compute()
+            self.cache.set(cache_key, output)
+            self.recomputed.append(name)
+        if self.progress is not None:
+            self.progress(name)
+        return key, output
+
+    def run(self, system, location, fetch_weather, extra_scenarios=None, engine='pvlib', skip_night=False):
+        """
+        Run the real and clear-sky scenarios (plus `extra_scenarios`) stage by stage.
+
+        Parameters:
+        - system: pvlib PVSystem with a single fixed array
+        - location: pvlib Location
+        - fetch_weather: callable returning the weather frames, a dict with
+          the hourly weather in 'hourly_df'
+        - extra_scenarios: dict of name -> weather DataFrame, as in run_scenarios
+        - engine: 'pvlib' runs every stage; 'fused' memoizes the geometry
+          and runs fused_sapm_sandia for the rest in one pass
+        - skip_night: bool, run the stages after 'weather' on the daylight
+          samples only (see simulation_engine.daylight_mask) and fill the
+          night in with the chain's night output; the result is unchanged
+
+        Returns:
+        - tuple: (weather frames, dict of scenario name -> DataFrame with SCENARIO_COLUMNS)
+        """
+        self.recomputed = []
+        array = system.arrays[0]
+        mount = array.mount
+
+        weather_frames = fetch_weather()
+        weather_df = weather_frames['hourly_df']
+        weather_key = frame_digest(weather_df)
+        if self.progress is not None:
+            self.progress('weather')
+        all_times = weather_df.index
+        all_scenarios = {'real': weather_df[['dni', 'ghi', 'dhi']]}
+        all_scenarios.update(extra_scenarios or {})
+        # The clear sky is zero whenever the sun is down, so it never widens the mask
+        if skip_night:
+            mask, night_time = daylight_mask(location, all_times, all_scenarios)
+        else:
+            mask, night_time = np.ones(len(all_times), dtype=bool), None
+        times = all_times[mask]
+
+        def compute_geometry_stage():
+            geometry = compute_geometry(location, times, mount.surface_tilt, mount.surface_azimuth)
+            geometry['clear_sky'] = clear_sky_weather(location, geometry)
+            return geometry
+
+        geometry_key, geometry = self.stage('geometry', {
+            'latitude': location.latitude,
+            'longitude': location.longitude,
+            'altitude': location.altitude,
+            'timezone': str(location.tz),
+            'weather': weather_key,
+            'surface_tilt': mount.surface_tilt,
+            'surface_azimuth': mount.surface_azimuth,
+            # The daylight mask also depends on the extra scenarios' weather
+            'times': index_digest(times),
+        }, compute_geometry_stage)
+
+        scenarios = {'real': all_scenarios['real'][mask], 'clear_sky': geometry['clear_sky']}
+        scenarios.update({name: frame.reindex(all_times)[mask] for name, frame in (extra_scenarios or {}).items()})
+        scenarios_key = fingerprint({
+            'weather': weather_key,
+            'geometry': geometry_key,
+            'extra': {name: frame_digest(frame) for name, frame in (extra_scenarios or {}).items()},
+        })
+        weather = stack_weather(scenarios, times)
+
+        def frames(outputs):
+            # Scenario frames on every weather sample, the skipped night filled in
+            frames = scenario_frames(outputs, scenarios, times)
+            if night_time is None:
+                return frames
+            return fill_night(frames, all_scenarios, all_times, mask, night_time)
+
+        if engine == 'fused':
+            outputs = fused_sapm_sandia(
+                geometry, weather['ghi'], weather['dni'], weather['dhi'], weather['temp_air'], weather['wind_speed'],
+                array.module_parameters, system.inverter_parameters, array.temperature_model_parameters,
+                mount.surface_tilt, array.albedo, array.modules_per_string, array.strings,
+            )
+            return weather_frames, frames(outputs)
+
+        poa_key, poa = self.stage('poa', {
+            'geometry': geometry_key,
+            'scenarios': scenarios_key,
+            'albedo': array.albedo,
+        }, lambda: plane_of_array(system, geometry, weather['ghi'], weather['dni'], weather['dhi']))
+
+        temperature_key, cell_temperature = self.stage('cell_temperature', {
+            'poa': poa_key,
+            'scenarios': scenarios_key,
+            'temperature_model': parameters(array.temperature_model_parameters),
+        }, lambda: module_temperature(system, poa['poa_global'], weather['temp_air'], weather['wind_speed']))
+
+        dc_key, dc = self.stage('dc', {
+            'poa': poa_key,
+            'cell_temperature': temperature_key,
+            'module': parameters(array.module_parameters),
+        }, lambda: module_dc(system, geometry, poa, cell_temperature))
+
+        _, ac = self.stage('ac', {
+            'dc': dc_key,
+            'modules_per_string': array.modules_per_string,
+            'strings': array.strings,
+            'inverter': parameters(system.inverter_parameters),
+        }, lambda: array_ac(system, dc))
+
+        outputs = {
+            'poa_global': poa['poa_global'],
+            'effective_irradiance': dc['effective_irradiance'],
+            'cell_temperature': cell_temperature,
+            **ac,
+        }
+        return weather_frames, frames(outputs)
@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+
+from .aggregations import sample_hours
+from .simulation_engine import run_with_clear_sky
+
+# Length of the time chunks a streamed simulation is processed in (pandas offset alias)
+STREAM_CHUNK_FREQ = 'QS'
+
+# Weather fetches cover whole days in the weather provider's timezone, so each
+# chunk's fetch is padded to contain every row of the chunk in local time
+FETCH_PADDING = pd.Timedelta(days=1)
+
+# Monthly aggregate columns: summed over the month, or the month's maximum
+MONTHLY_SUM_COLUMNS = ('energy_kwh', 'clear_sky_energy_kwh', 'poa_insolation_kwh_m2', 'hours')
+MONTHLY_MAX_COLUMNS = ('peak_power_w',)
+
+
+def time_chunks(start_time, end_time, freq=STREAM_CHUNK_FREQ):
+    """
+    Consecutive inclusive (chunk_start, chunk_end) windows covering
+    [start_time, end_time], split at the calendar boundaries of `freq`.
+    """
+    edges = [edge for edge in pd.date_range(start_time, end_time, freq=freq) if edge > start_time]
+    starts = [start_time] + edges
+    ends = [edge - pd.Timedelta(1, 'ns') for edge in edges] + [end_time]
+    return list(zip(starts, ends))
+
+
+class StreamAggregates:
+    """
+    Monthly aggregates of a simulation updated one chunk at a time, so
+    only the months (never the full series) are kept in memory.
+
+    The performance ratio is the final yield over the reference yield,
+    energy_kwh / (dc_capacity_kw * poa_insolation_kwh_m2 / 1 kW/m2).
+    """
+
+    def __init__(self, dc_capacity_kw):
+        self.dc_capacity_kw = dc_capacity_kw
+        self.monthly = None
+        self.peak_power_w = -np.inf
+        self.peak_time = None
+
+    def update(self, chunk):
+        """
+        Add a chunk with 'ac_power_output', 'clear_sky_ac_power_output' and 'poa_global' columns.
+        """
+        if chunk.empty:
+            return
+        step_hours = sample_hours(chunk.index)
+        months = chunk.resample('MS')
+        monthly = pd.DataFrame({
+            'energy_kwh': months['ac_power_output'].sum() * step_hours / 1000,
+            'clear_sky_energy_kwh': months['clear_sky_ac_power_output'].sum() * step_hours / 1000,
+            'poa_insolation_kwh_m2': months['poa_global'].sum() * step_hours / 1000,
+            'hours': months['ac_power_output'].count() * step_hours,
+            'peak_power_w': months['ac_power_output'].max(),
+        })
+        if self.monthly is None:
+            self.monthly = monthly
+        else:
+            # Chunks may share a month: sums add up, peaks take the maximum
+            combined = self.monthly.reindex(self.monthly.index.union(monthly.index))
+            other = monthly.reindex(combined.index)
+            for column in MONTHLY_SUM_COLUMNS:
+                combined[column] = combined[column].add(other[column], fill_value=0)
+            for column in MONTHLY_MAX_COLUMNS:
+                combined[column] = np.fmax(combined[column], other[column])
+            self.monthly = combined
+        peak_time = chunk['ac_power_output'].idxmax() if chunk['ac_power_output'].notna().any() else None
+        if peak_time is not None and chunk['ac_power_output'][peak_time] > self.peak_power_w:
+            self.peak_power_w = float(chunk['ac_power_output'][peak_time])
+            self.peak_time = peak_time
+
+    def _performance_ratio(self, energy_kwh, poa_insolation_kwh_m2):
+        reference = self.dc_capacity_kw * poa_insolation_kwh_m2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(reference > 0, energy_kwh / reference, np.nan)
+
+    def result(self):
+        """
+        Returns:
+        - dict: 'monthly' DataFrame (energy, clear-sky energy, POA insolation,
+          hours, peak power, specific yield and performance ratio per month)
+          and 'totals' dict over the whole window
+        """
+        monthly = self.monthly if self.monthly is not None else pd.DataFrame(columns=MONTHLY_SUM_COLUMNS + MONTHLY_MAX_COLUMNS)
+        monthly = monthly.copy()
+        monthly.index.name = 'month'
+        monthly['specific_yield_kwh_per_kwp'] = monthly['energy_kwh'] / self.dc_capacity_kw if self.dc_capacity_kw else np.nan
+        monthly['performance_ratio'] = self._performance_ratio(monthly['energy_kwh'], monthly['poa_insolation_kwh_m2'])
+        energy_kwh = float(monthly['energy_kwh'].sum())
+        poa_insolation_kwh_m2 = float(monthly['poa_insolation_kwh_m2'].sum())
+        totals = {
+            'energy_kwh': energy_kwh,
+            'clear_sky_energy_kwh': float(monthly['clear_sky_energy_kwh'].sum()),
+            'poa_insolation_kwh_m2': poa_insolation_kwh_m2,
+            'hours': float(monthly['hours'].sum()),
+            'peak_power_w': self.peak_power_w if self.peak_time is not None else None,
+            'peak_time': self.peak_time,
+            'dc_capacity_kw': self.dc_capacity_kw,
+            'specific_yield_kwh_per_kwp': energy_kwh / self.dc_capacity_kw if self.dc_capacity_kw else None,
+            'performance_ratio': float(self._performance_ratio(energy_kwh, poa_insolation_kwh_m2)),
+        }
+        return {'monthly': monthly, 'totals': totals}
+
+
+def stream_scenarios(system, location, start_time, end_time, fetch_chunk, chunk_freq=STREAM_CHUNK_FREQ,
+                     spill=None, engine='pvlib', skip_night=False, progress=None):
+    """
+    Simulate [start_time, end_time] chunk by chunk with bounded memory.
+
+    Each chunk's weather is fetched, run through the model chain with its
+    clear sky (see run_scenarios), folded into StreamAggregates and
+    dropped, so peak memory depends on the chunk length, not the window.
+
+    Parameters:
+    - system: pvlib PVSystem with a single fixed array
+    - location: pvlib Location
+    - start_time, end_time: tz-aware Timestamps, inclusive window
+    - fetch_chunk: callable (chunk_start, chunk_end) -> hourly weather
+      DataFrame with at least 'ghi', 'dni', 'dhi'
+    - chunk_freq: pandas offset alias of the chunk boundaries
+    - spill: callable receiving each simulated chunk (e.g. appending it to
+      a utils.result_store.ResultStore), or None to keep only the aggregates
+    - engine: run_scenarios engine
+    - skip_night: bool, only run the chain on daylight samples (see run_with_clear_sky)
+    - progress: callable (chunks done, total chunks), may raise to abort
+
+    Returns:
+    - dict: StreamAggregates.result()
+    """
+    array = system.arrays[0]
+    module = array.module_parameters
+    dc_capacity_kw = module['Impo'] * module['Vmpo'] * array.modules_per_string * array.strings / 1000
+    aggregates = StreamAggregates(dc_capacity_kw)
+    chunks = time_chunks(start_time, end_time, chunk_freq)
+
+    for done, (chunk_start, chunk_end) in enumerate(chunks, start=1):
+        weather_df = fetch_chunk(chunk_start - FETCH_PADDING, chunk_end + FETCH_PADDING)
+        # Keep only this chunk's rows so chunks never overlap
+        weather_df = weather_df[(weather_df.index >= chunk_start) & (weather_df.index <= chunk_end)]
+        if not weather_df.empty:
+            outputs = run_with_clear_sky(system, location, weather_df[['dni', 'ghi', 'dhi']], engine=engine, skip_night=skip_night)
+            chunk = weather_df.copy()
+            chunk['ac_power_output'] = outputs['real']['ac']
+            chunk['clear_sky_ac_power_output'] = outputs['clear_sky']['ac']
+            chunk['poa_global'] = outputs['real']['poa_global']
+            aggregates.update(chunk)
+            if spill is not None:
+                spill(chunk)
+        if progress is not None:
+            progress(done, len(chunks))
+    return aggregates.result()
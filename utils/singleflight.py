@@ -0,0 +1,73 @@
+import functools
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into a single upstream call.
+
+    The first caller for a key runs the function; callers arriving with the
+    same key while it is in flight wait for it and receive the same result
+    (or exception). Nothing is kept once the call completes, so later calls
+    run again (and are served by the HTTP cache if one is installed).
+    Coalescing is per process: it covers the threads of one worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function(*args, **kwargs)
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        """
+        Number of keys currently being fetched.
+        """
+        with self._lock:
+            return len(self._calls)
+
+
+def single_flight(key_function):
+    """
+    Decorator coalescing concurrent calls whose `key_function(*args, **kwargs)`
+    is equal (see SingleFlight).
+    """
+    def decorator(function):
+        flight = SingleFlight()
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return flight.do(key_function(*args, **kwargs), function, *args, **kwargs)
+
+        wrapper.flight = flight
+        return wrapper
+    return decorator
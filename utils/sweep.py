@@ -0,0 +1,149 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pvlib
+
+from .sam_catalogue import inverter_catalogue, module_catalogue
+from .simulation_engine import (
+    compute_geometry, module_dc, module_temperature, plane_of_array, sandia_inverter, stack_weather,
+)
+
+HOURS_PER_YEAR = 365.25 * 24
+
+# Columns of the ranked table returned by run_sweep
+SWEEP_COLUMNS = [
+    'module', 'inverter', 'modules_per_string', 'strings', 'dc_capacity_kw', 'dc_ac_ratio',
+    'energy_kwh', 'annual_energy_kwh', 'clipping_loss_kwh', 'clipping_loss_pct',
+    'specific_yield_kwh_per_kwp', 'mppt_out_of_range_hours',
+]
+
+# Inputs shared by every combination, set once per worker process
+_context = None
+
+
+def _init_worker(context):
+    global _context
+    _context = context
+
+
+def _sweep_module(module_name):
+    """
+    Every (inverter, modules_per_string) combination of one module.
+
+    The module's single-module DC output is computed once from the shared
+    POA and cell temperature, then scaled per string size and fed to each
+    inverter.
+    """
+    context = _context
+    module = module_catalogue[module_name]
+    system = pvlib.pvsystem.PVSystem(module_parameters=module, temperature_model_parameters=context['temperature'])
+    dc = module_dc(system, context['geometry'], context['poa'], context['cell_temperature'])
+    module_v_mp = np.asarray(dc['v_mp'], dtype=float)[0]
+    module_p_mp = np.asarray(dc['p_mp'], dtype=float)[0]
+    step_hours = context['step_hours']
+    window_hours = len(module_p_mp) * step_hours
+    strings = context['strings']
+
+    rows = []
+    for modules_per_string in context['modules_per_string']:
+        v_dc = module_v_mp * modules_per_string
+        p_dc = module_p_mp * modules_per_string * strings
+        dc_capacity_kw = module['Impo'] * module['Vmpo'] * modules_per_string * strings / 1000
+        for inverter_name, inverter in context['inverters'].items():
+            ac, clipped = sandia_inverter(v_dc, p_dc, inverter)
+            energy_kwh = np.nansum(ac) * step_hours / 1000
+            clipping_loss_kwh = np.nansum(clipped) * step_hours / 1000
+            annual_energy_kwh = energy_kwh * HOURS_PER_YEAR / window_hours
+            with np.errstate(invalid='ignore'):
+                producing = p_dc >= inverter['Pso']
+                outside_mppt = producing & ((v_dc < inverter['Mppt_low']) | (v_dc > inverter['Mppt_high']))
+            rows.append({
+                'module': module_name,
+                'inverter': inverter_name,
+                'modules_per_string': modules_per_string,
+                'strings': strings,
+                'dc_capacity_kw': dc_capacity_kw,
+                'dc_ac_ratio': dc_capacity_kw * 1000 / inverter['Paco'],
+                'energy_kwh': energy_kwh,
+                'annual_energy_kwh': annual_energy_kwh,
+                'clipping_loss_kwh': clipping_loss_kwh,
+                'clipping_loss_pct': 100 * clipping_loss_kwh / (energy_kwh + clipping_loss_kwh) if energy_kwh + clipping_loss_kwh > 0 else 0.,
+                'specific_yield_kwh_per_kwp': annual_energy_kwh / dc_capacity_kw if dc_capacity_kw else np.nan,
+                'mppt_out_of_range_hours': float(np.count_nonzero(outside_mppt)) * step_hours,
+            })
+    return rows
+
+
+def run_sweep(location, weather, modules, inverters, modules_per_string, temperature_model='open_rack_glass_glass',
+              strings=1, surface_tilt=0, surface_azimuth=180, max_workers=None, rank_by='annual_energy_kwh'):
+    """
+    Simulate every module x inverter x string size combination at one site.
+
+    Geometry, plane of array irradiance and cell temperature do not depend
+    on the components, so they are computed once and shared; each worker
+    process receives them once and then runs the DC model per module and
+    the Sandia inverter per (string size, inverter). Modules are the unit
+    of work, so the sweep scales with the number of cores up to the number
+    of modules.
+
+    Parameters:
+    - location: pvlib Location
+    - weather: hourly weather DataFrame with 'ghi', 'dni', 'dhi' (and
+      optionally 'temp_air', 'wind_speed') on a tz-aware index
+    - modules, inverters: lists of Sandia module / CEC inverter names
+    - modules_per_string: iterable of int, string sizes to try
+    - temperature_model: str, SAPM temperature model name
+    - strings: int, strings per inverter
+    - surface_tilt, surface_azimuth: float, orientation of the array in degrees
+    - max_workers: int, worker processes (None for one per CPU, 1 to run inline)
+    - rank_by: str, SWEEP_COLUMNS entry ranking the combinations, best (highest) first
+
+    Returns:
+    - DataFrame with SWEEP_COLUMNS, indexed by rank starting at 1
+    """
+    unknown = [name for name in modules if name not in module_catalogue]
+    unknown += [name for name in inverters if name not in inverter_catalogue]
+    if unknown:
+        raise ValueError(f"Unknown components: {', '.join(unknown)}")
+    if rank_by not in SWEEP_COLUMNS:
+        raise ValueError(f"Cannot rank by {rank_by!r}, expected one of {SWEEP_COLUMNS}")
+    modules = list(dict.fromkeys(modules))
+    modules_per_string = sorted(set(int(size) for size in modules_per_string))
+
+    temperature = pvlib.temperature.TEMPERATURE_MODEL_PARAMETERS['sapm'][temperature_model]
+    system = pvlib.pvsystem.PVSystem(
+        surface_tilt=surface_tilt, surface_azimuth=surface_azimuth, temperature_model_parameters=temperature,
+    )
+    times = weather.index
+    geometry = compute_geometry(location, times, surface_tilt, surface_azimuth)
+    stacked = stack_weather({'real': weather}, times)
+    poa = plane_of_array(system, geometry, stacked['ghi'], stacked['dni'], stacked['dhi'])
+    cell_temperature = module_temperature(system, poa['poa_global'], stacked['temp_air'], stacked['wind_speed'])
+    step_hours = pd.Series(times).diff().median() / pd.Timedelta(hours=1) if len(times) > 1 else 1.
+
+    context = {
+        # module_dc only reads the AOI and absolute airmass of the geometry
+        'geometry': {'aoi': geometry['aoi'], 'airmass_absolute': geometry['airmass_absolute']},
+        'poa': poa,
+        'cell_temperature': cell_temperature,
+        'temperature': temperature,
+        'inverters': {name: inverter_catalogue[name] for name in dict.fromkeys(inverters)},
+        'modules_per_string': modules_per_string,
+        'strings': strings,
+        'step_hours': step_hours,
+    }
+
+    workers = min(max_workers or os.cpu_count() or 1, len(modules))
+    if workers <= 1:
+        _init_worker(context)
+        results = [_sweep_module(name) for name in modules]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(context,)) as executor:
+            results = list(executor.map(_sweep_module, modules))
+
+    table = pd.DataFrame([row for rows in results for row in rows], columns=SWEEP_COLUMNS)
+    table = table.sort_values([rank_by, 'specific_yield_kwh_per_kwp'], ascending=False, kind='stable').reset_index(drop=True)
+    table.index = pd.RangeIndex(1, len(table) + 1, name='rank')
+    return table
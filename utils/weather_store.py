@@ -0,0 +1,208 @@
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+import h3
+import numpy as np
+import pandas as pd
+
+from .h5frames import append_frame, open_file, read_frame
+
+# Local HDF5 file holding every weather window fetched so far
+WEATHER_STORE_PATH = os.path.join(os.getcwd(), 'data', 'weather_store.h5')
+
+# Seconds to wait for another process (e.g. a job worker) to release the store
+WEATHER_STORE_LOCK_TIMEOUT = 10
+
+# Most recent days (UTC, counting today) that are always fetched again, as
+# Open-Meteo still fills them in or serves forecasts for them
+WEATHER_STORE_RECENT_DAYS = 2
+
+# Rows a day holds in each stored frame once it is complete
+ROWS_PER_DAY = {'hourly': 24, 'daily': 1}
+
+EPOCH = date(1970, 1, 1)
+
+
+def as_date(value):
+    """
+    Return the calendar date of a date, datetime or pandas Timestamp.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return pd.Timestamp(value).date()
+
+
+def snap_to_cell(latitude, longitude, resolution):
+    """
+    Map coordinates onto the H3 cell containing them.
+
+    Parameters:
+    - latitude, longitude: float, exact coordinates of the site
+    - resolution: int, H3 resolution (e.g. 7 is roughly a 1.2 km cell edge)
+
+    Returns:
+    - tuple: (cell id, cell centre latitude, cell centre longitude)
+    """
+    cell = h3.geo_to_h3(float(latitude), float(longitude), resolution)
+    cell_latitude, cell_longitude = h3.h3_to_geo(cell)
+    return cell, cell_latitude, cell_longitude
+
+
+def site_key(latitude, longitude, resolution=None):
+    """
+    Build the store key of a site from its coordinates.
+
+    With a `resolution` the key is the H3 cell of the site, so every site in
+    the same cell shares its weather.
+    """
+    if resolution is not None:
+        return f"h3_{snap_to_cell(latitude, longitude, resolution)[0]}"
+    return f"{float(latitude):.4f}_{float(longitude):.4f}"
+
+
+def _day_numbers(start_date, end_date):
+    first = (as_date(start_date) - EPOCH).days
+    last = (as_date(end_date) - EPOCH).days
+    return np.arange(first, last + 1, dtype=np.int32)
+
+
+def _contiguous_ranges(day_numbers):
+    """
+    Group sorted day numbers into (first_date, last_date) runs.
+    """
+    ranges = []
+    if len(day_numbers) == 0:
+        return ranges
+    breaks = np.flatnonzero(np.diff(day_numbers) != 1) + 1
+    for run in np.split(day_numbers, breaks):
+        ranges.append((EPOCH + timedelta(days=int(run[0])), EPOCH + timedelta(days=int(run[-1]))))
+    return ranges
+
+
+def _fetched_days(df, rows_per_day):
+    """
+    Day numbers (UTC) on which every column of `df` holds a value in all
+    `rows_per_day` rows of the day.
+    """
+    if df.empty or not len(df.columns):
+        return np.array([], dtype=np.int32)
+    index = pd.DatetimeIndex(df.index).tz_convert('UTC').normalize().tz_localize(None)
+    complete = pd.Series(df.notna().all(axis=1).to_numpy(), index=(index - pd.Timestamp(EPOCH)).days)
+    counts = complete.groupby(level=0).sum()
+    return counts.index[counts.to_numpy() >= rows_per_day].to_numpy().astype(np.int32)
+
+
+class WeatherStore:
+    """
+    Columnar HDF5 store of Open-Meteo weather, keyed by site and hour.
+
+    Each site is a group holding an 'hourly' and a 'daily' frame (UTC, one
+    dataset per column, see utils.h5frames) and a 'coverage' group with, for
+    every Open-Meteo variable, the sorted UTC days it has been fetched for
+    in full. The gap computation runs on the coverage, so a variable fetched
+    as part of a larger set is reused by later, smaller requests. The last
+    `recent_days` days are always reported missing, so partial and forecast
+    values are replaced by later fetches.
+
+    Opening the file while another process holds it is retried for up to
+    `lock_timeout` seconds (see utils.h5frames.open_file).
+    """
+
+    def __init__(self, path=WEATHER_STORE_PATH, recent_days=WEATHER_STORE_RECENT_DAYS,
+                 lock_timeout=WEATHER_STORE_LOCK_TIMEOUT):
+        self.path = path
+        self.recent_days = recent_days
+        self.lock_timeout = lock_timeout
+        self._lock = threading.Lock()
+
+    def _open(self, mode):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        return open_file(self.path, mode, self.lock_timeout)
+
+    @staticmethod
+    def _coverage_names(hourly_variables, daily_variables):
+        return [f'hourly.{name}' for name in hourly_variables] + [f'daily.{name}' for name in daily_variables]
+
+    def missing_ranges(self, key, start_date, end_date, hourly_variables, daily_variables):
+        """
+        Return the (first_date, last_date) runs of [start_date, end_date]
+        on which at least one of the variables is not in the store yet, or
+        which fall in the last `recent_days` days.
+        """
+        wanted = _day_numbers(start_date, end_date)
+        names = self._coverage_names(hourly_variables, daily_variables)
+        if not names:
+            return []
+        if not os.path.exists(self.path):
+            return _contiguous_ranges(wanted)
+        today = (pd.Timestamp.now(tz='UTC').date() - EPOCH).days
+        missing = wanted[wanted > today - self.recent_days]
+        with self._lock, self._open('r') as store:
+            coverage = store.get(f'{key}/coverage')
+            for name in names:
+                stored = coverage[name][:] if coverage is not None and name in coverage else np.array([], dtype=np.int32)
+                missing = np.union1d(missing, np.setdiff1d(wanted, stored))
+        return _contiguous_ranges(missing.astype(np.int32))
+
+    def write(self, key, hourly_df, daily_df, hourly_variables, daily_variables):
+        """
+        Merge freshly fetched frames for a site into the store.
+
+        Coverage is recorded per variable, for the days on which its own
+        columns hold a value in every hour (every day for the daily frame),
+        so days the API could not serve in full yet for a variable are
+        requested again next time.
+
+        Parameters:
+        - key: str, site key
+        - hourly_df, daily_df: fetched frames
+        - hourly_variables, daily_variables: dict of Open-Meteo variable -> its
+          frame columns (see extractors.HOURLY_VARIABLES / DAILY_VARIABLES)
+        """
+        hourly_df = hourly_df.tz_convert('UTC')
+        daily_df = daily_df.tz_convert('UTC')
+        fetched = {}
+        for interval, df, variables in (('hourly', hourly_df, hourly_variables), ('daily', daily_df, daily_variables)):
+            for name, columns in variables.items():
+                fetched[f'{interval}.{name}'] = _fetched_days(
+                    df[[column for column in columns if column in df.columns]], ROWS_PER_DAY[interval],
+                )
+
+        with self._lock, self._open('a') as store:
+            site = store.require_group(key)
+            if len(hourly_df.columns):
+                append_frame(site.require_group('hourly'), hourly_df)
+            if len(daily_df.columns):
+                append_frame(site.require_group('daily'), daily_df)
+            coverage = site.require_group('coverage')
+            for name, days in fetched.items():
+                if name in coverage:
+                    days = np.union1d(coverage[name][:], days).astype(np.int32)
+                    del coverage[name]
+                coverage.create_dataset(name, data=days)
+
+    def read(self, key, start_date, end_date, hourly_columns=None, daily_columns=None):
+        """
+        Read the UTC hourly and daily frames of a site for whole days
+        [start_date, end_date], restricted to the given columns.
+
+        Returns:
+        - dict: {'hourly_df': DataFrame, 'daily_df': DataFrame}
+        """
+        start = pd.Timestamp(as_date(start_date), tz='UTC')
+        end = pd.Timestamp(as_date(end_date), tz='UTC') + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+        with self._lock, self._open('r') as store:
+            site = store[key]
+            frames = {}
+            for interval, columns in (('hourly', hourly_columns), ('daily', daily_columns)):
+                if interval in site and columns != []:
+                    frames[f'{interval}_df'] = read_frame(site[interval], start, end, columns)
+                else:
+                    frames[f'{interval}_df'] = pd.DataFrame(index=pd.DatetimeIndex([], tz='UTC', name='datetime'))
+            return frames
+
+
+weather_store = WeatherStore()